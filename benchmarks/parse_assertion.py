@@ -0,0 +1,115 @@
+"""Benchmark assertion line parsing on large inputs.
+
+Compares _parse_assertion() with the regular expression based parser it
+replaced. Run from the Sublime Text console:
+
+    from ColorSchemeUnit.benchmarks import parse_assertion; parse_assertion.main()
+"""
+
+import random
+import re
+from timeit import default_timer as timer
+
+from ColorSchemeUnit.lib.runner import _parse_assertion
+
+# The regular expression based parser that _parse_assertion() replaced, as
+# the baseline. It's also the reference implementation of the equivalence
+# tests in tests/test_parse_assertion_fuzz.py.
+
+_color_test_assertion = re.compile(
+    '^\\s*(//|#|\\/\\*|\\<\\!--|--)\\s*'
+    '(?P<repeat>\\^+)\\s+'
+    '(?P<assertions>.+)'
+    '$')
+
+_color_test_assertion_fg = re.compile('fg=([^ ]+)')
+_color_test_assertion_bg = re.compile('bg=([^ ]+)')
+_color_test_assertion_fs = re.compile('fs=([a-z_]+ ?(?:[a-z_]+(?:$| ))*|\\s*)')
+_color_test_assertion_build = re.compile('build\\>=([0-9]+)')
+
+
+def regex_parse_assertion(line: str):
+    line = line.lower().rstrip(' -->').rstrip(' */')
+    match = _color_test_assertion.match(line)
+
+    if match:
+        assertion = {
+            'assertion': match.group(0),
+            'repeat': match.group('repeat')
+        }
+
+        fg = _color_test_assertion_fg.search(match.group('assertions'))
+        assertion['fg'] = fg.group(1) if fg else None
+
+        bg = _color_test_assertion_bg.search(match.group('assertions'))
+        assertion['bg'] = bg.group(1) if bg else None
+
+        fs = _color_test_assertion_fs.search(match.group('assertions'))
+        assertion['fs'] = fs.group(1).strip() if fs else None
+
+        build = _color_test_assertion_build.search(match.group('assertions'))
+        assertion['build'] = build.group(1) if build else None
+
+        return assertion
+
+
+def generate_lines(count: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    lines = []
+    while len(lines) < count:
+        lines.append('    $value = some_function($argument, "string", 42); // comment')
+        for _ in range(rnd.randint(1, 6)):
+            lines.append('//  {}{} fg=#{:06x} bg=#272822 fs={}'.format(
+                ' ' * rnd.randint(0, 40),
+                '^' * rnd.randint(1, 12),
+                rnd.randrange(0xffffff),
+                rnd.choice(('', 'bold', 'italic', 'bold italic'))))
+
+    return lines[:count]
+
+
+def generate_source_lines(count: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    lines = []
+    for i in range(count):
+        if i % 4 == 0:
+            lines.append('// ^^^^ fg=#{:06x} fs=italic'.format(rnd.randrange(0xffffff)))
+        else:
+            lines.append('    $value_{} = some_function($arg, "string", {}); // comment'.format(i, rnd.randint(0, 99)))
+
+    return lines
+
+
+def generate_malformed_lines(count: int, length: int = 2000) -> list:
+    return ['// ^ fs=' + ('bold ' * (length // 5)) + '#' for _ in range(count)]
+
+
+def bench(lines: list) -> dict:
+    start = timer()
+    expected = [regex_parse_assertion(line) for line in lines]
+    regex = timer() - start
+
+    start = timer()
+    actual = [_parse_assertion(line) for line in lines]
+    scan = timer() - start
+
+    if actual != expected:
+        raise AssertionError('parsed assertions differ from the regular expression parser')
+
+    return {
+        'lines': len(lines),
+        'regex': regex,
+        'scan': scan,
+        'speedup': regex / scan,
+    }
+
+
+def main() -> None:
+    for name, lines in (
+        ('fixture', generate_lines(100000)),
+        ('source', generate_source_lines(100000)),
+        ('malformed', generate_malformed_lines(1000)),
+    ):
+        result = bench(lines)
+        print('{name: <10} {lines: >6} lines: regex {regex:.3f}s, scan {scan:.3f}s ({speedup:.1f}x)'
+              .format(name=name, **result))
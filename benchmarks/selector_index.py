@@ -0,0 +1,94 @@
+"""Benchmark legacy (tmTheme) style resolution with and without the selector index.
+
+Run from the Sublime Text console:
+
+    from ColorSchemeUnit.benchmarks import selector_index; selector_index.main()
+"""
+
+import random
+from timeit import default_timer as timer
+
+from ColorSchemeUnit.lib.color_scheme import SelectorIndex
+from ColorSchemeUnit.lib.color_scheme import resolve_legacy_style
+
+
+_ROOTS = (
+    'comment', 'constant', 'entity', 'invalid', 'keyword', 'markup', 'meta',
+    'punctuation', 'source', 'storage', 'string', 'support', 'text', 'variable',
+)
+
+_NAMES = (
+    'block', 'class', 'control', 'definition', 'function', 'language', 'line',
+    'name', 'numeric', 'operator', 'other', 'quoted', 'section', 'tag', 'type',
+)
+
+_LANGUAGES = ('c', 'css', 'html', 'js', 'php', 'python', 'ruby', 'xml')
+
+
+def _atom(rnd: random.Random, depth: int) -> str:
+    return '.'.join([rnd.choice(_ROOTS)] + [rnd.choice(_NAMES) for _ in range(depth)])
+
+
+def generate_legacy_rules(count: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    rules = [{'settings': {'foreground': '#f8f8f2', 'background': '#272822'}}]
+    for i in range(count):
+        selectors = []
+        for _ in range(rnd.randint(1, 3)):
+            atoms = [_atom(rnd, rnd.randint(0, 2)) for _ in range(rnd.randint(1, 3))]
+            if rnd.random() < 0.1:
+                atoms.append('- ' + _atom(rnd, 1))
+            selectors.append(' '.join(atoms))
+
+        rules.append({
+            'scope': ', '.join(selectors),
+            'settings': {'foreground': '#%06x' % rnd.randrange(0xffffff), 'fontStyle': rnd.choice(('', 'bold'))}
+        })
+
+    return rules
+
+
+def generate_scopes(count: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    scopes = set()
+    while len(scopes) < count:
+        language = rnd.choice(_LANGUAGES)
+        segments = ['source.' + language]
+        segments += ['meta.' + _atom(rnd, 1) + '.' + language for _ in range(rnd.randint(0, 3))]
+        segments += [_atom(rnd, rnd.randint(1, 3)) + '.' + language]
+        scopes.add(' '.join(segments))
+
+    return sorted(scopes)
+
+
+def bench(rule_count: int = 1500, scope_count: int = 1000) -> dict:
+    rules = generate_legacy_rules(rule_count)
+    scopes = generate_scopes(scope_count)
+    default_styles = rules[0]['settings']
+
+    start = timer()
+    expected = [resolve_legacy_style(scope, default_styles, rules) for scope in scopes]
+    linear = timer() - start
+
+    start = timer()
+    index = SelectorIndex(rules)
+    actual = [resolve_legacy_style(scope, default_styles, rules, index) for scope in scopes]
+    indexed = timer() - start
+
+    if actual != expected:
+        raise AssertionError('indexed styles differ from linear scan styles')
+
+    return {
+        'rules': rule_count,
+        'scopes': scope_count,
+        'linear': linear,
+        'indexed': indexed,
+    }
+
+
+def main() -> None:
+    for rule_count in (100, 500, 1500):
+        result = bench(rule_count)
+        result['speedup'] = result['linear'] / result['indexed']
+        print('{rules: >5} rules, {scopes} scopes: linear {linear:.3f}s, indexed {indexed:.3f}s ({speedup:.1f}x)'
+              .format(**result))
@@ -0,0 +1,450 @@
+"""Benchmark the test runner on synthetic fixtures and color schemes.
+
+Generates test fixtures of 1k, 10k and 50k lines with dense caret assertions,
+and color schemes of 100 to 5,000 rules in both the legacy (.tmTheme) and new
+(.sublime-color-scheme) formats, and measures:
+
+    assertions per second, running fixtures end to end
+    _parse_assertion() throughput
+    ViewStyle.at_point() latency, uncached and cached
+    Coverage.on_tests_end() time
+
+Synthetic syntaxes and color schemes can't be loaded into a running Sublime
+Text, so the suite runs against the headless stand-in sublime module, and
+can't be run from the Sublime Text console. Run it from the repository root:
+
+    python3 benchmarks/suite.py                 # compare with the baseline
+    python3 benchmarks/suite.py --save          # save a new baseline
+    python3 benchmarks/suite.py --quick         # skip the largest fixtures
+
+Results are compared with benchmarks/baseline.json, and the suite exits 1 if
+any result is worse than the baseline by more than the threshold (--threshold,
+25% by default). Baselines depend on the machine, so they aren't committed.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import types
+from timeit import default_timer as timer
+
+# This checkout is imported as the ColorSchemeUnit package, as it is by
+# bin/color-scheme-unit, and the runner is imported after the stand-in
+# sublime module is installed.
+if 'ColorSchemeUnit' not in sys.modules:
+    package = types.ModuleType('ColorSchemeUnit')
+    package.__path__ = [os.path.dirname(os.path.dirname(os.path.realpath(__file__)))]
+    sys.modules['ColorSchemeUnit'] = package
+
+from ColorSchemeUnit.lib.headless import api  # noqa: E402
+
+api.install()
+
+from ColorSchemeUnit.lib.color_scheme import StyleRegistry  # noqa: E402
+from ColorSchemeUnit.lib.color_scheme import ViewStyle  # noqa: E402
+from ColorSchemeUnit.lib.coverage import Coverage  # noqa: E402
+from ColorSchemeUnit.lib.result import ResultPrinter  # noqa: E402
+from ColorSchemeUnit.lib.runner import _parse_assertion  # noqa: E402
+from ColorSchemeUnit.lib.runner import run_color_scheme_test  # noqa: E402
+
+
+_BASELINE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'baseline.json')
+
+_FIXTURE_SIZES = (1000, 10000, 50000)
+
+_RULE_COUNTS = (100, 1000, 5000)
+
+# The rules of synthetic color schemes that the tokens of synthetic fixtures
+# match. Other rules are generated from roots the fixtures don't use, so that
+# assertions pass whatever the number of rules.
+_FIXTURE_RULES = (
+    ('variable', '#fd971f', ''),
+    ('variable.function', '#a6e22e', 'italic'),
+    ('string', '#e6db74', ''),
+    ('constant.numeric', '#ae81ff', ''),
+    ('punctuation', '#f8f8f0', ''),
+    ('comment', '#75715e', 'italic'),
+)
+
+_DEFAULT_FOREGROUND = '#f8f8f2'
+
+_ROOTS = (
+    'comment', 'constant', 'entity', 'invalid', 'keyword', 'markup', 'meta',
+    'punctuation', 'source', 'storage', 'string', 'support', 'text', 'variable',
+)
+
+_FILLER_ROOTS = ('entity', 'invalid', 'keyword', 'markup', 'storage', 'support', 'text')
+
+_NAMES = (
+    'block', 'class', 'control', 'definition', 'function', 'language', 'line',
+    'name', 'numeric', 'operator', 'other', 'quoted', 'section', 'tag', 'type',
+)
+
+_LANGUAGES = ('c', 'css', 'html', 'js', 'php', 'python', 'ruby', 'xml')
+
+_TOKENS = re.compile(
+    '(?P<comment>//.*)'
+    '|(?P<variable>\\$\\w+)'
+    '|(?P<function>\\w+(?=\\())'
+    '|(?P<string>"[^"]*")'
+    '|(?P<number>\\d+)'
+    '|(?P<punctuation>[=(),;])')
+
+_TOKEN_SCOPES = {
+    'comment': 'source.bench comment.line.double-slash.bench ',
+    'variable': 'source.bench variable.other.bench ',
+    'function': 'source.bench meta.function-call.bench variable.function.bench ',
+    'string': 'source.bench string.quoted.double.bench ',
+    'number': 'source.bench constant.numeric.bench ',
+    'punctuation': 'source.bench punctuation.separator.bench ',
+}
+
+_TOKEN_STYLES = {
+    'variable': 'fg=#fd971f',
+    'function': 'fg=#a6e22e fs=italic',
+    'string': 'fg=#e6db74',
+    'number': 'fg=#ae81ff',
+    'punctuation': 'fg=#f8f8f0',
+}
+
+
+class _NullOutput():
+
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+class _ResultPrinter(ResultPrinter):
+
+    # Benchmarks are only valid if the tests run to the end.
+
+    def addException(self, exception):
+        raise exception
+
+
+def _selector(rnd: random.Random, roots: tuple) -> str:
+    atoms = []
+    for _ in range(rnd.randint(1, 3)):
+        atoms.append('.'.join([rnd.choice(roots)] + [rnd.choice(_NAMES) for _ in range(rnd.randint(0, 2))]))
+
+    selector = ' '.join(atoms)
+    if rnd.random() < 0.1:
+        selector += ' - ' + rnd.choice(roots)
+
+    return selector
+
+
+def generate_rules(count: int, roots: tuple = _FILLER_ROOTS, seed: int = 0) -> list:
+    # Returns (selector, foreground, font style) rules: the rules that the
+    # tokens of synthetic fixtures match, then rules generated from roots.
+    rnd = random.Random(seed)
+    rules = list(_FIXTURE_RULES)
+    while len(rules) < count:
+        selectors = ', '.join(_selector(rnd, roots) for _ in range(rnd.randint(1, 3)))
+        rules.append((selectors, '#%06x' % rnd.randrange(0xffffff), rnd.choice(('', '', 'bold', 'italic'))))
+
+    return rules
+
+
+def generate_color_scheme(rules: list) -> str:
+    return json.dumps({
+        'name': 'Benchmark',
+        'globals': {'foreground': _DEFAULT_FOREGROUND, 'background': '#272822'},
+        'rules': [{'scope': s, 'foreground': fg, 'font_style': fs} for s, fg, fs in rules],
+    }, indent=1)
+
+
+def generate_legacy_color_scheme(rules: list) -> str:
+    settings = ['<dict><key>settings</key><dict>'
+                '<key>foreground</key><string>%s</string>'
+                '<key>background</key><string>#272822</string>'
+                '</dict></dict>' % _DEFAULT_FOREGROUND]
+
+    for selector, foreground, font_style in rules:
+        settings.append(
+            '<dict><key>scope</key><string>%s</string><key>settings</key><dict>'
+            '<key>foreground</key><string>%s</string><key>fontStyle</key><string>%s</string>'
+            '</dict></dict>' % (selector, foreground, font_style))
+
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<plist version="1.0"><dict><key>name</key><string>Benchmark</string>'
+            '<key>settings</key><array>%s</array></dict></plist>\n' % '\n'.join(settings))
+
+
+def generate_scopes(count: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    scopes = set()
+    while len(scopes) < count:
+        language = rnd.choice(_LANGUAGES)
+        segments = ['source.' + language]
+        segments += ['meta.' + rnd.choice(_NAMES) + '.' + language for _ in range(rnd.randint(0, 3))]
+        atoms = [rnd.choice(_ROOTS)] + [rnd.choice(_NAMES) for _ in range(rnd.randint(1, 3))] + [language]
+        segments.append('.'.join(atoms))
+        scopes.add(' '.join(segments))
+
+    return sorted(scopes)
+
+
+def generate_fixture(color_scheme: str, line_count: int) -> str:
+    # Each line of code is followed by a caret assertion per token, so nearly
+    # every column of code is asserted. The color scheme is relative to the
+    # Packages directory, as in test headers.
+    lines = ['// COLOR SCHEME TEST "%s" "Benchmark"' % color_scheme]
+    i = 0
+    while len(lines) < line_count:
+        i += 1
+        code = '    $value_%d = call_function($argument, "string %d", %d, $x); // comment' % (i, i, i * 7)
+        lines.append(code)
+        for match in _TOKENS.finditer(code):
+            if match.lastgroup in _TOKEN_STYLES:
+                lines.append('// %s%s %s' % (
+                    ' ' * (match.start() - 3),
+                    '^' * (match.end() - match.start()),
+                    _TOKEN_STYLES[match.lastgroup]))
+
+    return '\n'.join(lines[:line_count]) + '\n'
+
+
+def tokenize(content: str, syntax: str) -> list:
+    # A scope provider for synthetic fixtures.
+    tokens = []
+    offset = 0
+    for line in content.splitlines(True):
+        end = offset + len(line)
+        point = offset
+        for match in _TOKENS.finditer(line):
+            if match.start() > point - offset:
+                tokens.append((point, offset + match.start(), 'source.bench '))
+
+            tokens.append((offset + match.start(), offset + match.end(), _TOKEN_SCOPES[match.lastgroup]))
+            point = offset + match.end()
+
+        if point < end:
+            tokens.append((point, end, 'source.bench '))
+
+        offset = end
+
+    return tokens
+
+
+class Suite():
+
+    # Writes synthetic packages to a temporary packages directory, for the
+    # stand-in sublime module to load.
+
+    def __init__(self, path: str, repeat: int = 3):
+        self.path = path
+        self.repeat = repeat
+        self.package = os.path.join(path, 'Benchmark')
+        os.makedirs(self.package)
+        with open(os.path.join(self.package, 'Benchmark.sublime-syntax'), 'w') as f:
+            f.write('%YAML 1.2\n---\nname: Benchmark\nscope: source.bench\ncontexts: {main: []}\n')
+
+        api.configure([path], os.path.join(path, 'Cache'), scope_provider=tokenize)
+        self.window = api.active_window()
+
+    def _write(self, name: str, content: str) -> str:
+        with open(os.path.join(self.package, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+        api.configure([self.path], os.path.join(self.path, 'Cache'), scope_provider=tokenize)
+
+        return 'Packages/Benchmark/' + name
+
+    def color_scheme(self, rules: list, legacy: bool) -> str:
+        if legacy:
+            return self._write('Benchmark %d.tmTheme' % len(rules), generate_legacy_color_scheme(rules))
+
+        return self._write('Benchmark %d.sublime-color-scheme' % len(rules), generate_color_scheme(rules))
+
+    def _best(self, run) -> float:
+        best = None
+        for _ in range(self.repeat):
+            start = timer()
+            run()
+            elapsed = timer() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        return best
+
+    def bench_fixture(self, line_count: int, legacy: bool) -> dict:
+        color_scheme = self.color_scheme(generate_rules(1000), legacy)
+        fixture = generate_fixture(color_scheme.partition('/')[2], line_count)
+        test = self._write('color_scheme_test_%d.bench' % line_count, fixture)
+        results = []
+
+        def run():
+            result_printer = _ResultPrinter(_NullOutput())
+            result_printer.on_tests_start([test])
+            results.append(run_color_scheme_test(
+                test, self.window, result_printer, Coverage(_NullOutput(), False, True),
+                style_registry=StyleRegistry()))
+
+        elapsed = self._best(run)
+        result = results[-1]
+        if result['error'] or result['failures'] or not result['assertions']:
+            raise AssertionError('benchmark fixture failed: {}'.format(result['error'] or result['failures'][0]))
+
+        return {'value': result['assertions'] / elapsed, 'unit': 'assertions/s', 'higher_is_better': True}
+
+    def bench_parse_assertion(self, line_count: int) -> dict:
+        lines = generate_fixture('Benchmark/Benchmark.sublime-color-scheme', line_count).splitlines()
+
+        def run():
+            for line in lines:
+                _parse_assertion(line)
+
+        return {'value': len(lines) / self._best(run), 'unit': 'lines/s', 'higher_is_better': True}
+
+    def bench_at_point(self, rule_count: int, legacy: bool, scope_count: int = 100) -> dict:
+        # Styles are resolved for one point per scope, then again from the
+        # cache. Returns the mean latencies in microseconds per point.
+        color_scheme = self.color_scheme(generate_rules(rule_count, _ROOTS), legacy)
+        scopes = generate_scopes(scope_count)
+        view = self.window.create_output_panel('benchmark')
+        api.set_scope_provider(lambda content, syntax: [(i, i + 1, scope) for i, scope in enumerate(scopes)])
+        view.settings().set('color_scheme', color_scheme)
+        view.run_command('color_scheme_unit_setup_test_fixture', {'content': 'x' * scope_count})
+        api.set_scope_provider(tokenize)
+
+        best = {}  # type: dict
+        for _ in range(self.repeat):
+            # The color scheme is loaded before timing starts.
+            view_style = ViewStyle(view)
+            for name, passes in (('uncached', 1), ('cached', 100)):
+                start = timer()
+                for _ in range(passes):
+                    for point in range(scope_count):
+                        view_style.at_point(point)
+
+                elapsed = (timer() - start) / passes
+                best[name] = min(best.get(name, elapsed), elapsed)
+
+        return {
+            name: {'value': elapsed / scope_count * 1e6, 'unit': 'us', 'higher_is_better': False}
+            for name, elapsed in best.items()
+        }
+
+    def bench_coverage(self, test_count: int = 200) -> dict:
+        # Coverage of tests spread over color schemes of all sizes.
+        color_schemes = [
+            self.color_scheme(generate_rules(rule_count, _ROOTS), legacy)
+            for rule_count in _RULE_COUNTS
+            for legacy in (False, True)
+        ]
+
+        def run():
+            coverage = Coverage(_NullOutput(), True, False)
+            for i in range(test_count):
+                coverage.on_test_cached(
+                    'Packages/Benchmark/color_scheme_test_%d.bench' % i,
+                    color_schemes[i % len(color_schemes)],
+                    'Packages/Benchmark/Benchmark.sublime-syntax')
+
+            coverage.on_tests_end()
+
+        return {'value': self._best(run) * 1e3, 'unit': 'ms', 'higher_is_better': False}
+
+
+def run(quick: bool = False, repeat: int = 3) -> dict:
+    path = tempfile.mkdtemp()
+    try:
+        suite = Suite(path, repeat)
+        sizes = _FIXTURE_SIZES[:-1] if quick else _FIXTURE_SIZES
+        results = {}
+        for size in sizes:
+            for legacy in (False, True):
+                name = 'assertions/{}/{}'.format(size, 'legacy' if legacy else 'new')
+                results[name] = suite.bench_fixture(size, legacy)
+                _print_result(name, results[name])
+
+        results['parse_assertion'] = suite.bench_parse_assertion(sizes[-1])
+        _print_result('parse_assertion', results['parse_assertion'])
+
+        for rule_count in _RULE_COUNTS:
+            for legacy in (False, True):
+                at_point = suite.bench_at_point(rule_count, legacy)
+                for cache, result in sorted(at_point.items()):
+                    name = 'at_point/{}/{}/{}'.format(rule_count, 'legacy' if legacy else 'new', cache)
+                    results[name] = result
+                    _print_result(name, result)
+
+        results['coverage'] = suite.bench_coverage()
+        _print_result('coverage', results['coverage'])
+
+        return results
+    finally:
+        shutil.rmtree(path)
+
+
+def _print_result(name: str, result: dict) -> None:
+    print('{: <32} {: >14,.1f} {}'.format(name, result['value'], result['unit']))
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    # Returns the names of the results that are worse than the baseline by
+    # more than the threshold.
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+
+        base = baseline[name]['value']
+        if result['higher_is_better']:
+            change = (result['value'] - base) / base
+        else:
+            change = (base - result['value']) / base
+
+        print('{: <32} {: >+7.1%}{}'.format(name, change, ' REGRESSION' if change < -threshold else ''))
+        if change < -threshold:
+            regressions.append(name)
+
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark ColorSchemeUnit on synthetic fixtures and color schemes.')
+    parser.add_argument('--baseline', default=_BASELINE, metavar='FILE', help='the baseline file')
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='the regression threshold (default: 0.25)')
+    parser.add_argument('--repeat', type=int, default=3, help='the number of runs to take the best of (default: 3)')
+    parser.add_argument('--quick', action='store_true', help='skip the largest fixtures')
+    args = parser.parse_args(argv)
+
+    results = run(args.quick, args.repeat)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+        print('\nSaved baseline to {}'.format(args.baseline))
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print('\nNo baseline to compare with; save one with --save')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    print('\nCompared with {}:\n'.format(args.baseline))
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print('\n{} regression{} over {:.0%}'.format(
+            len(regressions), '' if len(regressions) == 1 else 's', args.threshold))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+
+
+class TestPlanCache():
+
+    # Bump when the format of cached plans changes.
+    FORMAT = 1
+
+    def __init__(self, path: str, version: str, max_entries: int = 1000):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+
+    def key(self, test: str, content: str) -> str:
+        # The file extension is part of the key because it is the default
+        # syntax name of tests that don't specify one.
+        digest = hashlib.sha1()
+        digest.update('{}\0{}\0{}\0'.format(self.FORMAT, self.version, os.path.splitext(test)[1]).encode('utf-8'))
+        digest.update(content.encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        file = self._file(key)
+
+        try:
+            with open(file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(data, dict) or 'plan' not in data or \
+                data.get('version') != self.version or data.get('format') != self.FORMAT:
+            self._remove(file)
+            return None
+
+        # Mark the plan as recently used.
+        try:
+            os.utime(file, None)
+        except OSError:
+            pass
+
+        return data['plan']
+
+    def set(self, key: str, plan: dict) -> None:
+        data = {
+            'format': self.FORMAT,
+            'version': self.version,
+            'plan': plan
+        }
+
+        file = self._file(key)
+        tmp_file = file + '.tmp'
+
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_file, file)
+        except OSError:
+            self._remove(tmp_file)
+
+    def prune(self) -> None:
+        # Evicts the least recently used plans when there are too many.
+        try:
+            files = [os.path.join(self.path, f) for f in os.listdir(self.path) if f.endswith('.json')]
+        except OSError:
+            return
+
+        if len(files) <= self.max_entries:
+            return
+
+        mtimes = {}
+        for file in files:
+            try:
+                mtimes[file] = os.path.getmtime(file)
+            except OSError:
+                mtimes[file] = 0
+
+        for file in sorted(files, key=lambda f: mtimes[f])[:len(files) - self.max_entries]:
+            self._remove(file)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + '.json')
+
+    def _remove(self, file: str) -> None:
+        try:
+            os.remove(file)
+        except OSError:
+            pass
+
+
+class TestResultCache():
+
+    # Bump when the format of the results file changes.
+    FORMAT = 2
+
+    # Results are recorded with the digest of the color scheme they passed
+    # with, and the scopes the test evaluated, so that a test can be skipped
+    # if a change to its color scheme can't affect it. A snapshot of the rules
+    # of each version of a color scheme that results refer to is kept for
+    # comparison; see ColorSchemeUnit.lib.impact.
+
+    def __init__(self, file: str, force: bool = False):
+        self.file = file
+        self.force = force
+        self.resource_digests = {}  # type: dict
+        self.color_schemes = {}  # type: dict
+        # Selectors of the rules changed between versions of color schemes, by
+        # (old digest, new digest), for the duration of a run.
+        self.changed_selectors = {}  # type: dict
+        self._results = {}  # type: dict
+        self._changed = False
+
+        try:
+            with open(file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('format') == self.FORMAT:
+                self._results = data['results']
+                self.color_schemes = data['color_schemes']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def fingerprint(parts: list) -> str:
+        digest = hashlib.sha1()
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+
+        return digest.hexdigest()
+
+    def get_result(self, test: str, fingerprint: str):
+        # Returns the last passing result of the test if its fingerprint is
+        # unchanged since then, whatever the color scheme, otherwise None.
+        if self.force:
+            return None
+
+        result = self._results.get(test)
+        if result and result['fingerprint'] == fingerprint:
+            return result
+
+        return None
+
+    def set_passed(self, test: str, fingerprint: str, assertions: int, color_scheme: str = None,
+                   scopes: str = None) -> None:
+        self._results[test] = {
+            'fingerprint': fingerprint,
+            'assertions': assertions,
+            'color_scheme': color_scheme,
+            'scopes': scopes,
+        }
+        self._changed = True
+
+    def set_color_scheme(self, color_scheme: str, snapshot: dict) -> None:
+        self.color_schemes[color_scheme] = snapshot
+        self._changed = True
+
+    def remove(self, test: str) -> None:
+        if self._results.pop(test, None):
+            self._changed = True
+
+    def save(self) -> None:
+        if not self._changed:
+            return
+
+        tmp_file = self.file + '.tmp'
+
+        try:
+            # Snapshots of color schemes no result refers to are dropped.
+            referenced = set(result.get('color_scheme') for result in self._results.values())
+            color_schemes = {k: v for k, v in self.color_schemes.items() if k in referenced}
+
+            os.makedirs(os.path.dirname(self.file), exist_ok=True)
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'format': self.FORMAT,
+                    'results': self._results,
+                    'color_schemes': color_schemes,
+                }, f, separators=(',', ':'))
+            os.replace(tmp_file, self.file)
+            self._changed = False
+        except OSError:
+            pass
@@ -0,0 +1,381 @@
+import colorsys
+import re
+
+# Resolves the colors of .sublime-color-scheme files: hex colors, CSS color
+# names, rgb(), rgba(), hsl(), hsla(), var(), and color() with the alpha(),
+# blend(), blenda(), lightness(), and saturation() adjusters, see
+# https://www.sublimetext.com/docs/color_schemes.html#colors.
+#
+# Each expression is parsed once into a tree of tuples, and each variable is
+# resolved once, without recursing through variables, so resolving every color
+# of a color scheme is linear in its size however deeply variables refer to
+# other variables. Colors are (r, g, b, a) tuples, r, g, and b from 0 to 255, and a from
+# 0 to 1, and are formatted as lowercase #rrggbb, or #rrggbbaa when not
+# opaque.
+
+# Most values are hex colors or variables, which are parsed without the
+# tokenizer.
+_HEX = re.compile('\\s*(#[0-9a-fA-F]+)\\s*$')
+_VAR = re.compile('\\s*var\\(\\s*([^)\\s]+)\\s*\\)\\s*$')
+
+_TOKEN = re.compile('\\s*(?:(#[0-9a-fA-F]+)|([0-9]*\\.?[0-9]+%?)|((?:--)?[A-Za-z_][\\w.-]*)|([(),+-]))')
+
+_NAMED_COLORS = {
+    'aqua': '#00ffff',
+    'black': '#000000',
+    'blue': '#0000ff',
+    'fuchsia': '#ff00ff',
+    'gray': '#808080',
+    'green': '#008000',
+    'grey': '#808080',
+    'lime': '#00ff00',
+    'maroon': '#800000',
+    'navy': '#000080',
+    'olive': '#808000',
+    'orange': '#ffa500',
+    'purple': '#800080',
+    'red': '#ff0000',
+    'silver': '#c0c0c0',
+    'teal': '#008080',
+    'transparent': '#00000000',
+    'white': '#ffffff',
+    'yellow': '#ffff00',
+}
+
+
+class ColorError(ValueError):
+    pass
+
+
+def _parse_hex(value: str) -> tuple:
+    digits = value[1:]
+    if len(digits) in (3, 4):
+        digits = ''.join(c * 2 for c in digits)
+
+    if len(digits) not in (6, 8):
+        raise ColorError('invalid color: {}'.format(value))
+
+    return (
+        int(digits[0:2], 16),
+        int(digits[2:4], 16),
+        int(digits[4:6], 16),
+        int(digits[6:8], 16) / 255 if len(digits) == 8 else 1.0)
+
+
+def format_color(color: tuple) -> str:
+    r, g, b, a = color
+    value = '#%02x%02x%02x' % (_channel(r), _channel(g), _channel(b))
+    if a < 1:
+        value += '%02x' % _channel(a * 255)
+
+    return value
+
+
+def _channel(value: float) -> int:
+    return max(0, min(255, int(round(value))))
+
+
+class _Parser():
+
+    def __init__(self, value: str):
+        self.tokens = []  # type: list
+        pos = 0
+        value = value.rstrip()
+        while pos < len(value):
+            m = _TOKEN.match(value, pos)
+            if not m:
+                raise ColorError('invalid color: {}'.format(value))
+
+            kind = m.lastindex
+            self.tokens.append((kind, m.group(kind)))
+            pos = m.end()
+
+        self.value = value
+        self.pos = 0
+
+    def _next(self):
+        if self.pos >= len(self.tokens):
+            raise ColorError('invalid color: {}'.format(self.value))
+
+        self.pos += 1
+
+        return self.tokens[self.pos - 1]
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _expect(self, token: str) -> None:
+        if self._next()[1] != token:
+            raise ColorError('invalid color: {}'.format(self.value))
+
+    def parse(self) -> tuple:
+        node = self._color()
+        if self.pos != len(self.tokens):
+            raise ColorError('invalid color: {}'.format(self.value))
+
+        return node
+
+    def _color(self) -> tuple:
+        kind, token = self._next()
+        if kind == 1:
+            return ('rgba', _parse_hex(token))
+
+        if kind != 3:
+            raise ColorError('invalid color: {}'.format(self.value))
+
+        name = token.lower()
+        if self._peek()[1] != '(':
+            if name in _NAMED_COLORS:
+                return ('rgba', _parse_hex(_NAMED_COLORS[name]))
+
+            raise ColorError('unknown color: {}'.format(token))
+
+        self._expect('(')
+        if name == 'var':
+            kind, variable = self._next()
+            self._expect(')')
+
+            return ('var', variable)
+
+        if name == 'color':
+            base = self._color()
+            adjusters = []
+            while self._peek()[1] != ')':
+                adjusters.append(self._adjuster())
+            self._expect(')')
+
+            return ('color', base, tuple(adjusters))
+
+        if name in ('rgb', 'rgba', 'hsl', 'hsla'):
+            args = [self._number()]
+            while self._peek()[1] == ',':
+                self._next()
+                args.append(self._number())
+            self._expect(')')
+
+            return ('rgba', _function_color(name, args, self.value))
+
+        raise ColorError('unknown function: {}'.format(token))
+
+    def _number(self) -> tuple:
+        # Returns (sign, value, is_percentage), where sign is '+', '-', or
+        # None for an absolute value.
+        sign = None
+        if self._peek()[1] in ('+', '-'):
+            sign = self._next()[1]
+
+        kind, token = self._next()
+        if kind != 2:
+            raise ColorError('invalid number in color: {}'.format(self.value))
+
+        if token.endswith('%'):
+            return (sign, float(token[:-1]) / 100, True)
+
+        return (sign, float(token), False)
+
+    def _adjuster(self) -> tuple:
+        kind, name = self._next()
+        name = name.lower()
+        self._expect('(')
+        if name in ('alpha', 'a', 'lightness', 'l', 'saturation', 's'):
+            adjuster = (name[0], self._number())
+        elif name in ('blend', 'blenda'):
+            color = self._color()
+            percentage = self._number()
+            space = 'rgb'
+            if self._peek()[0] == 3:
+                space = self._next()[1].lower()
+            adjuster = (name, color, percentage[1], space)
+        else:
+            raise ColorError('unknown adjuster: {}'.format(name))
+
+        self._expect(')')
+
+        return adjuster
+
+
+def _function_color(name: str, args: list, value: str) -> tuple:
+    if len(args) != (4 if name.endswith('a') else 3):
+        raise ColorError('invalid color: {}'.format(value))
+
+    alpha = args[3][1] if len(args) == 4 else 1.0
+    if name.startswith('rgb'):
+        # Channels are 0 to 255, or percentages.
+        return tuple(arg[1] * 255 if arg[2] else arg[1] for arg in args[:3]) + (alpha,)
+
+    r, g, b = colorsys.hls_to_rgb((args[0][1] / 360) % 1, args[2][1], args[1][1])
+
+    return (r * 255, g * 255, b * 255, alpha)
+
+
+def _dependencies(node: tuple) -> list:
+    # The variables a parsed expression refers to.
+    if node[0] == 'var':
+        return [node[1]]
+
+    if node[0] != 'color':
+        return []
+
+    dependencies = _dependencies(node[1])
+    for adjuster in node[2]:
+        if adjuster[0] in ('blend', 'blenda'):
+            dependencies += _dependencies(adjuster[1])
+
+    return dependencies
+
+
+def _adjust(value: float, number: tuple) -> float:
+    sign, amount, is_percentage = number
+    if sign == '+':
+        value += amount
+    elif sign == '-':
+        value -= amount
+    else:
+        value = amount
+
+    return max(0.0, min(1.0, value))
+
+
+def _blend(base: tuple, color: tuple, percentage: float, space: str, alpha: bool) -> tuple:
+    # The percentage is how much of the base color is kept.
+    if space == 'hsl':
+        h1, l1, s1 = colorsys.rgb_to_hls(base[0] / 255, base[1] / 255, base[2] / 255)
+        h2, l2, s2 = colorsys.rgb_to_hls(color[0] / 255, color[1] / 255, color[2] / 255)
+        r, g, b = colorsys.hls_to_rgb(
+            h1 * percentage + h2 * (1 - percentage),
+            l1 * percentage + l2 * (1 - percentage),
+            s1 * percentage + s2 * (1 - percentage))
+        rgb = (r * 255, g * 255, b * 255)
+    else:
+        rgb = tuple(base[i] * percentage + color[i] * (1 - percentage) for i in range(3))
+
+    a = base[3] * percentage + color[3] * (1 - percentage) if alpha else base[3]
+
+    return rgb + (a,)
+
+
+class ColorResolver():
+
+    # Resolves colors given the variables of a color scheme. Parsed
+    # expressions and resolved variables are memoized.
+
+    def __init__(self, variables: dict = None):
+        self.variables = variables or {}
+        self._parsed = {}  # type: dict
+        self._resolved = {}  # type: dict
+        self._formatted = {}  # type: dict
+
+    def resolve(self, value):
+        # Returns the color as #rrggbb or #rrggbbaa, or the value as is if it
+        # isn't a color or can't be resolved.
+        if not isinstance(value, str):
+            return value
+
+        if value not in self._formatted:
+            try:
+                self._formatted[value] = format_color(self.color(value))
+            except ColorError:
+                self._formatted[value] = value
+
+        return self._formatted[value]
+
+    def color(self, value: str) -> tuple:
+        # Returns the color as an (r, g, b, a) tuple. Raises ColorError if
+        # the value isn't a color or can't be resolved.
+        return self._evaluate(self._parse(value))
+
+    def variable(self, name: str) -> tuple:
+        if name not in self._resolved:
+            self._resolve(name)
+
+        color = self._resolved[name]
+        if isinstance(color, ColorError):
+            raise color
+
+        return color
+
+    def _parse(self, value: str) -> tuple:
+        if value not in self._parsed:
+            try:
+                m = _HEX.match(value)
+                if m:
+                    self._parsed[value] = ('rgba', _parse_hex(m.group(1)))
+                else:
+                    m = _VAR.match(value)
+                    if m:
+                        self._parsed[value] = ('var', m.group(1))
+                    else:
+                        self._parsed[value] = _Parser(value).parse()
+            except ColorError as e:
+                self._parsed[value] = e
+
+        node = self._parsed[value]
+        if isinstance(node, ColorError):
+            raise node
+
+        return node
+
+    def _variable_node(self, name: str) -> tuple:
+        if name not in self.variables:
+            raise ColorError('undefined variable: {}'.format(name))
+
+        value = self.variables[name]
+        if not isinstance(value, str):
+            raise ColorError('not a color: {}'.format(name))
+
+        return self._parse(value)
+
+    def _resolve(self, name: str) -> None:
+        # Resolves the variable, and the variables it depends on, depth first
+        # with a stack rather than recursion, so chains of any length resolve.
+        # A variable is evaluated once all of its dependencies are resolved;
+        # failures, including those of dependencies, are memoized too, as they
+        # don't depend on the order variables are resolved in.
+        stack = [name]
+        resolving = {name}
+        while stack:
+            current = stack[-1]
+            try:
+                node = self._variable_node(current)
+                pending = [dependency for dependency in _dependencies(node) if dependency not in self._resolved]
+                for dependency in pending:
+                    if dependency in resolving:
+                        raise ColorError('cyclic variable: {}'.format(dependency))
+
+                if pending:
+                    stack.append(pending[0])
+                    resolving.add(pending[0])
+                    continue
+
+                color = self._evaluate(node)
+            except ColorError as e:
+                color = e
+
+            self._resolved[current] = color
+            resolving.discard(stack.pop())
+
+    def _evaluate(self, node: tuple) -> tuple:
+        kind = node[0]
+        if kind == 'rgba':
+            return node[1]
+
+        if kind == 'var':
+            return self.variable(node[1])
+
+        r, g, b, a = self._evaluate(node[1])
+        for adjuster in node[2]:
+            name = adjuster[0]
+            if name == 'a':
+                a = _adjust(a, adjuster[1])
+            elif name in ('l', 's'):
+                h, lightness, saturation = colorsys.rgb_to_hls(r / 255, g / 255, b / 255)
+                if name == 'l':
+                    lightness = _adjust(lightness, adjuster[1])
+                else:
+                    saturation = _adjust(saturation, adjuster[1])
+                r, g, b = (c * 255 for c in colorsys.hls_to_rgb(h, lightness, saturation))
+            else:
+                r, g, b, a = _blend(
+                    (r, g, b, a), self._evaluate(adjuster[1]), adjuster[2], adjuster[3], name == 'blenda')
+
+        return (r, g, b, a)
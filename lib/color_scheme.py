@@ -1,39 +1,207 @@
+from collections import OrderedDict
 import plistlib
+from timeit import default_timer as timer
 
 from sublime import find_resources
 from sublime import load_resource
 from sublime import score_selector
 import sublime
 
+try:
+    _read_plist = plistlib.loads
+except AttributeError:  # Python 3.3
+    _read_plist = plistlib.readPlistFromBytes
 
-def load_color_scheme_resource(color_scheme):
-    resources = find_resources(color_scheme)
+
+def load_color_scheme_resource(color_scheme, resources=None):
+    if resources:
+        resources = resources.find(color_scheme)
+    else:
+        resources = find_resources(color_scheme)
     if resources:
         color_scheme = resources[0]
 
     if not color_scheme.startswith('Packages/'):
         color_scheme = 'Packages/' + color_scheme
 
-    resource = load_resource(color_scheme)
+    return decode_color_scheme(color_scheme, load_resource(color_scheme))
 
+
+def decode_color_scheme(color_scheme: str, content: str) -> dict:
     if not is_new_scheme(color_scheme):
-        return plistlib.readPlistFromBytes(bytes(resource, 'UTF-8'))
+        return _read_plist(bytes(content, 'UTF-8'))
 
-    return sublime.decode_value(resource)
+    return sublime.decode_value(content)
 
 
 def is_new_scheme(color_scheme: str) -> bool:
     return color_scheme.endswith('.sublime-color-scheme') or color_scheme.endswith('.hidden-color-scheme')
 
 
-class ViewStyle():
+def _selector_keys(selector: str):
+    # Returns the set of index keys for a selector: the first dotted component
+    # of the rightmost positive atom of each comma separated selector. Every
+    # atom of a selector must match a segment of a scope, so the rightmost
+    # (usually the most specific) atom is as good a key as any. Returns None if
+    # the selector is too complex to be indexed, for example if it uses
+    # grouping, a leading negation, or the "|" and "&" operators.
+    if not selector or '(' in selector or ')' in selector or '|' in selector or '&' in selector:
+        return None
 
-    def __init__(self, view):
-        self.view = view
-        self.scope_style_cache = {}
+    keys = set()
+    for alternative in selector.split(','):
+        atoms = []
+        for atom in alternative.split():
+            if atom.startswith('-'):
+                break
+            atoms.append(atom)
+
+        if not atoms:
+            return None
+
+        key = atoms[-1].split('.', 1)[0]
+        if not key:
+            return None
+
+        keys.add(key)
+
+    return keys
+
+
+class SelectorIndex():
+
+    def __init__(self, rules: list):
+        self.rules = rules
+        self._index = {}  # type: dict
+        self._unindexed = []  # type: list
+        self._candidates_cache = {}  # type: dict
+
+        for i, rule in enumerate(rules):
+            if 'scope' not in rule:
+                continue
+
+            keys = _selector_keys(rule['scope'])
+            if keys is None:
+                self._unindexed.append(i)
+            else:
+                for key in keys:
+                    self._index.setdefault(key, []).append(i)
+
+    def candidates(self, scope: str) -> list:
+        # A selector can only match a scope if its key atom matches one of the
+        # scope's segments, so only rules indexed by the first component of a
+        # segment need to be scored. Candidates are returned in rule order.
+        keys = tuple(sorted(set(segment.split('.', 1)[0] for segment in scope.split())))
+
+        if keys in self._candidates_cache:
+            return self._candidates_cache[keys]
+
+        candidates = set(self._unindexed)
+        for key in keys:
+            if key in self._index:
+                candidates.update(self._index[key])
+
+        candidates = sorted(candidates)
+        self._candidates_cache[keys] = candidates
+
+        return candidates
+
+
+def resolve_legacy_style(scope: str, default_styles: dict, rules: list, selector_index=None) -> dict:
+    if selector_index is None:
+        candidates = [i for i, rule in enumerate(rules) if 'scope' in rule]  # type: list
+    else:
+        candidates = selector_index.candidates(scope)
+
+    scored_styles = []
+    for i in candidates:
+        score = score_selector(scope, rules[i]['scope'])
+        if score:
+            scored_styles.append((score, i))
+
+    style = default_styles.copy()
+    for score, i in sorted(scored_styles, key=lambda k: k[0]):
+        style.update(rules[i]['settings'])
+
+    return style
 
-        self.color_scheme_resource = ColorSchemeResource(view)
+
+def color_scheme_rules(content: dict, legacy: bool) -> list:
+    # Returns the rules of a color scheme, including the global settings of
+    # legacy color schemes, which have no scope. Rules are identified by their
+    # index in the list.
+    return content.get('settings', []) if legacy else content.get('rules', [])
+
+
+def resolve_rule_mask(scope: str, rules: list, legacy: bool, selector_index=None) -> int:
+    # Returns the rules that style the scope, as a bitset of rule indexes: for
+    # each style property, the rule with the best scoring selector that sets
+    # it, the last one of equally scoring rules.
+    if selector_index is None:
+        candidates = [i for i, rule in enumerate(rules) if 'scope' in rule]  # type: list
+    else:
+        candidates = selector_index.candidates(scope)
+
+    winners = {}  # type: dict
+    for i in candidates:
+        score = score_selector(scope, rules[i]['scope'])
+        if not score:
+            continue
+
+        for key in (rules[i].get('settings', {}) if legacy else rules[i]):
+            if key in ('name', 'scope'):
+                continue
+
+            if key not in winners or score >= winners[key][0]:
+                winners[key] = (score, i)
+
+    mask = 0
+    for score, i in winners.values():
+        mask |= 1 << i
+
+    return mask
+
+
+class ScopeCache():
+
+    # Values resolved for scopes, keeping at most size of them. The least
+    # recently used scope is dropped when there are more.
+
+    def __init__(self, size: int = 4096):
+        self.size = size
+        self._values = OrderedDict()  # type: OrderedDict
+
+    def get(self, scope: str):
+        # Returns the value of the scope, or None if it isn't cached.
+        value = self._values.get(scope)
+        if value is not None:
+            self._values.move_to_end(scope)
+
+        return value
+
+    def set(self, scope: str, value) -> None:
+        self._values[scope] = value
+        self._values.move_to_end(scope)
+        if len(self._values) > self.size:
+            self._values.popitem(last=False)
+
+    def count(self) -> int:
+        return len(self._values)
+
+
+class ColorSchemeStyles():
+
+    # A parsed color scheme and the styles, and rules, resolved for its scopes
+    # so far. At most cache_size scopes are kept of each.
+
+    def __init__(self, view, resources=None, cache_size: int = 4096):
+        self.scope_style_cache = ScopeCache(cache_size)
+        self.scope_rule_cache = ScopeCache(cache_size)
+
+        self.color_scheme_resource = ColorSchemeResource(view, resources)
         self.content = self.color_scheme_resource.content()
+        self.rules = color_scheme_rules(self.content, self.color_scheme_resource.isLegacy())
+        self._rule_index = None  # type: SelectorIndex
 
         if self.color_scheme_resource.isLegacy():
             self.default_styles = {}  # type: dict
@@ -41,26 +209,123 @@ class ViewStyle():
                 if 'scope' not in plist_settings_dict:
                     self.default_styles.update(plist_settings_dict['settings'])
 
+            self.selector_index = SelectorIndex(self.content['settings'])
+            self._rule_index = self.selector_index
+
+    def rule_mask(self, scope: str) -> int:
+        mask = self.scope_rule_cache.get(scope)
+        if mask is None:
+            if self._rule_index is None:
+                self._rule_index = SelectorIndex(self.rules)
+
+            mask = resolve_rule_mask(scope, self.rules, self.color_scheme_resource.isLegacy(), self._rule_index)
+            self.scope_rule_cache.set(scope, mask)
+
+        return mask
+
+
+class StyleRegistry():
+
+    # Keeps color schemes and their resolved styles alive across the tests of
+    # a run. The least recently used color scheme is dropped when there are
+    # more than size of them, and each keeps the styles of at most cache_size
+    # scopes.
+
+    def __init__(self, size: int = 8, resources=None, cache_size: int = 4096):
+        self.size = size
+        self.resources = resources
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._styles = OrderedDict()  # type: OrderedDict
+
+    def get(self, view) -> ColorSchemeStyles:
+        color_scheme = view.settings().get('color_scheme')
+        if color_scheme in self._styles:
+            self._styles.move_to_end(color_scheme)
+        else:
+            self._styles[color_scheme] = ColorSchemeStyles(view, self.resources, self.cache_size)
+            if len(self._styles) > self.size:
+                self._styles.popitem(last=False)
+
+        return self._styles[color_scheme]
+
+    def find(self, color_scheme: str):
+        # Returns the styles of the color scheme if they are kept, without
+        # marking them as recently used, otherwise None.
+        return self._styles.get(color_scheme)
+
+
+class ViewStyle():
+
+    def __init__(self, view, registry=None):
+        self.view = view
+        self.registry = registry
+        self.hits = 0
+        self.misses = 0
+        self.resolve_time = 0.0
+
+        # Style resolutions are only timed when profiling, so that they cost
+        # nothing extra otherwise.
+        self.timed = False
+
+        # A list to record the (start, duration) of each style resolution in,
+        # or None.
+        self.resolve_spans = None  # type: list
+
+        if registry:
+            styles = registry.get(view)
+        else:
+            styles = ColorSchemeStyles(view)
+
+        self.styles = styles
+        self.scope_style_cache = styles.scope_style_cache
+        self.color_scheme_resource = styles.color_scheme_resource
+        self.content = styles.content
+
+        if self.color_scheme_resource.isLegacy():
+            self.default_styles = styles.default_styles
+            self.selector_index = styles.selector_index
+
     def at_point(self, point):
+        return self.at_scope(self.view.scope_name(point))
+
+    def at_scope(self, scope):
         # scope_name() needs to striped due to a bug in ST:
         # See https://github.com/SublimeTextIssues/Core/issues/657.
-        scope = self.view.scope_name(point).strip()
+        scope = scope.strip()
+
+        style = self.scope_style_cache.get(scope)
+        if style is not None:
+            self.hits += 1
+            if self.registry:
+                self.registry.hits += 1
+
+            return style
 
-        if scope in self.scope_style_cache:
-            return self.scope_style_cache[scope]
+        self.misses += 1
+        if self.registry:
+            self.registry.misses += 1
 
+        if not self.timed:
+            style = self._resolve(scope)
+            self.scope_style_cache.set(scope, style)
+
+            return style
+
+        resolve_start = timer()
+        style = self._resolve(scope)
+        self.scope_style_cache.set(scope, style)
+        resolve_time = timer() - resolve_start
+        self.resolve_time += resolve_time
+        if self.resolve_spans is not None:
+            self.resolve_spans.append((resolve_start, resolve_time))
+
+        return style
+
+    def _resolve(self, scope: str) -> dict:
         if self.color_scheme_resource.isLegacy():
-            style = self.default_styles.copy()
-            scored_styles = []
-            for color_scheme_definition in self.content['settings']:
-                if 'scope' in color_scheme_definition:
-                    score = score_selector(scope, color_scheme_definition['scope'])
-                    if score:
-                        color_scheme_definition.update({'score': score})
-                        scored_styles.append(color_scheme_definition)
-
-            for s in sorted(scored_styles, key=lambda k: k['score']):
-                style.update(s['settings'])
+            style = resolve_legacy_style(scope, self.default_styles, self.content['settings'], self.selector_index)
         else:
             style = self.view.style()
             scope_style = self.view.style_for_scope(scope)
@@ -73,15 +338,75 @@ class ViewStyle():
 
             style['fontStyle'] = fontStyle.strip()
 
-        self.scope_style_cache[scope] = style
-
         return style
 
+    def rule_hits(self, scope_counts: dict) -> dict:
+        # Returns the rules that style the scopes, as {rule mask: count},
+        # given {scope: count}.
+        hits = {}  # type: dict
+        for scope, count in scope_counts.items():
+            mask = self.styles.rule_mask(scope.strip())
+            hits[mask] = hits.get(mask, 0) + count
 
-class ColorSchemeResource():
+        return hits
+
+
+class RowScopes():
 
     def __init__(self, view):
+        self.view = view
+        self.batch = hasattr(view, 'extract_tokens_with_scopes')
+        self._row = None
+        self._row_runs = []  # type: list
+
+    def runs(self, row: int, begin: int, end: int) -> list:
+        # Returns (begin, end, scope) column runs covering the columns begin to
+        # end of the row. The scopes of the row are fetched with one bulk call
+        # per row when the API is available (ST4). Columns outside of the row
+        # fall back to a scope_name() call per column, as does ST3.
+        if self.batch and row != self._row:
+            self._load_row(row)
+
+        runs = []
+        col = begin
+        for run_begin, run_end, scope in self._row_runs:
+            if run_end <= col:
+                continue
+
+            if run_begin > col or col >= end:
+                break
+
+            runs.append((col, min(run_end, end), scope))
+            col = min(run_end, end)
+
+        for col in range(col, end):
+            runs.append((col, col + 1, self.view.scope_name(self.view.text_point(row, col))))
+
+        return runs
+
+    def _load_row(self, row: int) -> None:
+        self._row = row
+        self._row_runs = []
+
+        if row < 0:
+            return
+
+        line_begin = self.view.text_point(row, 0)
+        if self.view.rowcol(line_begin)[0] != row:
+            return
+
+        line = self.view.line(line_begin)
+        self._row_runs = [
+            (region.begin() - line_begin, region.end() - line_begin, scope)
+            for region, scope in self.view.extract_tokens_with_scopes(line)
+        ]
+
+
+class ColorSchemeResource():
+
+    def __init__(self, view, resources=None):
         self.color_scheme = view.settings().get('color_scheme')
+        self.resources = resources
         self._content = None
 
     def isLegacy(self) -> bool:
@@ -89,6 +414,6 @@ class ColorSchemeResource():
 
     def content(self) -> dict:
         if self._content is None:
-            self._content = load_color_scheme_resource(self.color_scheme)
+            self._content = load_color_scheme_resource(self.color_scheme, self.resources)
 
         return self._content
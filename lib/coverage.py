@@ -1,3 +1,8 @@
+from html import escape
+import json
+
+from ColorSchemeUnit.lib.color import ColorResolver
+from ColorSchemeUnit.lib.color_scheme import color_scheme_rules
 from ColorSchemeUnit.lib.color_scheme import is_new_scheme
 from ColorSchemeUnit.lib.color_scheme import load_color_scheme_resource
 
@@ -49,24 +54,51 @@ _MINIMAL_SCOPES = [
 
 class Coverage():
 
-    def __init__(self, output, enabled: bool, is_single_file: bool):
+    def __init__(self, output, enabled: bool, is_single_file: bool, resources=None, style_registry=None,
+                 file: str = None):
         self.output = output
         self.enabled = enabled
         self.is_single_file = is_single_file
+        self.resources = resources
+        self.style_registry = style_registry
+        self.file = file
         self.tests_info = {}  # type: dict
 
+        # The rules that styled the asserted scopes, as {rule mask: count} by
+        # color scheme, where a rule mask is a bitset of the indexes of the
+        # rules that styled a scope, and the count is the number of asserted
+        # columns it styled.
+        self.rule_hits = {}  # type: dict
+        self.cached_tests = 0
+
     def on_test_start(self, test, data):
         if not self.enabled:
             return
 
         settings = data.settings()
-        color_scheme = settings.get('color_scheme')
-        syntax = settings.get('syntax')
+        self.add_test(test, settings.get('color_scheme'), settings.get('syntax'))
+
+    def on_test_cached(self, test, color_scheme: str, syntax: str) -> None:
+        if not self.enabled:
+            return
+
+        self.cached_tests += 1
+        self.add_test(test, color_scheme, syntax)
+
+    def add_test(self, test, color_scheme: str, syntax: str) -> None:
         self.tests_info[test] = {
             'color_scheme': color_scheme,
             'syntax': syntax
         }
 
+    def on_rule_hits(self, color_scheme: str, hits: dict) -> None:
+        if not self.enabled:
+            return
+
+        color_scheme_hits = self.rule_hits.setdefault(color_scheme, {})
+        for mask, count in hits.items():
+            color_scheme_hits[mask] = color_scheme_hits.get(mask, 0) + count
+
     def print(self, msg: str) -> None:
         self.output.write(msg)
 
@@ -74,126 +106,285 @@ class Coverage():
         if not self.enabled:
             return
 
-        cs_tested_syntaxes = {}  # type: dict
-        for test, info in self.tests_info.items():
-            cs = info['color_scheme']
-            s = info['syntax']
-            if cs not in cs_tested_syntaxes:
-                cs_tested_syntaxes[cs] = []
-            cs_tested_syntaxes[cs].append(s)
-
-        if not cs_tested_syntaxes:
+        report = self.report()
+        if not report:
             return
 
-        self.print('\n')
-        self.print('Generating code coverage report...\n')
-        self.print('\n')
-
-        report_data = []
-        for color_scheme, syntaxes in cs_tested_syntaxes.items():
-            color_scheme_content = load_color_scheme_resource(color_scheme)
-            syntaxes = set(syntaxes)
-
-            if is_new_scheme(color_scheme):
-                colors, scopes = _extract_new_scheme_info(color_scheme_content)
-            else:
-                colors, scopes = _extract_old_scheme_info(color_scheme_content)
-
-            report_data.append({
-                'color_scheme': color_scheme,
-                'syntaxes': syntaxes,
-                'minimal_syntaxes': set(_MINIMAL_SYNTAXES) & syntaxes,
-                'colors': colors,
-                'scopes': scopes,
-                'minimal_scopes': set(_MINIMAL_SCOPES) & scopes,
-            })
-
-            tpl_col_width = max([len(x['color_scheme']) for x in report_data])
-            tpl = '{: <' + str(tpl_col_width) + '} {: >20} {: >20}\n'
-
-            self.print(tpl.format('Name', 'Minimal syntaxes', 'Minimal scopes'))
-            self.print(('-' * tpl_col_width) + '------------------------------------------\n')
-            for info in sorted(report_data, key=lambda x: x['color_scheme']):
-                self.print(tpl.format(
-                    info['color_scheme'],
-                    '{} / {}'.format(len(info['minimal_syntaxes']), len(_MINIMAL_SYNTAXES)),
-                    '{} / {}'.format(len(info['minimal_scopes']), len(_MINIMAL_SCOPES))))
-
-            self.print('\n')
-
-        for i, info in enumerate(sorted(report_data, key=lambda x: x['color_scheme']), start=1):
-            self.print('{}) {}\n'.format(i, info['color_scheme']))
-
-            syntaxes_not_covered = [s for s in sorted(_MINIMAL_SYNTAXES) if s not in info['syntaxes']]
-            scopes_not_covered = [s for s in sorted(_MINIMAL_SCOPES) if s not in info['scopes']]
-            notice_count = len(scopes_not_covered)
-            if not self.is_single_file:
-                notice_count += len(syntaxes_not_covered)
-
-            if notice_count:
-                self.print('\n')
-                self.print('   There %s %s notice%s:' % (
-                    'is' if notice_count == 1 else 'are',
-                    notice_count,
-                    '' if notice_count == 1 else 's',
-                ))
-                self.print('\n')
-
-                # Minimal syntaxes tested report
-                if syntaxes_not_covered and not self.is_single_file:
-                    self.print('\n')
-                    self.print('   The following is a recommended minimal set of syntaxes that should be tested.\n\n')
-                    for i, syntax in enumerate(syntaxes_not_covered, start=1):
-                        self.print('   {}/{}: {}\n'.format(i, len(syntaxes_not_covered), syntax))
-
-                # Minimal scopes tested report
-                if scopes_not_covered:
-                    self.print('\n')
-                    self.print('   The following is a recommended minimal set of scopes that your color scheme should support.\n')  # noqa: E501
-                    self.print('   See https://www.sublimetext.com/docs/scope_naming.html#minimal-scope-coverage\n\n')
-                    for i, scope in enumerate(scopes_not_covered, start=1):
-                        self.print('   {}/{}: {}\n'.format(i, len(scopes_not_covered), scope))
-
-            syntaxes_tested = sorted(info['syntaxes'])
-            colors_used = sorted(info['colors'])
-            colors_used_excl_alpha = sorted(set([color[0:7] for color in colors_used]))
-            colors_used_incl_alpha = sorted(set([color for color in colors_used if len(color) > 7]))
-            scopes_used = sorted(info['scopes'])
-
-            tpl = '   {: <18} | {:>3} | {}\n'
-
-            self.print('\n')
-            self.print(tpl.format('Syntaxes tested', len(syntaxes_tested), sorted(syntaxes_tested)))
-            self.print(tpl.format('Colors used', len(colors_used), colors_used))
-
-            if len(colors_used_excl_alpha) != len(colors_used):
-                self.print(tpl.format('Colors excl. alpha', len(colors_used_excl_alpha), colors_used_excl_alpha))
-
-            if len(colors_used_incl_alpha):
-                self.print(tpl.format('Colors incl. alpha', len(colors_used_incl_alpha), colors_used_incl_alpha))
-
-            self.print(tpl.format('Scopes used', len(scopes_used), sorted(scopes_used)))
-            self.print('\n')
-
-        self.print('\n')
+        # The report is rendered in full, and written in one go.
+        self.print(render_text(report, self.is_single_file, self.cached_tests))
+
+        if self.file:
+            write_report(self.file, report, self.cached_tests)
+
+    def report(self) -> list:
+        # Aggregates the coverage of each color scheme tested, in order of
+        # color scheme name.
+        tested_syntaxes = {}  # type: dict
+        for info in self.tests_info.values():
+            tested_syntaxes.setdefault(info['color_scheme'], set()).add(info['syntax'])
+
+        return [
+            self._color_scheme_report(color_scheme, tested_syntaxes[color_scheme])
+            for color_scheme in sorted(tested_syntaxes)
+        ]
+
+    def _color_scheme_content(self, color_scheme: str) -> dict:
+        # Color schemes parsed during the run are reused.
+        if self.style_registry:
+            styles = self.style_registry.find(color_scheme)
+            if styles:
+                return styles.content
+
+        return load_color_scheme_resource(color_scheme, self.resources)
+
+    def _color_scheme_report(self, color_scheme: str, syntaxes: set) -> dict:
+        content = self._color_scheme_content(color_scheme)
+        legacy = not is_new_scheme(color_scheme)
+
+        if legacy:
+            colors, scopes = _extract_old_scheme_info(content)
+        else:
+            colors, scopes = _extract_new_scheme_info(content)
+
+        rules = color_scheme_rules(content, legacy)
+        hits = _count_rule_hits(self.rule_hits.get(color_scheme, {}), len(rules))
+
+        return {
+            'color_scheme': color_scheme,
+            'syntaxes': sorted(syntaxes),
+            'syntaxes_not_covered': [syntax for syntax in _MINIMAL_SYNTAXES if syntax not in syntaxes],
+            'colors': sorted(colors),
+            'scopes': sorted(scopes),
+            'scopes_not_covered': [scope for scope in _MINIMAL_SCOPES if scope not in scopes],
+            # Rules are numbered from 1 in the order of the color scheme.
+            'rules': [
+                {'rule': i + 1, 'scope': rule['scope'], 'name': rule.get('name'), 'hits': hits[i]}
+                for i, rule in enumerate(rules) if 'scope' in rule
+            ],
+        }
+
+
+def render_text(report: list, is_single_file: bool, cached_tests: int = 0) -> str:
+    out = []  # type: list
+    write = out.append
+
+    write('\n')
+    write('Generating code coverage report...\n')
+    write('\n')
+
+    tpl_col_width = max(len(info['color_scheme']) for info in report)
+    tpl = '{: <' + str(tpl_col_width) + '} {: >20} {: >20} {: >20}\n'
+
+    write(tpl.format('Name', 'Minimal syntaxes', 'Minimal scopes', 'Rules hit'))
+    write(('-' * tpl_col_width) + '---------------------------------------------------------------\n')
+    for info in report:
+        write(tpl.format(
+            info['color_scheme'],
+            '{} / {}'.format(len(_MINIMAL_SYNTAXES) - len(info['syntaxes_not_covered']), len(_MINIMAL_SYNTAXES)),
+            '{} / {}'.format(len(_MINIMAL_SCOPES) - len(info['scopes_not_covered']), len(_MINIMAL_SCOPES)),
+            '{} / {}'.format(len([rule for rule in info['rules'] if rule['hits']]), len(info['rules']))))
+
+    write('\n')
+
+    for i, info in enumerate(report, start=1):
+        write('{}) {}\n'.format(i, info['color_scheme']))
+
+        syntaxes_not_covered = info['syntaxes_not_covered']
+        scopes_not_covered = info['scopes_not_covered']
+        notice_count = len(scopes_not_covered)
+        if not is_single_file:
+            notice_count += len(syntaxes_not_covered)
+
+        if notice_count:
+            write('\n')
+            write('   There %s %s notice%s:' % (
+                'is' if notice_count == 1 else 'are',
+                notice_count,
+                '' if notice_count == 1 else 's',
+            ))
+            write('\n')
+
+            # Minimal syntaxes tested report
+            if syntaxes_not_covered and not is_single_file:
+                write('\n')
+                write('   The following is a recommended minimal set of syntaxes that should be tested.\n\n')
+                for j, syntax in enumerate(syntaxes_not_covered, start=1):
+                    write('   {}/{}: {}\n'.format(j, len(syntaxes_not_covered), syntax))
+
+            # Minimal scopes tested report
+            if scopes_not_covered:
+                write('\n')
+                write('   The following is a recommended minimal set of scopes that your color scheme should support.\n')  # noqa: E501
+                write('   See https://www.sublimetext.com/docs/scope_naming.html#minimal-scope-coverage\n\n')
+                for j, scope in enumerate(scopes_not_covered, start=1):
+                    write('   {}/{}: {}\n'.format(j, len(scopes_not_covered), scope))
+
+        colors_used = info['colors']
+        colors_used_excl_alpha = sorted(set([color[0:7] for color in colors_used]))
+        colors_used_incl_alpha = [color for color in colors_used if len(color) > 7]
+
+        tpl = '   {: <18} | {:>3} | {}\n'
+
+        write('\n')
+        write(tpl.format('Syntaxes tested', len(info['syntaxes']), info['syntaxes']))
+        write(tpl.format('Colors used', len(colors_used), colors_used))
+
+        if len(colors_used_excl_alpha) != len(colors_used):
+            write(tpl.format('Colors excl. alpha', len(colors_used_excl_alpha), colors_used_excl_alpha))
+
+        if len(colors_used_incl_alpha):
+            write(tpl.format('Colors incl. alpha', len(colors_used_incl_alpha), colors_used_incl_alpha))
+
+        write(tpl.format('Scopes used', len(info['scopes']), info['scopes']))
+        write('\n')
+
+        rules_not_hit = [rule for rule in info['rules'] if not rule['hits']]
+        rules_hit = sorted((rule for rule in info['rules'] if rule['hits']), key=lambda rule: -rule['hits'])
+
+        if cached_tests:
+            write('   Rule hits exclude the %d test%s skipped as unchanged.\n\n' % (
+                cached_tests,
+                '' if cached_tests == 1 else 's'))
+
+        if rules_not_hit:
+            write('   The following rules did not style any asserted scope.\n\n')
+            for rule in rules_not_hit:
+                write('   #{}: {}\n'.format(rule['rule'], _rule_label(rule)))
+
+            write('\n')
+
+        if rules_hit:
+            write('   {: >8} | Rule\n'.format('Hits'))
+            for rule in rules_hit:
+                write('   {: >8} | #{}: {}\n'.format(rule['hits'], rule['rule'], _rule_label(rule)))
+
+            write('\n')
+
+    write('\n')
+
+    return ''.join(out)
+
+
+def render_json(report: list, cached_tests: int = 0) -> str:
+    return json.dumps({
+        'format': 1,
+        'minimal_syntaxes': _MINIMAL_SYNTAXES,
+        'minimal_scopes': _MINIMAL_SCOPES,
+        'cached_tests': cached_tests,
+        'color_schemes': report,
+    }, indent=2, sort_keys=True)
+
+
+def render_html(report: list, cached_tests: int = 0) -> str:
+    out = []  # type: list
+    write = out.append
+
+    write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>ColorSchemeUnit Coverage</title>\n')
+    write('<style>body{font-family:sans-serif}table{border-collapse:collapse;margin:1em 0}'
+          'td,th{border:1px solid #ccc;padding:2px 8px;text-align:left}td.n{text-align:right}'
+          '.miss{background:#fdd}</style>\n</head>\n<body>\n<h1>ColorSchemeUnit Coverage</h1>\n')
+
+    if cached_tests:
+        write('<p>Rule hits exclude the %d test%s skipped as unchanged.</p>\n' % (
+            cached_tests,
+            '' if cached_tests == 1 else 's'))
+
+    write('<table>\n<tr><th>Name</th><th>Minimal syntaxes</th><th>Minimal scopes</th><th>Rules hit</th></tr>\n')
+    for info in report:
+        write('<tr><td><a href="#%s">%s</a></td><td class="n">%d / %d</td><td class="n">%d / %d</td>'
+              '<td class="n">%d / %d</td></tr>\n' % (
+                  escape(info['color_scheme']),
+                  escape(info['color_scheme']),
+                  len(_MINIMAL_SYNTAXES) - len(info['syntaxes_not_covered']), len(_MINIMAL_SYNTAXES),
+                  len(_MINIMAL_SCOPES) - len(info['scopes_not_covered']), len(_MINIMAL_SCOPES),
+                  len([rule for rule in info['rules'] if rule['hits']]), len(info['rules'])))
+
+    write('</table>\n')
+
+    for info in report:
+        write('<h2 id="%s">%s</h2>\n' % (escape(info['color_scheme']), escape(info['color_scheme'])))
+        for title, items in (
+                ('Syntaxes tested', info['syntaxes']),
+                ('Minimal syntaxes not tested', info['syntaxes_not_covered']),
+                ('Minimal scopes not supported', info['scopes_not_covered']),
+                ('Colors used', info['colors']),
+                ('Scopes used', info['scopes'])):
+            if items:
+                write('<h3>%s (%d)</h3>\n<p>%s</p>\n' % (title, len(items), escape(', '.join(items))))
+
+        if info['rules']:
+            write('<h3>Rules</h3>\n<table>\n<tr><th>#</th><th>Rule</th><th>Hits</th></tr>\n')
+            for rule in info['rules']:
+                write('<tr%s><td class="n">%d</td><td>%s</td><td class="n">%d</td></tr>\n' % (
+                    '' if rule['hits'] else ' class="miss"',
+                    rule['rule'],
+                    escape(_rule_label(rule)),
+                    rule['hits']))
+
+            write('</table>\n')
+
+    write('</body>\n</html>\n')
+
+    return ''.join(out)
+
+
+def write_report(file: str, report: list, cached_tests: int = 0) -> None:
+    # Writes the report as JSON if the file name ends with .json, otherwise
+    # as HTML.
+    if file.endswith('.json'):
+        content = render_json(report, cached_tests)
+    else:
+        content = render_html(report, cached_tests)
+
+    with open(file, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def _rule_label(rule: dict) -> str:
+    if rule.get('name'):
+        return '{} ({})'.format(rule['scope'], rule['name'])
+
+    return rule['scope']
+
+
+def _count_rule_hits(rule_hits: dict, rule_count: int) -> list:
+    # Returns the number of asserted columns each rule styled, given the
+    # counts of rule masks.
+    hits = [0] * rule_count
+    for mask, count in rule_hits.items():
+        while mask:
+            bit = mask & -mask
+            i = bit.bit_length() - 1
+            if i < rule_count:
+                hits[i] += count
+            mask ^= bit
+
+    return hits
 
 
 def _extract_new_scheme_info(content: dict) -> tuple:
+    # Colors are resolved, so colors given as variables, CSS color names,
+    # or functions such as color() are included.
+    resolver = ColorResolver(content.get('variables', {}))
     colors = set()
 
-    if 'globals' in content:
-        for k, v in content['globals'].items():
-            if v.startswith('#'):
-                colors.add(v.lower())
-    if 'variables' in content:
-        for k, v in content['variables'].items():
-            if v.startswith('#'):
-                colors.add(v.lower())
-    if 'rules' in content:
-        for rule in content['rules']:
-            for k, v in rule.items():
-                if v.startswith('#'):
-                    colors.add(v.lower())
+    def add_color(value):
+        if isinstance(value, list):
+            for item in value:
+                add_color(item)
+        else:
+            color = resolver.resolve(value)
+            if isinstance(color, str) and color.startswith('#'):
+                colors.add(color)
+
+    for value in content.get('globals', {}).values():
+        add_color(value)
+    for value in content.get('variables', {}).values():
+        add_color(value)
+    for rule in content.get('rules', []):
+        for key, value in rule.items():
+            if key not in ('name', 'scope', 'font_style'):
+                add_color(value)
 
     scopes = set()
 
@@ -1,28 +1,148 @@
+from sublime import Region
+
+from ColorSchemeUnit.lib.color_scheme import RowScopes
 from ColorSchemeUnit.lib.color_scheme import ViewStyle
 
 
-def generate_color_scheme_assertions(view, pt):
-    line = view.line(pt)
+def generate_color_scheme_assertions(view, pt, color_scheme_style=None):
+    row = view.rowcol(pt)[0]
+
+    return generate_assertions(view, [row], color_scheme_style).get(row, '')
+
+
+def generate_assertions(view, rows, color_scheme_style=None) -> dict:
+    # Returns the assertions of each of the rows, as {row: assertions},
+    # leaving out rows without any and rows that are assertions themselves.
+    # The color scheme is loaded once, and styles are resolved once per scope.
+    if color_scheme_style is None:
+        color_scheme_style = ViewStyle(view)
+
+    row_scopes = RowScopes(view)
+    assertions = {}
+    for row in rows:
+        line = view.line(view.text_point(row, 0))
+        text = view.substr(line)
+        comment_start, comment_end = _get_comment_markers(view, line.begin())
+        if _is_assertion(text, comment_start) or 'COLOR SCHEME TEST' in text:
+            continue
+
+        styles = _line_styles(text, row_scopes.runs(row, 0, len(text)), color_scheme_style)
+        row_assertions = _build_assertions(styles, comment_start, comment_end)
+        if row_assertions:
+            assertions[row] = row_assertions
+
+    return assertions
+
 
+def _line_styles(text: str, runs: list, color_scheme_style) -> list:
+    # The style of each column of a line, or '' for spaces, given the runs of
+    # columns with the same scope.
     styles = []
-    color_scheme_style = ViewStyle(view)
-    for i in range(line.begin(), line.end()):
-        if view.substr(i) == ' ':
-            styles.append('')
-        else:
-            style = color_scheme_style.at_point(i)
-            if 'fontStyle' not in style:
-                style['fontStyle'] = ''
+    for begin, end, scope in runs:
+        style = color_scheme_style.at_scope(scope)
+        style = 'fg={} fs={}'.format(style['foreground'], style.get('fontStyle', ''))
+        for col in range(begin, end):
+            styles.append('' if text[col] == ' ' else style)
+
+    return styles
+
+
+def _is_assertion(text: str, comment_start: str) -> bool:
+    text = text.lstrip()
+    if not comment_start.strip() or not text.startswith(comment_start.strip()):
+        return False
+
+    return text[len(comment_start.strip()):].lstrip().startswith(('^', '<-'))
+
+
+def insert_assertions(view, edit, assertions: dict) -> None:
+    # Inserts the assertions below their rows. The rows spanned are replaced
+    # in one go, rather than inserting each row's assertions separately, and
+    # selections are kept on the same text.
+    if not assertions:
+        return
+
+    rows = sorted(assertions)
+    region = Region(view.text_point(rows[0], 0), view.line(view.text_point(rows[-1], 0)).end())
+
+    lines = []
+    for row, line in enumerate(view.substr(region).split('\n'), start=rows[0]):
+        lines.append(line)
+        if row in assertions:
+            lines.append(assertions[row])
+
+    # The number of lines inserted above each row.
+    inserted = 0
+    shifts = {}
+    for row in range(rows[0], rows[-1] + 1):
+        shifts[row] = inserted
+        if row in assertions:
+            inserted += assertions[row].count('\n') + 1
+
+    def shift(point):
+        row, col = view.rowcol(point)
+        if row <= rows[-1]:
+            return (row + shifts.get(row, 0), col)
+
+        return (row + inserted, col)
+
+    selections = [(shift(region.a), shift(region.b)) for region in view.sel()]
+
+    view.replace(edit, region, '\n'.join(lines))
+
+    view.sel().clear()
+    for a, b in selections:
+        view.sel().add(Region(view.text_point(*a), view.text_point(*b)))
+
+
+def update_assertions(content: str, assertions: list, failures: list) -> tuple:
+    # Rewrites the assertions of a test that failed so that they assert the
+    # actual styles, given the assertions of its test plan and its failures.
+    # Failures are grouped by row, and an assertion whose columns now have
+    # different styles is split into an assertion per style. Returns the new
+    # content, and the number of assertions rewritten.
+    actual = {}  # type: dict
+    for failure in failures:
+        key = (failure['row'] - 1, failure['assertion'])
+        actual.setdefault(key, {})[failure['col'] - 1] = failure['actual']
+
+    lines = content.splitlines(True)
+    updated = 0
+    for line_number, row, begin, end, expected, requires_build, assertion in assertions:
+        row_actual = actual.get((row, assertion))
+        if row_actual is None:
+            continue
+
+        line = lines[line_number]
+        text = line.rstrip('\r\n')
+        newline = line[len(text):]
+
+        # Everything before the carets, such as the comment, is kept, and so is
+        # the end of a block comment.
+        comment_end = text[len(text.rstrip(' -->').rstrip(' */')):]
+
+        styles = [''] * begin
+        for col in range(begin, end):
+            styles.append(_format_assertion_style(row_actual.get(col, expected), requires_build))
+
+        lines[line_number] = _build_assertions(styles, text[:begin], comment_end).replace(
+            '\n', newline or '\n') + newline
+        updated += 1
 
-            styles.append('fg={} fs={}'.format(style['foreground'], style['fontStyle']))
+    return (''.join(lines), updated)
 
-    return _generate_assertions(styles, view, pt)
 
+def _format_assertion_style(style: dict, requires_build=None) -> str:
+    # The font style comes last so that an empty one is unambiguous.
+    values = []
+    for key, name in (('foreground', 'fg'), ('background', 'bg'), ('fontStyle', 'fs')):
+        if key in style:
+            values.append('{}={}'.format(name, style[key]))
 
-def _generate_assertions(items, view, pt):
-    comment_start, comment_end = _get_comment_markers(view, pt)
+    if requires_build:
+        values.append('build>={}'.format(requires_build))
 
-    return _build_assertions(items, comment_start, comment_end)
+    return ' '.join(values)
 
 
 def _build_assertions(styles, comment_start, comment_end):
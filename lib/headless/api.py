@@ -0,0 +1,481 @@
+from bisect import bisect_right
+import fnmatch
+import json
+import os
+import re
+import sys
+import zipfile
+
+from ColorSchemeUnit.lib.color import ColorResolver
+from ColorSchemeUnit.lib.headless.selector import score_selector  # noqa: F401
+
+# A stand-in for the sublime module, used by the headless engine to run the
+# test runner outside of Sublime Text. Only the parts of the API used by the
+# runner are implemented. Resources are read from packages directories and
+# .sublime-package files, and views are tokenized by a scope provider, see
+# ColorSchemeUnit.lib.headless.scopes.
+
+HEADLESS_BUILD = '4180'
+
+_config = {
+    'packages': [],
+    'cache': None,
+    'build': HEADLESS_BUILD,
+    'scope_provider': None,
+}  # type: dict
+
+_resources = None  # type: dict
+_resource_names = []  # type: list
+_settings = {}  # type: dict
+_windows = []  # type: list
+
+# The syntaxes of the test fixtures that the scope provider had no scopes for.
+missing_scopes = []  # type: list
+
+
+def configure(packages: list, cache: str, build: str = None, scope_provider=None) -> None:
+    global _resources
+
+    _config['packages'] = [os.path.realpath(path) for path in packages]
+    _config['cache'] = cache
+    _config['build'] = build or HEADLESS_BUILD
+    _config['scope_provider'] = scope_provider
+    _resources = None
+    _settings.clear()
+    del _windows[:]
+    del missing_scopes[:]
+
+
+def set_scope_provider(scope_provider) -> None:
+    _config['scope_provider'] = scope_provider
+
+
+def install() -> None:
+    sys.modules['sublime'] = sys.modules[__name__]
+
+
+def version() -> str:
+    return _config['build']
+
+
+def platform() -> str:
+    if sys.platform.startswith('win'):
+        return 'windows'
+
+    if sys.platform == 'darwin':
+        return 'osx'
+
+    return 'linux'
+
+
+def arch() -> str:
+    return 'x64'
+
+
+def packages_path() -> str:
+    return _config['packages'][0] if _config['packages'] else ''
+
+
+def cache_path() -> str:
+    return _config['cache']
+
+
+def status_message(msg: str) -> None:
+    pass
+
+
+def set_timeout(callback, delay: int = 0) -> None:
+    callback()
+
+
+def set_timeout_async(callback, delay: int = 0) -> None:
+    callback()
+
+
+def _package_order(package: str):
+    # Default is loaded first and User last, as by Sublime Text.
+    return (package != 'Default', package == 'User', package)
+
+
+def _index_resources() -> dict:
+    # Maps resource paths, for example "Packages/PHP/PHP.sublime-syntax", to
+    # the (archive, path) they're loaded from; archive is None for files.
+    # Files override the contents of .sublime-package archives.
+    archived = {}  # type: dict
+    files = {}  # type: dict
+    for path in _config['packages']:
+        if not os.path.isdir(path):
+            continue
+
+        for name in sorted(os.listdir(path)):
+            package_path = os.path.join(path, name)
+            if name.endswith('.sublime-package') and os.path.isfile(package_path):
+                package = name[:-len('.sublime-package')]
+                with zipfile.ZipFile(package_path) as archive:
+                    for entry in archive.namelist():
+                        if not entry.endswith('/'):
+                            archived.setdefault('Packages/%s/%s' % (package, entry), (package_path, entry))
+            elif os.path.isdir(package_path):
+                for root, dirs, file_names in os.walk(package_path, followlinks=True):
+                    dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != '__pycache__')
+                    for file_name in sorted(file_names):
+                        file = os.path.join(root, file_name)
+                        resource = 'Packages/%s/%s' % (name, os.path.relpath(file, package_path).replace(os.sep, '/'))
+                        files.setdefault(resource, (None, file))
+
+    archived.update(files)
+
+    return archived
+
+
+def _get_resources() -> dict:
+    global _resources, _resource_names
+
+    if _resources is None:
+        _resources = _index_resources()
+        _resource_names = sorted(_resources, key=lambda r: _package_order(r.split('/')[1]) + (r,))
+
+    return _resources
+
+
+def find_resources(pattern: str) -> list:
+    _get_resources()
+
+    return [r for r in _resource_names if fnmatch.fnmatchcase(r.rpartition('/')[2], pattern)]
+
+
+def load_binary_resource(name: str) -> bytes:
+    try:
+        archive, path = _get_resources()[name]
+    except KeyError:
+        raise IOError('resource not found: {}'.format(name))
+
+    if archive is None:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    with zipfile.ZipFile(archive) as z:
+        return z.read(path)
+
+
+def load_resource(name: str) -> str:
+    return load_binary_resource(name).decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+_JSON_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|//[^\n]*|/\*.*?\*/|,(?=\s*[\]}])', re.DOTALL)
+
+
+def decode_value(data: str):
+    # Sublime Text JSON allows comments and trailing commas.
+    def strip(match):
+        token = match.group(0)
+
+        return token if token.startswith('"') else ''
+
+    return json.loads(_JSON_TOKENS.sub(strip, data))
+
+
+class Region():
+
+    def __init__(self, a: int, b: int = None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self) -> int:
+        return min(self.a, self.b)
+
+    def end(self) -> int:
+        return max(self.a, self.b)
+
+    def size(self) -> int:
+        return abs(self.b - self.a)
+
+    def empty(self) -> bool:
+        return self.a == self.b
+
+
+class Settings():
+
+    def __init__(self, values: dict = None, parent=None):
+        self.values = values or {}
+        self.parent = parent
+
+    def get(self, key: str, default=None):
+        if key in self.values:
+            return self.values[key]
+
+        if self.parent:
+            return self.parent.get(key, default)
+
+        return default
+
+    def has(self, key: str) -> bool:
+        return key in self.values or bool(self.parent and self.parent.has(key))
+
+    def set(self, key: str, value) -> None:
+        self.values[key] = value
+
+    def erase(self, key: str) -> None:
+        self.values.pop(key, None)
+
+
+def load_settings(name: str) -> Settings:
+    if name not in _settings:
+        values = {}  # type: dict
+        for resource in find_resources(name):
+            values.update(decode_value(load_resource(resource)))
+
+        _settings[name] = Settings(values)
+
+    return _settings[name]
+
+
+def save_settings(name: str) -> None:
+    pass
+
+
+_FONT_STYLES = ('bold', 'italic', 'glow', 'underline', 'stippled_underline', 'squiggly_underline')
+
+
+class _ColorScheme():
+
+    # A .sublime-color-scheme merged with its overrides, that is all
+    # resources with the same file name.
+
+    def __init__(self, color_scheme: str):
+        self.variables = {}  # type: dict
+        self.globals = {}  # type: dict
+        self.rules = []  # type: list
+
+        for resource in find_resources(color_scheme.rpartition('/')[2]):
+            content = decode_value(load_resource(resource))
+            self.variables.update(content.get('variables', {}))
+            self.globals.update(content.get('globals', {}))
+            self.rules += content.get('rules', [])
+
+        self.colors = ColorResolver(self.variables)
+
+    def style(self) -> dict:
+        return {key: self.colors.resolve(value) for key, value in self.globals.items()}
+
+    def style_for_scope(self, scope: str) -> dict:
+        # The highest scoring rule wins each property; the later rule wins
+        # ties.
+        best = {}  # type: dict
+        for rule in self.rules:
+            if 'scope' not in rule:
+                continue
+
+            score = score_selector(scope, rule['scope'])
+            if not score:
+                continue
+
+            for key in ('foreground', 'background', 'font_style'):
+                if key in rule and score >= best.get(key, (0, None))[0]:
+                    best[key] = (score, rule[key])
+
+        style = {}
+        if 'foreground' in self.globals:
+            style['foreground'] = self.colors.resolve(self.globals['foreground'])
+
+        for key in ('foreground', 'background'):
+            if key in best and isinstance(best[key][1], str):
+                style[key] = self.colors.resolve(best[key][1])
+
+        if 'font_style' in best:
+            for font_style in best['font_style'][1].split():
+                if font_style in _FONT_STYLES:
+                    style[font_style] = True
+
+        return style
+
+
+class View():
+
+    _next_id = 0
+
+    def __init__(self, window, name: str = ''):
+        View._next_id += 1
+        self._id = View._next_id
+        self._window = window
+        self._name = name
+        self._settings = Settings(parent=load_settings('Preferences.sublime-settings'))
+        self._text = ''
+        self._lines = [0]
+        self._tokens = []  # type: list
+        self._token_begins = []  # type: list
+        self._color_schemes = {}  # type: dict
+        self._file_name = None
+
+    def id(self) -> int:
+        return self._id
+
+    def window(self):
+        return self._window
+
+    def settings(self) -> Settings:
+        return self._settings
+
+    def name(self) -> str:
+        return self._name
+
+    def set_name(self, name: str) -> None:
+        self._name = name
+
+    def set_scratch(self, scratch: bool) -> None:
+        pass
+
+    def clear_undo_stack(self) -> None:
+        pass
+
+    def file_name(self):
+        return self._file_name
+
+    def assign_syntax(self, syntax: str) -> None:
+        self._settings.set('syntax', syntax)
+
+    def set_syntax_file(self, syntax: str) -> None:
+        self.assign_syntax(syntax)
+
+    def close(self) -> None:
+        if self in self._window._views:
+            self._window._views.remove(self)
+
+    def size(self) -> int:
+        return len(self._text)
+
+    def substr(self, x):
+        if isinstance(x, Region):
+            return self._text[x.begin():x.end()]
+
+        return self._text[x:x + 1]
+
+    def run_command(self, cmd: str, args: dict = None) -> None:
+        if cmd == 'append':
+            self._set_text(self._text + args['characters'])
+        elif cmd == 'color_scheme_unit_setup_test_fixture':
+            self._set_text(args['content'])
+            self._tokenize()
+
+    def _set_text(self, text: str) -> None:
+        self._text = text
+        self._lines = [0] + [m.end() for m in re.finditer('\n', text)]
+        self._tokens = []
+        self._token_begins = []
+
+    def _tokenize(self) -> None:
+        syntax = self._settings.get('syntax')
+        provider = _config['scope_provider']
+        tokens = provider(self._text, syntax) if provider else None
+        if tokens is None:
+            missing_scopes.append(syntax)
+            raise LookupError('no scopes found for test fixture (syntax: {}); export them with '
+                              '"ColorSchemeUnit: Export Scopes" or use another scope provider'.format(syntax))
+
+        self._tokens = [tuple(token) for token in tokens]
+        self._token_begins = [token[0] for token in self._tokens]
+
+    def text_point(self, row: int, col: int) -> int:
+        if row < 0:
+            return 0
+
+        if row >= len(self._lines):
+            return len(self._text)
+
+        return min(self._lines[row] + col, len(self._text))
+
+    def rowcol(self, point: int) -> tuple:
+        row = bisect_right(self._lines, point) - 1
+
+        return (row, point - self._lines[row])
+
+    def line(self, x) -> Region:
+        point = x.begin() if isinstance(x, Region) else x
+        row = self.rowcol(point)[0]
+        end = self._lines[row + 1] - 1 if row + 1 < len(self._lines) else len(self._text)
+
+        return Region(self._lines[row], end)
+
+    def scope_name(self, point: int) -> str:
+        i = bisect_right(self._token_begins, point) - 1
+        if i >= 0 and point < self._tokens[i][1]:
+            return self._tokens[i][2]
+
+        # The end of the buffer, or a gap in the tokens, has the scope of the
+        # preceding token.
+        return self._tokens[i][2] if i >= 0 else ''
+
+    def extract_tokens_with_scopes(self, region: Region) -> list:
+        begin = region.begin()
+        end = region.end()
+        tokens = []
+        for i in range(max(bisect_right(self._token_begins, begin) - 1, 0), len(self._tokens)):
+            token_begin, token_end, scope = self._tokens[i]
+            if token_begin >= end:
+                break
+
+            if token_end > begin:
+                tokens.append((Region(max(token_begin, begin), min(token_end, end)), scope))
+
+        return tokens
+
+    def _color_scheme(self) -> _ColorScheme:
+        color_scheme = self._settings.get('color_scheme')
+        if color_scheme not in self._color_schemes:
+            self._color_schemes[color_scheme] = _ColorScheme(color_scheme)
+
+        return self._color_schemes[color_scheme]
+
+    def style(self) -> dict:
+        return self._color_scheme().style()
+
+    def style_for_scope(self, scope: str) -> dict:
+        return self._color_scheme().style_for_scope(scope)
+
+
+class Window():
+
+    def __init__(self):
+        self._views = []  # type: list
+        self._panels = {}  # type: dict
+        self._active_view = View(self)
+
+    def id(self) -> int:
+        return id(self)
+
+    def active_view(self) -> View:
+        return self._active_view
+
+    def views(self) -> list:
+        return list(self._views)
+
+    def new_file(self) -> View:
+        view = View(self)
+        self._views.append(view)
+
+        return view
+
+    def create_output_panel(self, name: str, unlisted: bool = False) -> View:
+        self._panels[name] = View(self, name)
+
+        return self._panels[name]
+
+    def find_output_panel(self, name: str):
+        return self._panels.get(name)
+
+    def destroy_output_panel(self, name: str) -> None:
+        self._panels.pop(name, None)
+
+    def run_command(self, cmd: str, args: dict = None) -> None:
+        pass
+
+
+def active_window() -> Window:
+    if not _windows:
+        _windows.append(Window())
+
+    return _windows[0]
+
+
+def windows() -> list:
+    return list(_windows)
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from ColorSchemeUnit.lib.headless import api
+from ColorSchemeUnit.lib.headless.scopes import ScopesFileProvider
+from ColorSchemeUnit.lib.headless.scopes import load_scope_provider
+from ColorSchemeUnit.lib.history import parse_shard
+
+# Runs color scheme tests without Sublime Text. The test runner is run as is,
+# against the stand-in sublime module in ColorSchemeUnit.lib.headless.api, so
+# results are the same as in Sublime Text given the same scopes. Usage:
+#
+#   bin/color-scheme-unit --packages path/to/Packages MyPackage
+#
+# Like in Sublime Text, file names are reported relative to the parent of the
+# (first) packages directory, so it should be named "Packages".
+
+
+class StreamOutput():
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        self.stream.write(text)
+
+    def writeln(self, s):
+        self.write(s + "\n")
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+
+def _parse_setting(setting: str) -> tuple:
+    key, sep, value = setting.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError('invalid setting: {}; expected key=value'.format(setting))
+
+    try:
+        return (key, json.loads(value))
+    except ValueError:
+        return (key, value)
+
+
+def _parse_shard(shard: str) -> str:
+    try:
+        parse_shard(shard)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+    return shard
+
+
+def _argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='color-scheme-unit',
+        description='Run ColorSchemeUnit tests without Sublime Text.')
+    parser.add_argument('package', nargs='?', help='the package to test')
+    parser.add_argument('--file', help='the test file to run, instead of a package')
+    parser.add_argument(
+        '--packages', action='append', metavar='DIR',
+        help='a directory of packages and .sublime-package files (can be given more than once; '
+             'defaults to the current directory)')
+    parser.add_argument(
+        '--scopes', action='append', metavar='FILE',
+        help='a scopes file exported by "ColorSchemeUnit: Export Scopes" (can be given more than once; '
+             'defaults to the color_scheme_scopes.json files found in the packages)')
+    parser.add_argument('--scope-provider', metavar='MODULE:CALLABLE', help='a custom scope provider')
+    parser.add_argument('--cache', metavar='DIR', help='the cache directory')
+    parser.add_argument('--build', help='the Sublime Text build to emulate (default: %s)' % api.HEADLESS_BUILD)
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=1, metavar='N',
+        help='the number of tests to run in parallel; 0 for one per CPU (default: 1)')
+    parser.add_argument(
+        '--shard', type=_parse_shard, metavar='I/N',
+        help='run the I-th of N shards of the tests, balanced by the test times in the run history; '
+             'the same as --setting color_scheme_unit.shard=I/N')
+    parser.add_argument(
+        '--update', '-u', action='store_true',
+        help='rewrite failing assertions to assert the actual styles')
+    parser.add_argument(
+        '--setting', action='append', type=_parse_setting, default=[], metavar='KEY=VALUE',
+        help='a setting, for example color_scheme_unit.coverage=true (can be given more than once)')
+
+    return parser
+
+
+def setup(config: dict):
+    # Installs and configures the stand-in sublime module, and returns the
+    # window to run tests in. Also used by the workers of parallel runs.
+    api.configure(config['packages'], config['cache'], config['build'])
+    api.install()
+
+    if config['scope_provider']:
+        sys.path.insert(0, config['cwd'])
+        api.set_scope_provider(load_scope_provider(config['scope_provider']))
+    else:
+        scopes_files = config['scopes']
+        if not scopes_files:
+            scopes_files = [
+                os.path.join(os.path.dirname(api.packages_path()), resource)
+                for resource in api.find_resources('color_scheme_scopes.json')
+            ]
+
+        api.set_scope_provider(ScopesFileProvider(scopes_files))
+
+    window = api.active_window()
+    for key, value in config['settings']:
+        window.active_view().settings().set(key, value)
+
+    return window
+
+
+def main(argv=None) -> int:
+    args = _argument_parser().parse_args(argv)
+    if bool(args.package) == bool(args.file):
+        _argument_parser().error('a package or --file is required, but not both')
+
+    config = {
+        'packages': args.packages or [os.getcwd()],
+        'cache': args.cache or os.path.join(tempfile.gettempdir(), 'color-scheme-unit-cache'),
+        'build': args.build,
+        'scope_provider': args.scope_provider,
+        'scopes': args.scopes,
+        'settings': args.setting + ([('color_scheme_unit.shard', args.shard)] if args.shard else []),
+        'cwd': os.getcwd(),
+    }
+
+    window = setup(config)
+
+    # The runner is imported after the stand-in sublime module is installed.
+    if args.jobs != 1:
+        from ColorSchemeUnit.lib.headless.parallel import ParallelColorSchemeUnit
+        runner = ParallelColorSchemeUnit(window, config, args.jobs or os.cpu_count() or 1)
+    else:
+        from ColorSchemeUnit.lib.runner import ColorSchemeUnit
+        runner = ColorSchemeUnit(window)
+
+    ok = runner.run(
+        package=args.package,
+        file=args.file,
+        output=StreamOutput(sys.stdout),
+        update=args.update,
+        **{'async': False})
+
+    # Tests that can't be tokenized raise an exception, which the runner
+    # reports but doesn't count as an error.
+    if api.missing_scopes:
+        sys.stdout.write('\nNo scopes found for %d test%s.\n' % (
+            len(api.missing_scopes),
+            '' if len(api.missing_scopes) == 1 else 's'))
+
+        return 1
+
+    return 0 if ok else 1
@@ -0,0 +1,226 @@
+from concurrent.futures import ProcessPoolExecutor
+import sys
+
+from ColorSchemeUnit.lib.headless import api
+
+# Worker processes may import this module before they're set up, so the
+# stand-in sublime module is installed before the runner is imported.
+api.install()
+
+from ColorSchemeUnit.lib.cache import TestPlanCache  # noqa: E402
+from ColorSchemeUnit.lib.cache import TestResultCache  # noqa: E402
+from ColorSchemeUnit.lib.color_scheme import StyleRegistry  # noqa: E402
+from ColorSchemeUnit.lib.headless.engine import setup  # noqa: E402
+from ColorSchemeUnit.lib.profiler import Profiler  # noqa: E402
+from ColorSchemeUnit.lib.resources import ResourceIndex  # noqa: E402
+from ColorSchemeUnit.lib.runner import ColorSchemeUnit  # noqa: E402
+from ColorSchemeUnit.lib.runner import run_color_scheme_test  # noqa: E402
+from ColorSchemeUnit.lib.test import TestViewPool  # noqa: E402
+
+# Runs the tests of a headless run in a pool of worker processes. Each worker
+# runs tests with run_color_scheme_test(), as a sequential run does, and
+# records the calls it makes to the result printer, coverage and result cache.
+# The calls are replayed in the main process in test order, so the output,
+# results and caches are the same as those of a sequential run.
+
+_worker = {}  # type: dict
+
+
+class _TestViewSnapshot():
+
+    # The settings of a test view that the result printer and coverage use,
+    # in a form that can be sent back to the main process.
+
+    def __init__(self, data):
+        settings = data.settings()
+        self._settings = {
+            'color_scheme': settings.get('color_scheme'),
+            'syntax': settings.get('syntax'),
+        }
+
+    def settings(self) -> dict:
+        return self._settings
+
+
+class _Recorder():
+
+    def __init__(self):
+        self.calls = []  # type: list
+
+    def record(self, name: str, *args) -> None:
+        # Repeated calls, for example to on_assertion(), are recorded once
+        # with a count.
+        if self.calls and self.calls[-1][0] == name and self.calls[-1][1] == args:
+            self.calls[-1][2] += 1
+        else:
+            self.calls.append([name, args, 1])
+
+    def replay(self, target) -> None:
+        for name, args, count in self.calls:
+            method = getattr(target, name)
+            for i in range(count):
+                method(*args)
+
+        self.calls = []
+
+
+class _RecordingResultPrinter(_Recorder):
+
+    def on_test_start(self, test, data):
+        self.record('on_test_start', test, _TestViewSnapshot(data))
+
+    def on_test_end(self):
+        self.record('on_test_end')
+
+    def addError(self, test, data):
+        self.record('addError', test, _TestViewSnapshot(data))
+
+    def addSkippedTest(self, test, data):
+        self.record('addSkippedTest', test, _TestViewSnapshot(data))
+
+    def addException(self, exception):
+        self.record('addException', str(exception))
+
+    def on_test_success(self):
+        self.record('on_test_success')
+
+    def on_test_cached(self):
+        self.record('on_test_cached')
+
+    def on_test_failure(self):
+        self.record('on_test_failure')
+
+    def on_assertion(self):
+        self.record('on_assertion')
+
+
+class _RecordingCoverage(_Recorder):
+
+    def __init__(self, enabled: bool):
+        super().__init__()
+        self.enabled = enabled
+
+    def on_test_start(self, test, data):
+        settings = data.settings()
+        self.record('add_test', test, settings.get('color_scheme'), settings.get('syntax'))
+
+    def on_test_cached(self, test, color_scheme: str, syntax: str) -> None:
+        self.record('on_test_cached', test, color_scheme, syntax)
+
+    def on_rule_hits(self, color_scheme: str, hits: dict) -> None:
+        self.record('on_rule_hits', color_scheme, hits)
+
+
+class _RecordingResultCache(TestResultCache):
+
+    # Looks up results in the results file as of the start of the run, and
+    # records changes for the main process to make.
+
+    def __init__(self, file: str, force: bool = False):
+        super().__init__(file, force)
+        self.recorder = _Recorder()
+
+    def set_passed(self, test: str, fingerprint: str, assertions: int, color_scheme: str = None,
+                   scopes: str = None) -> None:
+        self.recorder.record('set_passed', test, fingerprint, assertions, color_scheme, scopes)
+
+    def set_color_scheme(self, color_scheme: str, snapshot: dict) -> None:
+        self.color_schemes[color_scheme] = snapshot
+        self.recorder.record('set_color_scheme', color_scheme, snapshot)
+
+    def remove(self, test: str) -> None:
+        self.recorder.record('remove', test)
+
+    def save(self) -> None:
+        pass
+
+
+def _init_worker(config: dict, plan_cache, result_cache, snapshots) -> None:
+    window = setup(config)
+    resources = ResourceIndex()
+
+    _worker['window'] = window
+    _worker['resources'] = resources
+    _worker['plan_cache'] = TestPlanCache(*plan_cache) if plan_cache else None
+    _worker['result_cache'] = _RecordingResultCache(*result_cache) if result_cache else None
+    _worker['view_pool'] = TestViewPool(window)
+    _worker['profile'] = window.active_view().settings().get('color_scheme_unit.profile')
+    _worker['coverage'] = bool(window.active_view().settings().get('color_scheme_unit.coverage'))
+    _worker['trace'] = bool(window.active_view().settings().get('color_scheme_unit.trace_file'))
+    _worker['snapshots'] = snapshots
+
+    # Color schemes are parsed once per worker, and kept for all of the tests
+    # the worker runs.
+    _worker['style_registry'] = StyleRegistry(size=64, resources=resources)
+
+
+def _run_test(test: str) -> dict:
+    result_printer = _RecordingResultPrinter()
+    code_coverage = _RecordingCoverage(_worker['coverage'])
+    result_cache = _worker['result_cache']
+    if result_cache:
+        result_cache.recorder = _Recorder()
+
+    style_registry = _worker['style_registry']
+    hits = style_registry.hits
+    misses = style_registry.misses
+    missing_scopes = len(api.missing_scopes)
+    profiler = Profiler(trace=_worker['trace']) if _worker['profile'] or _worker['trace'] else None
+
+    result = run_color_scheme_test(
+        test, _worker['window'], result_printer, code_coverage, _worker['plan_cache'], result_cache,
+        _worker['view_pool'], style_registry, _worker['resources'], profiler, _worker['snapshots'])
+
+    return {
+        'result': result,
+        'result_printer': result_printer,
+        'code_coverage': code_coverage,
+        'result_cache': result_cache.recorder if result_cache else None,
+        'style_hits': style_registry.hits - hits,
+        'style_misses': style_registry.misses - misses,
+        'missing_scopes': api.missing_scopes[missing_scopes:],
+        'profile': profiler.tests if profiler else [],
+        'spans': profiler.spans if profiler else None,
+    }
+
+
+class ParallelColorSchemeUnit(ColorSchemeUnit):
+
+    def __init__(self, window, config: dict, jobs: int):
+        super().__init__(window)
+        self.config = config
+        self.jobs = jobs
+
+    def _run_tests(self, tests, result_printer, code_coverage, plan_cache, result_cache, style_registry, resources,
+                   profiler=None, snapshots=None):
+        initargs = (
+            self.config,
+            (plan_cache.path, plan_cache.version) if plan_cache else None,
+            (result_cache.file, result_cache.force) if result_cache else None,
+            snapshots,
+        )
+
+        executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker, initargs=initargs)
+        try:
+            for test_run in executor.map(_run_test, tests):
+                test_run['result_printer'].replay(result_printer)
+                test_run['code_coverage'].replay(code_coverage)
+                if result_cache:
+                    test_run['result_cache'].replay(result_cache)
+
+                style_registry.hits += test_run['style_hits']
+                style_registry.misses += test_run['style_misses']
+                api.missing_scopes.extend(test_run['missing_scopes'])
+                if profiler:
+                    profiler.tests.extend(test_run['profile'])
+                    if profiler.spans is not None:
+                        profiler.spans.extend(test_run['spans'] or [])
+
+                yield test_run['result']
+        finally:
+            # Tests that haven't started when a run stops, for example at the
+            # first failure, are cancelled.
+            if sys.version_info >= (3, 9):
+                executor.shutdown(cancel_futures=True)
+            else:
+                executor.shutdown()
@@ -0,0 +1,127 @@
+import hashlib
+import importlib
+import json
+import os
+
+# Scope providers tokenize test fixtures for the headless engine. A scope
+# provider is a callable taking the content of a fixture and the resource
+# path of its syntax, and returning a list of (begin, end, scope) tokens
+# covering the content, or None if it can't tokenize the content.
+#
+# The default provider reads scopes files exported from Sublime Text by the
+# "ColorSchemeUnit: Export Scopes" command. Other providers, for example one
+# wrapping a third party syntax engine, can be plugged in from the command
+# line with --scope-provider module:callable.
+
+FORMAT = 1
+
+
+def content_digest(content: str) -> str:
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def encode_tokens(tokens: list) -> dict:
+    # Tokens are stored as [end, scope index] runs, each run beginning where
+    # the previous one ends. Scopes are stored once per fixture.
+    scopes = []  # type: list
+    scope_indexes = {}  # type: dict
+    runs = []
+    for begin, end, scope in tokens:
+        if scope not in scope_indexes:
+            scope_indexes[scope] = len(scopes)
+            scopes.append(scope)
+
+        if runs and runs[-1][1] == scope_indexes[scope]:
+            runs[-1][0] = end
+        else:
+            runs.append([end, scope_indexes[scope]])
+
+    return {'scopes': scopes, 'tokens': runs}
+
+
+def decode_tokens(entry: dict) -> list:
+    scopes = entry['scopes']
+    tokens = []
+    begin = 0
+    for end, scope_index in entry['tokens']:
+        tokens.append((begin, end, scopes[scope_index]))
+        begin = end
+
+    return tokens
+
+
+class ScopesFile():
+
+    def __init__(self, file: str):
+        self.file = file
+        self.tests = {}  # type: dict
+        self._digests = None  # type: dict
+
+        try:
+            with open(file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if isinstance(data, dict) and data.get('format') == FORMAT and isinstance(data.get('tests'), dict):
+            self.tests = data['tests']
+
+    def get(self, content: str, syntax: str):
+        if self._digests is None:
+            self._digests = {}
+            for entry in self.tests.values():
+                self._digests[(entry['digest'], entry['syntax'])] = entry
+
+        entry = self._digests.get((content_digest(content), syntax))
+        if entry is None:
+            return None
+
+        return decode_tokens(entry)
+
+    def set(self, test: str, content: str, syntax: str, tokens: list) -> None:
+        entry = encode_tokens(tokens)
+        entry['digest'] = content_digest(content)
+        entry['syntax'] = syntax
+        self.tests[test] = entry
+        self._digests = None
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_file = self.file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'format': FORMAT, 'tests': self.tests}, f, sort_keys=True, separators=(',', ':'))
+            f.write('\n')
+
+        os.replace(tmp_file, self.file)
+
+
+class ScopesFileProvider():
+
+    def __init__(self, files: list):
+        self.scopes_files = [ScopesFile(file) for file in files]
+
+    def __call__(self, content: str, syntax: str):
+        for scopes_file in self.scopes_files:
+            tokens = scopes_file.get(content, syntax)
+            if tokens is not None:
+                return tokens
+
+        return None
+
+
+def load_scope_provider(spec: str):
+    # Loads a scope provider from a "module:callable" spec. If the callable is
+    # a class or factory, rather than a provider, it's called without any
+    # arguments to create one.
+    module_name, _, name = spec.partition(':')
+    if not module_name or not name:
+        raise ValueError('invalid scope provider: {}; expected module:callable'.format(spec))
+
+    provider = getattr(importlib.import_module(module_name), name)
+    if isinstance(provider, type):
+        provider = provider()
+
+    return provider
@@ -0,0 +1,158 @@
+import re
+
+# A pure Python implementation of sublime.score_selector() for the headless
+# engine. The score of a matching selector is higher the deeper the segment
+# its rightmost atom matches in the scope, then the more dotted components the
+# atom has, then likewise for the atoms to its left. Scores are only compared
+# with each other, so the exact values don't need to match Sublime Text's.
+
+_TOKENS = re.compile('\\s*([(),|&]|-(?=[\\s(]|$)|[^\\s(),|&]+)')
+
+_selectors = {}  # type: dict
+
+
+def _tokenize(selector: str) -> list:
+    tokens = []
+    pos = 0
+    while True:
+        match = _TOKENS.match(selector, pos)
+        if not match:
+            break
+
+        token = match.group(1)
+        # A "-" directly followed by an atom is a negation, for example
+        # "string -comment".
+        if token.startswith('-') and len(token) > 1:
+            tokens.append('-')
+            token = token[1:]
+
+        tokens.append(token)
+        pos = match.end()
+
+    return tokens
+
+
+class _Parser():
+
+    # Parses a selector into nested tuples:
+    #
+    #   ('or', [node, ...])
+    #   ('and', [node, ...])
+    #   ('not', node)
+    #   ('path', [atom, ...])
+
+    def __init__(self, selector: str):
+        self.tokens = _tokenize(selector)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def parse(self):
+        node = self.parse_or()
+        while self.peek() is not None:
+            # Unbalanced parentheses are ignored.
+            self.pos += 1
+            node = ('or', [node, self.parse_or()])
+
+        return node
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek() in (',', '|'):
+            self.pos += 1
+            nodes.append(self.parse_and())
+
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_term()]
+        while self.peek() in ('&', '-'):
+            if self.tokens[self.pos] == '&':
+                self.pos += 1
+                nodes.append(self.parse_term())
+            else:
+                nodes.append(self.parse_term())
+
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def parse_term(self):
+        token = self.peek()
+        if token == '-':
+            self.pos += 1
+
+            return ('not', self.parse_term())
+
+        if token == '(':
+            self.pos += 1
+            node = self.parse_or()
+            if self.peek() == ')':
+                self.pos += 1
+
+            return node
+
+        atoms = []
+        while self.peek() not in (None, ',', '|', '&', '-', '(', ')'):
+            atoms.append(self.tokens[self.pos])
+            self.pos += 1
+
+        return ('path', atoms)
+
+
+def _atom_matches(atom: str, segment: str) -> bool:
+    return segment == atom or (segment.startswith(atom) and segment[len(atom)] == '.')
+
+
+def _score_path(atoms: list, segments: list) -> int:
+    if not atoms:
+        # An empty selector matches everything with the lowest score.
+        return 1
+
+    score = 0
+    j = len(segments)
+    for atom in reversed(atoms):
+        j -= 1
+        while j >= 0 and not _atom_matches(atom, segments[j]):
+            j -= 1
+
+        if j < 0:
+            return 0
+
+        score += min(atom.count('.') + 1, 255) << (8 * j)
+
+    return score
+
+
+def _score(node, segments: list) -> int:
+    kind, value = node
+    if kind == 'path':
+        return _score_path(value, segments)
+
+    if kind == 'or':
+        return max(_score(child, segments) for child in value)
+
+    if kind == 'not':
+        return 0 if _score(value, segments) else 1
+
+    # The score of a conjunction is the score of its first (positive) term.
+    score = 0
+    for i, child in enumerate(value):
+        child_score = _score(child, segments)
+        if not child_score:
+            return 0
+
+        if i == 0:
+            score = child_score
+
+    return score
+
+
+def compile_selector(selector: str):
+    if selector not in _selectors:
+        _selectors[selector] = _Parser(selector).parse()
+
+    return _selectors[selector]
+
+
+def score_selector(scope: str, selector: str) -> int:
+    return _score(compile_selector(selector), scope.split())
@@ -0,0 +1,117 @@
+import json
+import os
+
+# The history of test runs: how long each test took, and its outcome, the last
+# time it ran. Used to run the tests most likely to fail first, and to split
+# tests into shards that take about the same time to run.
+
+
+def _outcome(result: dict) -> str:
+    if result['error'] or result['failures']:
+        return 'failed'
+
+    if result['skip']:
+        return 'skipped'
+
+    return 'passed'
+
+
+def parse_shard(shard: str) -> tuple:
+    # Parses a shard, "i/N", the i-th of N shards counting from 1. Raises
+    # ValueError if the shard is invalid.
+    index, sep, count = str(shard).partition('/')
+    if not sep:
+        raise ValueError('invalid shard: {}; expected i/N'.format(shard))
+
+    index = int(index)
+    count = int(count)
+    if count < 1 or index < 1 or index > count:
+        raise ValueError('invalid shard: {}; expected i/N where 1 <= i <= N'.format(shard))
+
+    return (index, count)
+
+
+class RunHistory():
+
+    # Bump when the format of the history file changes.
+    FORMAT = 1
+
+    def __init__(self, file: str):
+        self.file = file
+        self._tests = {}  # type: dict
+        self._changed = False
+
+        try:
+            with open(file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('format') == self.FORMAT:
+                self._tests = data['tests']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def get(self, test: str):
+        return self._tests.get(test)
+
+    def record(self, test: str, result: dict) -> None:
+        # The time of cached results is how long it took to find out they are
+        # unchanged, so the time of the last real run is kept.
+        entry = self._tests.get(test)
+        time = result['time']
+        if result.get('cached') and entry:
+            time = entry['time']
+
+        self._tests[test] = {'time': round(time, 4), 'outcome': _outcome(result)}
+        self._changed = True
+
+    def estimate(self, tests: list) -> dict:
+        # Returns the expected time of each test: its last time, or the mean
+        # time of the tests with a history if it has none.
+        times = [self._tests[test]['time'] for test in tests if test in self._tests]
+        default = sum(times) / len(times) if times else 1.0
+
+        return {test: self._tests[test]['time'] if test in self._tests else default for test in tests}
+
+    def order(self, tests: list) -> list:
+        # Tests that failed the last time they ran first, then the slowest
+        # first. New tests are assumed to fail, so they run early too.
+        estimate = self.estimate(tests)
+
+        def key(test):
+            entry = self._tests.get(test)
+            failed = entry is None or entry['outcome'] == 'failed'
+
+            return (not failed, -estimate[test], test)
+
+        return sorted(tests, key=key)
+
+    def shard(self, tests: list, index: int, count: int) -> list:
+        # Returns the tests of the index-th of count shards, in the order
+        # given. Tests are assigned longest first to the shard with the least
+        # time so far, so shards take about the same time. The assignment only
+        # depends on the tests and the history, so every shard of a run must
+        # read the same history.
+        estimate = self.estimate(tests)
+        loads = [0.0] * count
+        shard_tests = set()
+        for test in sorted(tests, key=lambda test: (-estimate[test], test)):
+            shard = min(range(count), key=lambda i: (loads[i], i))
+            loads[shard] += estimate[test]
+            if shard == index - 1:
+                shard_tests.add(test)
+
+        return [test for test in tests if test in shard_tests]
+
+    def save(self) -> None:
+        if not self._changed:
+            return
+
+        tmp_file = self.file + '.tmp'
+
+        try:
+            os.makedirs(os.path.dirname(self.file), exist_ok=True)
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'format': self.FORMAT, 'tests': self._tests}, f, separators=(',', ':'), sort_keys=True)
+            os.replace(tmp_file, self.file)
+            self._changed = False
+        except OSError:
+            pass
@@ -0,0 +1,149 @@
+from difflib import SequenceMatcher
+import hashlib
+import json
+
+from ColorSchemeUnit.lib.color_scheme import decode_color_scheme
+from ColorSchemeUnit.lib.color_scheme import is_new_scheme
+
+# Change impact analysis: which tests can a change to a color scheme affect?
+#
+# A passing test records the scopes it evaluated, and a snapshot of the rules
+# of its color scheme is recorded once per version of the color scheme. When
+# the color scheme changes, the old and new rules are diffed, and a test can
+# only be affected if a changed rule can match one of its scopes. Everything
+# is conservative: tests that might be affected are always run.
+
+# Bits per scope atom, and hash functions, of scope filters: about a 3% false
+# positive rate.
+_FILTER_BITS_PER_ATOM = 8
+_FILTER_HASHES = 3
+
+
+class ScopeFilter():
+
+    # A Bloom filter of the atoms a selector can match in a set of scopes:
+    # every dotted prefix of every segment, for example "string",
+    # "string.quoted", and "string.quoted.double" for "string.quoted.double".
+    # Each positive atom of a selector must match a segment of a scope for the
+    # selector to match the scope, so a selector with an atom that isn't in
+    # the filter can't match any of the scopes.
+
+    def __init__(self, bits: int = 64, data: bytearray = None):
+        self.bits = bits
+        self.data = data if data is not None else bytearray(bits // 8)
+
+    @classmethod
+    def from_scopes(cls, scopes) -> 'ScopeFilter':
+        atoms = set()
+        for scope in scopes:
+            for segment in scope.split():
+                prefix = None
+                for component in segment.split('.'):
+                    prefix = component if prefix is None else prefix + '.' + component
+                    atoms.add(prefix)
+
+        bits = 64
+        while bits < len(atoms) * _FILTER_BITS_PER_ATOM:
+            bits *= 2
+
+        scope_filter = cls(bits)
+        for atom in atoms:
+            scope_filter.add(atom)
+
+        return scope_filter
+
+    @classmethod
+    def from_hex(cls, data: str) -> 'ScopeFilter':
+        data = bytearray.fromhex(data)
+
+        return cls(len(data) * 8, data)
+
+    def to_hex(self) -> str:
+        return ''.join('%02x' % b for b in self.data)
+
+    def _positions(self, atom: str) -> list:
+        digest = hashlib.md5(atom.encode('utf-8')).digest()
+
+        return [int.from_bytes(digest[i * 4:i * 4 + 4], 'little') % self.bits for i in range(_FILTER_HASHES)]
+
+    def add(self, atom: str) -> None:
+        for position in self._positions(atom):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def contains(self, atom: str) -> bool:
+        return all(self.data[position >> 3] & (1 << (position & 7)) for position in self._positions(atom))
+
+    def may_match(self, selector: str) -> bool:
+        # Returns False if the selector can't match any of the scopes.
+        if not selector or '(' in selector or ')' in selector or '|' in selector or '&' in selector:
+            return True
+
+        for alternative in selector.split(','):
+            atoms = []
+            for atom in alternative.split():
+                if atom.startswith('-'):
+                    break
+                atoms.append(atom.strip('.'))
+
+            if not atoms or all(self.contains(atom) for atom in atoms):
+                return True
+
+        return False
+
+
+def _digest(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def color_scheme_snapshot(resources: list) -> dict:
+    # Returns the rules of a color scheme and its overrides, a list of
+    # (resource name, content), as [selector, digest] pairs, and a digest of
+    # everything else, such as globals and variables. A change to a variable
+    # is treated as a change to everything, rather than to the rules that use
+    # it.
+    other = []
+    rules = []
+    for resource, content in resources:
+        content = decode_color_scheme(resource, content)
+        if is_new_scheme(resource):
+            for rule in content.get('rules', []):
+                rules.append([rule.get('scope', ''), _digest(rule)])
+
+            other.append({key: value for key, value in content.items() if key != 'rules'})
+        else:
+            for rule in content.get('settings', []):
+                if 'scope' in rule:
+                    rules.append([rule['scope'], _digest(rule)])
+                else:
+                    other.append(rule)
+
+    return {'other': _digest(other), 'rules': rules}
+
+
+def changed_selectors(old: dict, new: dict):
+    # Returns the selectors of the rules added, removed, changed, or moved
+    # between two snapshots of a color scheme, or None if something other
+    # than rules changed.
+    if old['other'] != new['other']:
+        return None
+
+    old_rules = [tuple(rule) for rule in old['rules']]
+    new_rules = [tuple(rule) for rule in new['rules']]
+
+    selectors = set()
+    matcher = SequenceMatcher(None, old_rules, new_rules, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            selectors.update(rule[0] for rule in old_rules[i1:i2])
+            selectors.update(rule[0] for rule in new_rules[j1:j2])
+
+    return sorted(selectors)
+
+
+def is_affected(selectors, scopes: ScopeFilter) -> bool:
+    # Returns True if a change to rules with the selectors can change the
+    # style of any of the scopes. Selectors of None means everything changed.
+    if selectors is None:
+        return True
+
+    return any(scopes.may_match(selector) for selector in selectors)
@@ -0,0 +1,155 @@
+import json
+import os
+from timeit import default_timer as timer
+
+
+class Profiler():
+
+    # Records how long each phase of each test takes. The runner marks the end
+    # of each phase with mark(), which attributes the time since the previous
+    # mark to the phase. Time spent in phases nested in another phase, for
+    # example resolving styles while checking assertions, is recorded with
+    # add() and isn't attributed to the enclosing phase as well.
+    #
+    # When tracing, each phase is also recorded as a span, a (name, process,
+    # start, duration, test) tuple, to be written as a Chrome trace.
+
+    PHASES = (
+        ('load', 'Load test'),
+        ('parse', 'Parse test'),
+        ('syntax', 'Resolve syntax'),
+        ('fingerprint', 'Fingerprint'),
+        ('view', 'Set up view'),
+        ('scheme', 'Load color scheme'),
+        ('scopes', 'Tokenize'),
+        ('styles', 'Resolve styles'),
+        ('assertions', 'Check assertions'),
+        ('snapshot', 'Check snapshot'),
+        ('teardown', 'Tear down view'),
+    )
+
+    def __init__(self, trace: bool = False):
+        self.tests = []  # type: list
+        self.run_phases = {}  # type: dict
+        self.spans = [] if trace else None  # type: list
+        self._pid = os.getpid()
+        self._test = None  # type: dict
+        self._mark = 0.0
+        self._nested = 0.0
+
+    def start_test(self, test: str) -> None:
+        self._test = {'test': test, 'time': 0.0, 'phases': {}, 'counts': {}, 'start': timer()}
+        self._mark = self._test['start']
+        self._nested = 0.0
+
+    def mark(self, phase: str) -> None:
+        now = timer()
+        self._add(phase, now - self._mark - self._nested)
+        if self.spans is not None:
+            self.spans.append((phase, self._pid, self._mark, now - self._mark, None))
+
+        self._mark = now
+        self._nested = 0.0
+
+    def add(self, phase: str, duration: float, start: float = None) -> None:
+        self._add(phase, duration)
+        self._nested += duration
+        if self.spans is not None and start is not None:
+            self.spans.append((phase, self._pid, start, duration, None))
+
+    def span(self, phase: str, start: float, duration: float) -> None:
+        # Records a span without attributing its time to the phase, for
+        # example when the time of the phase is added up elsewhere.
+        if self.spans is not None:
+            self.spans.append((phase, self._pid, start, duration, None))
+
+    def _add(self, phase: str, duration: float) -> None:
+        phases = self._test['phases']
+        phases[phase] = phases.get(phase, 0.0) + duration
+
+    def count(self, name: str, n: int = 1) -> None:
+        counts = self._test['counts']
+        counts[name] = counts.get(name, 0) + n
+
+    def end_test(self) -> None:
+        start = self._test.pop('start')
+        self._test['time'] = timer() - start
+        self.tests.append(self._test)
+        if self.spans is not None:
+            self.spans.append(('test', self._pid, start, self._test['time'], self._test['test']))
+
+        self._test = None
+
+    def add_run_phase(self, phase: str, duration: float, start: float = None) -> None:
+        self.run_phases[phase] = self.run_phases.get(phase, 0.0) + duration
+        if self.spans is not None and start is not None:
+            self.spans.append((phase, self._pid, start, duration, None))
+
+    def write_trace(self, file: str) -> None:
+        # Writes the spans as Chrome trace events, see
+        # https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU.
+        # Open the file with https://ui.perfetto.dev or chrome://tracing.
+        if not self.spans:
+            return
+
+        labels = dict(self.PHASES)
+        origin = min(span[2] for span in self.spans)
+
+        events = ['{"name":"process_name","ph":"M","pid":0,"args":{"name":"ColorSchemeUnit"}}']
+        for name, pid, start, duration, test in self.spans:
+            event = {
+                'name': test if test else labels.get(name, name.capitalize()),
+                'cat': 'test' if test else 'phase',
+                'ph': 'X',
+                'ts': round((start - origin) * 1e6, 3),
+                'dur': round(duration * 1e6, 3),
+                'pid': 0,
+                'tid': pid,
+            }
+
+            events.append(json.dumps(event, separators=(',', ':')))
+
+        with open(file, 'w', encoding='utf-8') as f:
+            f.write('{"displayTimeUnit":"ms","traceEvents":[\n')
+            f.write(',\n'.join(events))
+            f.write('\n]}\n')
+
+    def report(self, output, slowest: int = 10) -> None:
+        if not self.tests:
+            return
+
+        total_time = sum(test['time'] for test in self.tests)
+
+        output.write('Profile:\n\n')
+        output.write('Slowest %d test%s:\n\n' % (
+            min(slowest, len(self.tests)),
+            '' if min(slowest, len(self.tests)) == 1 else 's'))
+
+        for i, test in enumerate(sorted(self.tests, key=lambda t: t['time'], reverse=True)[:slowest], start=1):
+            counts = test['counts']
+            output.write('%d) %.3f secs %s\n   %d assertions, %d scopes, %d style cache hits, %d misses\n' % (
+                i,
+                test['time'],
+                test['test'],
+                counts.get('assertions', 0),
+                counts.get('scopes', 0),
+                counts.get('style_hits', 0),
+                counts.get('style_misses', 0)))
+
+        phases = {}  # type: dict
+        for test in self.tests:
+            for phase, duration in test['phases'].items():
+                phases[phase] = phases.get(phase, 0.0) + duration
+
+        output.write('\nPhases:\n\n')
+        for phase, label in self.PHASES:
+            if phase in phases:
+                output.write('%-18s %8.3f secs %5.1f%%\n' % (
+                    label,
+                    phases[phase],
+                    (phases[phase] / total_time * 100) if total_time else 0.0))
+
+        for phase, duration in sorted(self.run_phases.items()):
+            output.write('%-18s %8.3f secs (per run)\n' % (phase.capitalize(), duration))
+
+        output.write('\n')
@@ -0,0 +1,189 @@
+import json
+import os
+from xml.sax.saxutils import quoteattr
+
+# Reporters write machine readable results, for CI, alongside the output of
+# ResultPrinter. Results are written as each test ends, so a large run isn't
+# kept in memory, through a large write buffer.
+
+_BUFFER_SIZE = 1 << 16
+
+
+def _test_status(result: dict) -> str:
+    if result['error']:
+        return 'error'
+
+    if result['skip']:
+        return 'skipped'
+
+    if result['failures']:
+        return 'failed'
+
+    return 'passed'
+
+
+class JsonLinesReporter():
+
+    # One JSON object per line: a "test" record per test, a "failure" record
+    # per failed assertion, and a "summary" record at the end of the run.
+
+    def __init__(self, file: str):
+        self.file = file
+        self.totals = {'tests': 0, 'assertions': 0, 'failures': 0, 'errors': 0, 'skipped': 0, 'time': 0.0}
+        self._f = open(file, 'w', encoding='utf-8', buffering=_BUFFER_SIZE)
+
+    def _write(self, record: dict) -> None:
+        self._f.write(json.dumps(record, sort_keys=True))
+        self._f.write('\n')
+
+    def on_test_end(self, test: str, result: dict, time: float) -> None:
+        status = _test_status(result)
+        record = {
+            'type': 'test',
+            'test': test,
+            'status': status,
+            'assertions': result['assertions'],
+            'failures': len(result['failures']),
+            'time': round(time, 6),
+        }
+
+        if result['error'] or result['skip']:
+            record['message'] = (result['error'] or result['skip'])['message']
+
+        self._write(record)
+
+        for failure in result['failures']:
+            self._write({
+                'type': 'failure',
+                'test': test,
+                'file': failure['file'],
+                'row': failure['row'],
+                'col': failure['col'],
+                'assertion': failure['assertion'],
+                'expected': failure['expected'],
+                'actual': failure['actual'],
+            })
+
+        self.totals['tests'] += 1
+        self.totals['assertions'] += result['assertions']
+        self.totals['failures'] += len(result['failures'])
+        self.totals['errors'] += 1 if status == 'error' else 0
+        self.totals['skipped'] += 1 if status == 'skipped' else 0
+        self.totals['time'] += time
+
+    def on_tests_end(self) -> None:
+        summary = dict(self.totals, type='summary', time=round(self.totals['time'], 6))
+        self._write(summary)
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class JUnitReporter():
+
+    # A JUnit XML report with a test case per test and a <failure> per failed
+    # assertion. The totals of the <testsuite> element aren't known until the
+    # end of the run, so space is reserved for them at the start of the file
+    # and they're written over it at the end. The document is also finished
+    # when the reporter is closed before the end of the run, for example when
+    # a run is cancelled or raises, so that the file is always valid XML.
+
+    _TESTSUITE_TAG_SIZE = 160
+
+    def __init__(self, file: str, name: str = 'ColorSchemeUnit'):
+        self.file = file
+        self.name = name
+        self.totals = {'tests': 0, 'failures': 0, 'errors': 0, 'skipped': 0, 'time': 0.0}
+        self._ended = False
+        self._f = open(file, 'w', encoding='utf-8', buffering=_BUFFER_SIZE)
+        self._f.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n')
+        self._testsuite_tag_offset = self._f.tell()
+        self._f.write(self._testsuite_tag())
+        self._f.write('\n')
+
+    def _testsuite_tag(self) -> str:
+        tag = '<testsuite name=%s tests="%d" failures="%d" errors="%d" skipped="%d" time="%.3f"' % (
+            quoteattr(self.name),
+            self.totals['tests'],
+            self.totals['failures'],
+            self.totals['errors'],
+            self.totals['skipped'],
+            self.totals['time'])
+
+        return tag + ' ' * max(self._TESTSUITE_TAG_SIZE - len(tag) - 1, 0) + '>'
+
+    def on_test_end(self, test: str, result: dict, time: float) -> None:
+        status = _test_status(result)
+        self._f.write('  <testcase classname=%s name=%s file=%s time="%.3f" assertions="%d"' % (
+            quoteattr(test.rpartition('/')[0].replace('/', '.')),
+            quoteattr(test.rpartition('/')[2]),
+            quoteattr(test),
+            time,
+            result['assertions']))
+
+        if status == 'passed':
+            self._f.write('/>\n')
+        else:
+            self._f.write('>\n')
+            if status == 'error':
+                self._f.write('    <error message=%s/>\n' % quoteattr(result['error']['message']))
+            elif status == 'skipped':
+                self._f.write('    <skipped message=%s/>\n' % quoteattr(result['skip']['message']))
+            else:
+                for failure in result['failures']:
+                    message = 'Failed asserting %s equals %s' % (str(failure['actual']), str(failure['expected']))
+                    self._f.write('    <failure message=%s type="AssertionError" file=%s line="%d">' % (
+                        quoteattr(message),
+                        quoteattr(failure['file']),
+                        failure['row']))
+                    self._f.write(_escape_text('%s\n%s\n%s:%d:%d' % (
+                        failure['assertion'],
+                        message,
+                        failure['file'],
+                        failure['row'],
+                        failure['col'])))
+                    self._f.write('</failure>\n')
+
+            self._f.write('  </testcase>\n')
+
+        self.totals['tests'] += 1
+        self.totals['failures'] += 1 if status == 'failed' else 0
+        self.totals['errors'] += 1 if status == 'error' else 0
+        self.totals['skipped'] += 1 if status == 'skipped' else 0
+        self.totals['time'] += time
+
+    def on_tests_end(self) -> None:
+        if self._ended:
+            return
+
+        self._ended = True
+        self._f.write('</testsuite>\n</testsuites>\n')
+        self._f.seek(self._testsuite_tag_offset)
+        self._f.write(self._testsuite_tag())
+        self._f.seek(0, os.SEEK_END)
+
+    def close(self) -> None:
+        try:
+            self.on_tests_end()
+        finally:
+            self._f.close()
+
+
+def _escape_text(text: str) -> str:
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def create_reporters(settings, directory: str) -> list:
+    # Returns the reporters enabled by settings. Relative file names are
+    # relative to the directory, the package being tested.
+    reporters = []  # type: list
+    for setting, reporter_class in (
+            ('color_scheme_unit.junit_file', JUnitReporter),
+            ('color_scheme_unit.jsonl_file', JsonLinesReporter)):
+        file = settings.get(setting)
+        if file:
+            file = os.path.join(directory, os.path.expanduser(file))
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            reporters.append(reporter_class(file))
+
+    return reporters
@@ -0,0 +1,71 @@
+import os
+
+from sublime import find_resources
+from sublime import packages_path
+
+
+_INDEXED_PATTERNS = (
+    'color_scheme_test*',
+    '*.sublime-syntax',
+    '*.tmLanguage',
+    '*.hidden-tmLanguage',
+    '*.sublime-color-scheme',
+    '*.hidden-color-scheme',
+    '*.tmTheme',
+    '*.hidden-tmTheme',
+)
+
+_INDEXED_EXTENSIONS = tuple(pattern[1:] for pattern in _INDEXED_PATTERNS if pattern.startswith('*'))
+
+
+class ResourceIndex():
+
+    # Discovers tests, syntaxes, and color schemes once per run. Lookups by
+    # file name are equivalent to find_resources(file_name), and lookups by
+    # path return the resource at the path, without scanning the resources.
+
+    def __init__(self):
+        self.tests = []  # type: list
+        self._resources = {}  # type: dict
+        self._realpaths = None  # type: dict
+
+        for pattern in _INDEXED_PATTERNS:
+            resources = find_resources(pattern)
+            if pattern == 'color_scheme_test*':
+                self.tests = resources
+
+            for resource in resources:
+                name = resource.rpartition('/')[2]
+                name_resources = self._resources.setdefault(name, [])
+                if resource not in name_resources:
+                    name_resources.append(resource)
+
+    def find(self, name: str) -> list:
+        if '*' in name or '?' in name or '[' in name:
+            return find_resources(name)
+
+        # Paths, such as "Packages/Color Scheme - Default/Monokai.tmTheme", are
+        # looked up by file name, and then by path, with or without the
+        # leading "Packages/".
+        path = None
+        if '/' in name:
+            path = name
+            name = name.rpartition('/')[2]
+
+        if not (name.startswith('color_scheme_test') or name.endswith(_INDEXED_EXTENSIONS)):
+            return find_resources(path or name)
+
+        resources = self._resources.get(name, [])
+        if path:
+            return [resource for resource in resources if resource == path or resource.endswith('/' + path)]
+
+        return list(resources)
+
+    def tests_for_file(self, file: str) -> list:
+        if self._realpaths is None:
+            self._realpaths = {}
+            ppr = os.path.dirname(packages_path())
+            for test in self.tests:
+                self._realpaths.setdefault(os.path.realpath(os.path.join(ppr, test)), []).append(test)
+
+        return list(self._realpaths.get(os.path.realpath(file), []))
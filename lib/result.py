@@ -7,6 +7,7 @@ class ResultPrinter():
         self.output = output
         self.debug = debug
         self.assertions = 0
+        self.cached = 0
         self.progress_count = 0
         self.tests = 0
         self.tests_total = 0
@@ -23,9 +24,23 @@ class ResultPrinter():
             for i, test in enumerate(tests, start=1):
                 self.output.write('%d) %s\n' % (i, test))
 
-    def on_tests_end(self, errors, skipped, failures, total_assertions):
+    def on_tests_end(self, errors, skipped, failures, total_assertions, style_registry=None, stopped=None):
         self.output.write('\n\n')
         self.output.write('Time: %.2f secs\n' % (timer() - self.start_time))
+
+        if stopped:
+            self.output.write('%s after %d of %d test%s\n' % (
+                stopped,
+                self.tests,
+                self.tests_total,
+                '' if self.tests_total == 1 else 's'))
+
+        if style_registry and (style_registry.hits or style_registry.misses):
+            self.output.write('Style cache: %d hits, %d misses (%.1f%% hit rate)\n' % (
+                style_registry.hits,
+                style_registry.misses,
+                (style_registry.hits / (style_registry.hits + style_registry.misses)) * 100))
+
         self.output.write('\n')
 
         # ERRORS
@@ -80,9 +95,21 @@ class ResultPrinter():
                 self.output.write("\n%s:%d:%d\n" % (skip['file'], skip['row'], skip['col']))
                 self.output.write("\n")
 
+        # CACHED
+        if self.cached > 0:
+            self.output.write("%d of %d test%s unchanged since %s last passing run.\n\n" % (
+                self.cached,
+                self.tests,
+                '' if self.tests == 1 else 's',
+                'its' if self.cached == 1 else 'their',
+            ))
+
         # TOTALS
         if len(errors) == 0 and len(failures) == 0:
-            self.output.write("OK (%d tests, %d assertions" % (self.tests, total_assertions))
+            self.output.write("%s (%d tests, %d assertions" % (
+                'INCOMPLETE' if stopped else 'OK',
+                self.tests,
+                total_assertions))
             if len(skipped) > 0:
                 self.output.write(", %d skipped" % (len(skipped)))
             self.output.write(")\n")
@@ -98,6 +125,8 @@ class ResultPrinter():
             self.output.write(".")
             self.output.write("\n")
 
+        self.output.flush()
+
     def on_test_start(self, test, data):
         if self.debug:
             settings = data.settings()
@@ -117,6 +146,7 @@ class ResultPrinter():
 
     def on_test_end(self):
         self.tests += 1
+        self.output.flush()
 
     def addError(self, test, data):
         self._writeProgress('E')
@@ -137,6 +167,10 @@ class ResultPrinter():
     def on_test_success(self):
         self._writeProgress('.')
 
+    def on_test_cached(self):
+        self.cached += 1
+        self._writeProgress('.')
+
     def on_test_failure(self):
         self._writeProgress('F')
 
@@ -1,6 +1,9 @@
+import hashlib
 import os
 import re
+from timeit import default_timer as timer
 
+from sublime import cache_path
 from sublime import find_resources
 from sublime import load_resource
 from sublime import packages_path
@@ -10,11 +13,34 @@ from sublime import set_timeout_async
 from sublime import status_message
 from sublime import version
 
+from ColorSchemeUnit.lib.cache import TestPlanCache
+from ColorSchemeUnit.lib.cache import TestResultCache
+from ColorSchemeUnit.lib.color_scheme import RowScopes
+from ColorSchemeUnit.lib.color_scheme import StyleRegistry
 from ColorSchemeUnit.lib.color_scheme import ViewStyle
 from ColorSchemeUnit.lib.coverage import Coverage
+from ColorSchemeUnit.lib.generator import update_assertions
+from ColorSchemeUnit.lib.headless.scopes import ScopesFile
+from ColorSchemeUnit.lib.history import parse_shard
+from ColorSchemeUnit.lib.history import RunHistory
+from ColorSchemeUnit.lib.impact import changed_selectors
+from ColorSchemeUnit.lib.impact import color_scheme_snapshot
+from ColorSchemeUnit.lib.impact import is_affected
+from ColorSchemeUnit.lib.impact import ScopeFilter
+from ColorSchemeUnit.lib.profiler import Profiler
+from ColorSchemeUnit.lib.reporter import create_reporters
+from ColorSchemeUnit.lib.resources import ResourceIndex
 from ColorSchemeUnit.lib.result import ResultPrinter
+from ColorSchemeUnit.lib.snapshot import decode_snapshot
+from ColorSchemeUnit.lib.snapshot import diff_snapshots
+from ColorSchemeUnit.lib.snapshot import encode_snapshot
+from ColorSchemeUnit.lib.snapshot import lines_digest
+from ColorSchemeUnit.lib.snapshot import load_snapshot
+from ColorSchemeUnit.lib.snapshot import save_snapshot
+from ColorSchemeUnit.lib.snapshot import snapshot_file_name
 from ColorSchemeUnit.lib.test import TestOutputPanel
 from ColorSchemeUnit.lib.test import TestView
+from ColorSchemeUnit.lib.test import TestViewPool
 
 
 __version__ = "2.2.1"
@@ -27,16 +53,20 @@ _color_test_params_compiled_pattern = re.compile(
     '(?:(?P<skip_if_not_syntax> SKIP IF NOT)? "(?P<syntax_name>[^"]+)")?'
     '(?:\\s*(?:--\\>|\\?\\>|\\*\\/))?')
 
-_color_test_assertion = re.compile(
-    '^\\s*(//|#|\\/\\*|\\<\\!--|--)\\s*'
-    '(?P<repeat>\\^+)\\s+'
-    '(?P<assertions>.+)'
-    '$')
+_color_test_assertion_comments = ('//', '#', '/*', '<!--', '--')
 
-_color_test_assertion_fg = re.compile('fg=([^ ]+)')
-_color_test_assertion_bg = re.compile('bg=([^ ]+)')
-_color_test_assertion_fs = re.compile('fs=([a-z_]+ ?(?:[a-z_]+(?:$| ))*|\\s*)')
-_color_test_assertion_build = re.compile('build\\>=([0-9]+)')
+# A space delimited list of font styles: the first font style can be followed
+# by anything, the rest must be followed by a space or the end. Words and
+# spaces are disjoint so the pattern cannot backtrack catastrophically.
+_color_test_assertion_font_style = re.compile('[a-z_]+(?: [a-z_]+(?= |$))*')
+
+# Test runs started from Sublime Text run on the async thread in slices of
+# about this many seconds, so that other async work isn't blocked for the
+# length of the run.
+_SLICE_TIME = 0.05
+
+# The test run in progress in each window, by window id.
+_jobs = {}  # type: dict
 
 
 def message(msg):
@@ -46,28 +76,93 @@ def message(msg):
 
 
 def _parse_assertion(line: str):
+    # Assertion lines look like:
+    #
+    #   <comment> <carets> <assertions>
+    #
+    # For example: "// ^^^ fg=#ffffff bg=#000000 fs=bold italic build>=3127".
+    #
+    # The line is scanned once with C-level string methods, so parsing is
+    # linear in the length of the line and lines without a caret are rejected
+    # without any further work.
+    if '^' not in line:
+        return None
+
     line = line.lower().rstrip(' -->').rstrip(' */')
-    match = _color_test_assertion.match(line)
 
-    if match:
-        assertion = {
-            'assertion': match.group(0),
-            'repeat': match.group('repeat')
-        }
+    rest = line.lstrip()
+    for comment in _color_test_assertion_comments:
+        if rest.startswith(comment):
+            rest = rest[len(comment):].lstrip()
+            break
+    else:
+        return None
+
+    assertions = rest.lstrip('^')
+    repeat = rest[:len(rest) - len(assertions)]
+    if not repeat:
+        return None
+
+    whitespace = len(assertions)
+    assertions = assertions.lstrip()
+    whitespace -= len(assertions)
+    if not whitespace:
+        return None
+
+    # At least one character is required after the whitespace following
+    # the carets, so a trailing whitespace character will do.
+    if not assertions:
+        if whitespace < 2:
+            return None
+        assertions = rest[-1]
+
+    return {
+        'assertion': line,
+        'repeat': repeat,
+        'fg': _parse_assertion_value(assertions, 'fg='),
+        'bg': _parse_assertion_value(assertions, 'bg='),
+        'fs': _parse_assertion_font_style(assertions),
+        'build': _parse_assertion_build(assertions),
+    }
+
+
+def _parse_assertion_value(assertions: str, key: str):
+    i = assertions.find(key)
+    while i != -1:
+        begin = i + len(key)
+        if begin < len(assertions) and assertions[begin] != ' ':
+            end = assertions.find(' ', begin)
+
+            return assertions[begin:] if end == -1 else assertions[begin:end]
+
+        i = assertions.find(key, i + 1)
+
+    return None
 
-        fg = _color_test_assertion_fg.search(match.group('assertions'))
-        assertion['fg'] = fg.group(1) if fg else None
 
-        bg = _color_test_assertion_bg.search(match.group('assertions'))
-        assertion['bg'] = bg.group(1) if bg else None
+def _parse_assertion_font_style(assertions: str):
+    i = assertions.find('fs=')
+    if i == -1:
+        return None
 
-        fs = _color_test_assertion_fs.search(match.group('assertions'))
-        assertion['fs'] = fs.group(1).strip() if fs else None
+    font_style = _color_test_assertion_font_style.match(assertions, i + 3)
 
-        build = _color_test_assertion_build.search(match.group('assertions'))
-        assertion['build'] = build.group(1) if build else None
+    return font_style.group(0) if font_style else ''
 
-        return assertion
+
+def _parse_assertion_build(assertions: str):
+    i = assertions.find('build>=')
+    while i != -1:
+        begin = end = i + 7
+        while end < len(assertions) and '0' <= assertions[end] <= '9':
+            end += 1
+
+        if end > begin:
+            return assertions[begin:end]
+
+        i = assertions.find('build>=', i + 1)
+
+    return None
 
 
 def is_valid_color_scheme_test_file_name(file_name):
@@ -81,7 +176,15 @@ def get_color_scheme_test_params_from_view(view):
     return get_color_scheme_test_params(view.substr(Region(0, view.size())))
 
 
-def get_color_scheme_test_params(content: str, file_name=None):
+def get_color_scheme_test_params(content: str, file_name=None, resources=None):
+    header = _parse_color_scheme_test_header(content, file_name)
+    if header:
+        return _resolve_color_scheme_test_params(header, resources)
+
+    return None
+
+
+def _parse_color_scheme_test_header(content: str, file_name=None):
     test_params = _color_test_params_compiled_pattern.match(content)
     if test_params:
         syntax_name = test_params.group('syntax_name')
@@ -100,19 +203,9 @@ def get_color_scheme_test_params(content: str, file_name=None):
         elif '/' in syntax_name:
             syntax_package_name, syntax_name = syntax_name.split('/')
 
-        syntaxes = find_resources(syntax_name + '.sublime-syntax')
-        if not syntaxes:
-            syntaxes = find_resources(syntax_name + '.tmLanguage')
-            if not syntaxes:
-                syntaxes = find_resources(syntax_name + '.hidden-tmLanguage')
-
-        if syntax_package_name:
-            syntaxes = [s for s in syntaxes if syntax_package_name in s]
-
         return {
-            'syntaxes': syntaxes,
-            'syntax': syntaxes[0] if syntaxes else None,
             'syntax_name': syntax_name,
+            'syntax_package_name': syntax_package_name,
             'skip_if_not_syntax': bool(skip_if_not_syntax),
             'color_scheme': color_scheme
         }
@@ -120,34 +213,308 @@ def get_color_scheme_test_params(content: str, file_name=None):
     return None
 
 
+def _resolve_color_scheme_test_params(header: dict, resources=None) -> dict:
+    syntax_name = header['syntax_name']
+    syntax_package_name = header['syntax_package_name']
+    find = resources.find if resources else find_resources
+
+    syntaxes = find(syntax_name + '.sublime-syntax')
+    if not syntaxes:
+        syntaxes = find(syntax_name + '.tmLanguage')
+        if not syntaxes:
+            syntaxes = find(syntax_name + '.hidden-tmLanguage')
+
+    if syntax_package_name:
+        syntaxes = [s for s in syntaxes if syntax_package_name in s]
+
+    return {
+        'syntaxes': syntaxes,
+        'syntax': syntaxes[0] if syntaxes else None,
+        'syntax_name': syntax_name,
+        'skip_if_not_syntax': header['skip_if_not_syntax'],
+        'color_scheme': header['color_scheme']
+    }
+
+
+def _build_test_plan(content: str, file_name=None) -> dict:
+    # A test plan is everything needed to run a test that can be derived from
+    # the test file content alone: the header and the assertions. Assertions
+    # are stored as compact lists of:
+    #
+    #   [line number, row, begin col, end col, expected styles, build, assertion]
+    #
+    # Plans only contain JSON types so that they can be cached on disk.
+    header = _parse_color_scheme_test_header(content, file_name)
+    assertions = []  # type: list
+
+    if header:
+        consecutive_test_lines = 0
+        for line_number, line in enumerate(content.splitlines()):
+            assertion_params = _parse_assertion(line)
+            if not assertion_params:
+                consecutive_test_lines = 0
+                continue
+
+            consecutive_test_lines += 1
+
+            assertion_begin = line.find('^')
+
+            expected = {}
+
+            if assertion_params['fg'] is not None:
+                expected['foreground'] = assertion_params['fg']
+
+            if assertion_params['bg'] is not None:
+                expected['background'] = assertion_params['bg']
+
+            if assertion_params['fs'] is not None:
+                expected['fontStyle'] = assertion_params['fs']
+
+            assertions.append([
+                line_number,
+                line_number - consecutive_test_lines,
+                assertion_begin,
+                assertion_begin + len(assertion_params['repeat']),
+                expected,
+                int(assertion_params['build']) if assertion_params['build'] else None,
+                assertion_params['assertion']
+            ])
+
+    return {
+        'header': header,
+        'assertions': assertions
+    }
+
+
 class ColorSchemeTest():
 
-    def __init__(self, test):
+    def __init__(self, test, plan_cache=None, resources=None, profiler=None):
         self.test = test
+        self.resources = resources
         self.content = load_resource(self.test)
-        self.params = get_color_scheme_test_params(self.content, self.test)
+        if profiler:
+            profiler.mark('load')
+
+        self.plan = None
+        if plan_cache:
+            plan_key = plan_cache.key(self.test, self.content)
+            self.plan = plan_cache.get(plan_key)
+
+        if not self.plan:
+            self.plan = _build_test_plan(self.content, self.test)
+            if plan_cache:
+                plan_cache.set(plan_key, self.plan)
+
+        if profiler:
+            profiler.mark('parse')
+
+        if self.plan['header']:
+            self.params = _resolve_color_scheme_test_params(self.plan['header'], resources)
+        else:
+            self.params = None
+
+        if profiler:
+            profiler.mark('syntax')
 
     def init_view(self, test_view):
-        test_view.view.assign_syntax(self.params['syntax'])
-        test_view.view.settings().set('color_scheme', self.params['color_scheme'])
+        test_view.configure(self.params['syntax'], self.params['color_scheme'])
         test_view.set_content(self.content)
 
     def get_lines(self):
         return enumerate(self.content.splitlines())
 
+    def get_assertions(self) -> list:
+        return self.plan['assertions']
+
+
+def _actual_styles(expected: dict, actual_styles: dict) -> dict:
+    actual = {}
+    for style in expected:
+        if style in actual_styles:
+            if actual_styles[style]:
+                actual[style] = actual_styles[style].lower()
+            else:
+                actual[style] = actual_styles[style]
+        else:
+            actual[style] = ''
+
+    if 'fontStyle' in actual and actual['fontStyle'] == 'none':
+        actual['fontStyle'] = ''
+
+    return actual
+
+
+def view_tokens(view) -> list:
+    # Returns the (begin, end, scope) tokens of the view. The tokens of the
+    # whole view are extracted in one call when the API is available (ST4),
+    # otherwise the scope of each point is looked up, as by ST3.
+    tokens = []  # type: list
+    if hasattr(view, 'extract_tokens_with_scopes'):
+        for region, scope in view.extract_tokens_with_scopes(Region(0, view.size())):
+            if tokens and tokens[-1][1] < region.begin():
+                tokens.append((tokens[-1][1], region.begin(), view.scope_name(tokens[-1][1])))
+            tokens.append((region.begin(), region.end(), scope))
+    else:
+        for point in range(view.size()):
+            scope = view.scope_name(point)
+            if tokens and tokens[-1][2] == scope:
+                tokens[-1] = (tokens[-1][0], point + 1, scope)
+            else:
+                tokens.append((point, point + 1, scope))
+
+    if tokens and tokens[-1][1] < view.size():
+        tokens.append((tokens[-1][1], view.size(), view.scope_name(tokens[-1][1])))
+
+    return tokens
+
+
+def _resource_digest(resource: str, digests: dict) -> str:
+    if resource not in digests:
+        digests[resource] = hashlib.sha1(load_resource(resource).encode('utf-8')).hexdigest()
+
+    return digests[resource]
+
+
+def _test_fingerprint(color_scheme_test: ColorSchemeTest, result_cache: TestResultCache, snapshot=None) -> str:
+    # Everything, other than the color scheme, that can change the result of
+    # a test: the test itself, the syntax, Sublime Text, and ColorSchemeUnit,
+    # and its snapshot, if snapshots are enabled.
+    parts = [
+        __version__,
+        version(),
+        color_scheme_test.content,
+        color_scheme_test.params['syntax'],
+        _resource_digest(color_scheme_test.params['syntax'], result_cache.resource_digests)
+    ]
+
+    if snapshot is not None:
+        parts.append(snapshot)
+
+    return TestResultCache.fingerprint(parts)
+
+
+def _color_scheme_resources(color_scheme_test: ColorSchemeTest) -> list:
+    # The color scheme including any overrides of it in other packages.
+    find = color_scheme_test.resources.find if color_scheme_test.resources else find_resources
+
+    return find(os.path.basename(color_scheme_test.params['color_scheme']))
+
+
+def _color_scheme_digest(color_scheme_test: ColorSchemeTest, result_cache: TestResultCache) -> str:
+    parts = []
+    for resource in _color_scheme_resources(color_scheme_test):
+        parts.append(resource)
+        parts.append(_resource_digest(resource, result_cache.resource_digests))
+
+    return TestResultCache.fingerprint(parts)
+
+
+def _color_scheme_snapshot(color_scheme_test: ColorSchemeTest, digest: str, result_cache: TestResultCache) -> dict:
+    if digest not in result_cache.color_schemes:
+        result_cache.set_color_scheme(digest, color_scheme_snapshot(
+            [(resource, load_resource(resource)) for resource in _color_scheme_resources(color_scheme_test)]))
+
+    return result_cache.color_schemes[digest]
+
+
+def _cached_assertions(test: str, color_scheme_test: ColorSchemeTest, fingerprint: str, color_scheme: str,
+                       result_cache: TestResultCache):
+    # Returns the number of assertions of the last passing run of the test if
+    # it can't have changed since then, otherwise None. A test whose color
+    # scheme changed still passes if none of the changed rules can match any
+    # of the scopes it evaluated.
+    result = result_cache.get_result(test, fingerprint)
+    if not result:
+        return None
+
+    if result.get('color_scheme') == color_scheme:
+        return result['assertions']
+
+    if not result.get('scopes') or result.get('color_scheme') not in result_cache.color_schemes:
+        return None
+
+    key = (result['color_scheme'], color_scheme)
+    if key not in result_cache.changed_selectors:
+        try:
+            result_cache.changed_selectors[key] = changed_selectors(
+                result_cache.color_schemes[result['color_scheme']],
+                _color_scheme_snapshot(color_scheme_test, color_scheme, result_cache))
+        except Exception:
+            result_cache.changed_selectors[key] = None
+
+    if is_affected(result_cache.changed_selectors[key], ScopeFilter.from_hex(result['scopes'])):
+        return None
+
+    result_cache.set_passed(test, fingerprint, result['assertions'], color_scheme, result['scopes'])
+
+    return result['assertions']
+
+
+def _snapshot_style(style: dict) -> tuple:
+    font_style = style.get('fontStyle') or ''
+
+    return (
+        (style.get('foreground') or '').lower(),
+        (style.get('background') or '').lower(),
+        '' if font_style == 'none' else font_style)
+
+
+def _style_snapshot(color_scheme_test: ColorSchemeTest, row_scopes: RowScopes, color_scheme_style: ViewStyle,
+                    scopes=None) -> tuple:
+    # Returns the snapshot of the styles of the lines of the test, other than
+    # its assertion lines, and the rows of the lines.
+    assertion_lines = set(assertion[0] for assertion in color_scheme_test.get_assertions())
+    rows = []
+    lines = []
+    runs = []
+    for row, line in color_scheme_test.get_lines():
+        if row in assertion_lines:
+            continue
+
+        row_runs = []
+        for begin, end, scope in row_scopes.runs(row, 0, len(line)):
+            if scopes is not None:
+                scopes.add(scope)
+            row_runs.append((end - begin, _snapshot_style(color_scheme_style.at_scope(scope))))
+
+        rows.append(row)
+        lines.append(line)
+        runs.append(row_runs)
+
+    return (encode_snapshot(runs, lines_digest(lines)), rows)
+
+
+def _snapshot_styles(style: tuple) -> dict:
+    return {'foreground': style[0], 'background': style[1], 'fontStyle': style[2]}
+
 
-def run_color_scheme_test(test, window, result_printer: ResultPrinter, code_coverage: Coverage):
+def run_color_scheme_test(test, window, result_printer: ResultPrinter, code_coverage: Coverage, plan_cache=None,
+                          result_cache=None, view_pool=None, style_registry=None, resources=None, profiler=None,
+                          snapshots=None):
+    # Snapshots are None when disabled, "record" to compare the styles of the
+    # test with its snapshot, recording it if there isn't one, "check" to
+    # compare without recording, for CI, where a missing snapshot is an error,
+    # or "update" to record the snapshot if it's missing or changed.
     skip = {}  # type: dict
     error = {}  # type: dict
     failures = []
     assertion_count = 0
+    fingerprint = None
+    color_scheme = None
+    scopes = None
+    snapshot = None
+    snapshot_written = None
+    start = timer()
 
-    test_view = TestView(window, test)
+    if profiler:
+        profiler.start_test(test)
+
+    test_view = TestView(window, test, view_pool)
     test_view.setUp()
 
     try:
 
-        color_scheme_test = ColorSchemeTest(test)
+        color_scheme_test = ColorSchemeTest(test, plan_cache, resources, profiler)
 
         if not color_scheme_test.params:
             err_msg = 'Invalid COLOR SCHEME TEST header'
@@ -181,9 +548,46 @@ def run_color_scheme_test(test, window, result_printer: ResultPrinter, code_cove
                 error['col'] = 0
                 raise RuntimeError(err_msg)
 
-        color_scheme_test.init_view(test_view)
+        if snapshots:
+            snapshot_file = snapshot_file_name(test_view.file_name())
+            snapshot = load_snapshot(snapshot_file) or ''
+
+        if result_cache:
+            fingerprint = _test_fingerprint(color_scheme_test, result_cache, snapshot)
+            color_scheme = _color_scheme_digest(color_scheme_test, result_cache)
+            cached_assertions = _cached_assertions(test, color_scheme_test, fingerprint, color_scheme, result_cache)
+            if profiler:
+                profiler.mark('fingerprint')
+            if cached_assertions is not None:
+                assertion_count = cached_assertions
+                result_printer.on_test_cached()
+                code_coverage.on_test_cached(
+                    test,
+                    color_scheme_test.params['color_scheme'],
+                    color_scheme_test.params['syntax'])
+
+                return {
+                    'skip': skip,
+                    'error': error,
+                    'failures': failures,
+                    'assertions': assertion_count,
+                    'time': timer() - start,
+                    'cached': True
+                }
 
-        color_scheme_style = ViewStyle(test_view.view)
+        color_scheme_test.init_view(test_view)
+        if profiler:
+            profiler.mark('view')
+
+        color_scheme_style = ViewStyle(test_view.view, style_registry)
+        row_scopes = RowScopes(test_view.view)
+        if profiler or result_cache:
+            scopes = set()
+        if profiler:
+            profiler.mark('scheme')
+            color_scheme_style.timed = True
+            if profiler.spans is not None:
+                color_scheme_style.resolve_spans = []
 
         # This is down here rather than at the start of the function so that the
         # on_test_start method will have extra information like the color
@@ -191,76 +595,123 @@ def run_color_scheme_test(test, window, result_printer: ResultPrinter, code_cove
         result_printer.on_test_start(test, test_view)
         code_coverage.on_test_start(test, test_view)
 
-        consecutive_test_lines = 0
-        for line_number, line in color_scheme_test.get_lines():
-            has_failed_assertion = False
-            assertion_params = _parse_assertion(line)
-            if not assertion_params:
-                consecutive_test_lines = 0
-                continue
-
-            consecutive_test_lines += 1
+        # The number of asserted columns of each scope, for rule coverage.
+        scope_counts = {} if code_coverage.enabled else None  # type: dict
 
-            requires_build = assertion_params['build']
-            if requires_build:
-                if int(version()) < int(requires_build):
-                    continue
+        build = int(version())
+        for line_number, row, begin, end, expected, requires_build, assertion in color_scheme_test.get_assertions():
+            has_failed_assertion = False
 
-            assertion_row = line_number - consecutive_test_lines
-            assertion_begin = line.find('^')
-            assertion_repeat = assertion_params['repeat']
-            assertion_end = assertion_begin + len(assertion_repeat)
-            assertion_fg = assertion_params['fg']
-            assertion_bg = assertion_params['bg']
-            assertion_fs = assertion_params['fs']
+            if requires_build and build < requires_build:
+                continue
 
-            expected = {}
+            if profiler:
+                runs_start = timer()
+                runs = row_scopes.runs(row, begin, end)
+                profiler.add('scopes', timer() - runs_start, runs_start)
+            else:
+                runs = row_scopes.runs(row, begin, end)
+
+            if scopes is not None:
+                scopes.update(scope for _, _, scope in runs)
+
+            for run_begin, run_end, scope in runs:
+                actual = _actual_styles(expected, color_scheme_style.at_scope(scope))
+                if scope_counts is not None:
+                    scope_counts[scope] = scope_counts.get(scope, 0) + run_end - run_begin
+
+                for col in range(run_begin, run_end):
+                    result_printer.on_assertion()
+                    assertion_count += 1
+
+                    if actual != expected:
+                        has_failed_assertion = True
+                        failures.append({
+                            'assertion': assertion,
+                            'file': test_view.file_name(),
+                            'row': row + 1,
+                            'col': col + 1,
+                            'actual': actual,
+                            'expected': expected,
+                        })
 
-            if assertion_fg is not None:
-                expected['foreground'] = assertion_fg
+            if has_failed_assertion:
+                result_printer.on_test_failure()
+            else:
+                result_printer.on_test_success()
 
-            if assertion_bg is not None:
-                expected['background'] = assertion_bg
+        if scope_counts:
+            code_coverage.on_rule_hits(
+                test_view.view.settings().get('color_scheme'), color_scheme_style.rule_hits(scope_counts))
+
+        if profiler:
+            profiler.add('styles', color_scheme_style.resolve_time)
+            for resolve_start, resolve_time in color_scheme_style.resolve_spans or []:
+                profiler.span('styles', resolve_start, resolve_time)
+            profiler.mark('assertions')
+            profiler.count('assertions', assertion_count)
+            profiler.count('scopes', len(scopes))
+            profiler.count('style_hits', color_scheme_style.hits)
+            profiler.count('style_misses', color_scheme_style.misses)
+
+        if snapshots:
+            actual_snapshot, snapshot_rows = _style_snapshot(color_scheme_test, row_scopes, color_scheme_style, scopes)
+            expected_snapshot = decode_snapshot(snapshot) if snapshot else None
+            snapshot_name = os.path.basename(snapshot_file)
+
+            if not expected_snapshot and snapshots == 'check':
+                err_msg = 'Snapshot missing: {}'.format(snapshot_name)
+                error['message'] = err_msg
+                error['file'] = test_view.file_name()
+                error['row'] = 0
+                error['col'] = 0
+                raise RuntimeError(err_msg)
 
-            if assertion_fs is not None:
-                expected['fontStyle'] = assertion_fs
+            if expected_snapshot and expected_snapshot['digest'] != actual_snapshot['digest'] \
+                    and snapshots != 'update':
+                err_msg = 'Snapshot out of date: {}; update it with an update run'.format(snapshot_name)
+                error['message'] = err_msg
+                error['file'] = test_view.file_name()
+                error['row'] = 0
+                error['col'] = 0
+                raise RuntimeError(err_msg)
 
-            for col in range(assertion_begin, assertion_end):
+            if not expected_snapshot:
+                snapshot_written = 'recorded'
+            elif expected_snapshot != actual_snapshot and snapshots == 'update':
+                snapshot_written = 'updated'
+            else:
                 result_printer.on_assertion()
                 assertion_count += 1
-                assertion_point = test_view.view.text_point(assertion_row, col)
-                actual_styles = color_scheme_style.at_point(assertion_point)
-
-                actual = {}
-                for style in expected:
-                    if style in actual_styles:
-                        if actual_styles[style]:
-                            actual[style] = actual_styles[style].lower()
-                        else:
-                            actual[style] = actual_styles[style]
-                    else:
-                        actual[style] = ''
-
-                if 'fontStyle' in actual and actual['fontStyle'] == 'none':
-                    actual['fontStyle'] = ''
-
-                if actual != expected:
-                    has_failed_assertion = True
+
+                diffs = diff_snapshots(expected_snapshot, actual_snapshot)
+                for line, begin, end, expected, actual in diffs:
                     failures.append({
-                        'assertion': assertion_params['assertion'],
+                        'assertion': 'snapshot {} cols {}-{}'.format(snapshot_name, begin + 1, end),
                         'file': test_view.file_name(),
-                        'row': assertion_row + 1,
-                        'col': col + 1,
-                        'actual': actual,
-                        'expected': expected,
+                        'row': snapshot_rows[line] + 1,
+                        'col': begin + 1,
+                        'actual': _snapshot_styles(actual),
+                        'expected': _snapshot_styles(expected),
                     })
 
-            if has_failed_assertion:
-                result_printer.on_test_failure()
-            else:
-                result_printer.on_test_success()
+                if diffs:
+                    result_printer.on_test_failure()
+                else:
+                    result_printer.on_test_success()
+
+            if snapshot_written:
+                try:
+                    save_snapshot(snapshot_file, actual_snapshot)
+                except OSError:
+                    snapshot_written = None
+
+            if profiler:
+                profiler.mark('snapshot')
 
     except Exception as e:
+        fingerprint = None
+
         if error:
             result_printer.addError(test, test_view)
         elif skip:
@@ -270,16 +721,144 @@ def run_color_scheme_test(test, window, result_printer: ResultPrinter, code_cove
 
     finally:
         test_view.tearDown()
+        result_printer.on_test_end()
+
+        if profiler:
+            profiler.mark('teardown')
+            profiler.end_test()
+
+    if result_cache:
+        if fingerprint and not failures:
+            result_cache.set_passed(
+                test, fingerprint, assertion_count, color_scheme, ScopeFilter.from_scopes(scopes or ()).to_hex())
+            try:
+                _color_scheme_snapshot(color_scheme_test, color_scheme, result_cache)
+            except Exception:
+                pass
+        else:
+            result_cache.remove(test)
 
-    result_printer.on_test_end()
+    # Failures record the digest of the content tested, so that update runs
+    # only rewrite files that haven't changed since.
+    if failures:
+        digest = _test_file_digest(color_scheme_test.content)
+        for failure in failures:
+            failure['digest'] = digest
 
-    return {
+    result = {
         'skip': skip,
         'error': error,
         'failures': failures,
-        'assertions': assertion_count
+        'assertions': assertion_count,
+        'time': timer() - start
     }
 
+    if snapshot_written:
+        result['snapshot'] = snapshot_written
+
+    return result
+
+
+def _test_file_digest(content: str) -> str:
+    # The digest of a test file's content, whatever its line endings.
+    return hashlib.sha1(content.replace('\r\n', '\n').replace('\r', '\n').encode('utf-8')).hexdigest()
+
+
+def _update_failing_assertions(failures: list) -> tuple:
+    # Rewrites the failing assertions of the test files, with one write per
+    # file. Returns the number of files and assertions updated, and the
+    # (file, reason) of the files skipped: files changed since they were
+    # tested, because the rows of their failures may no longer be the rows of
+    # their assertions, and files that can't be read or written, like tests in
+    # .sublime-package files.
+    file_failures = {}  # type: dict
+    for failure in failures:
+        file_failures.setdefault(failure['file'], []).append(failure)
+
+    updated_files = 0
+    updated_assertions = 0
+    skipped = []
+    for file in sorted(file_failures):
+        try:
+            with open(file, 'r', encoding='utf-8', newline='') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            skipped.append((file, 'not readable'))
+            continue
+
+        if _test_file_digest(content) != file_failures[file][0].get('digest'):
+            skipped.append((file, 'changed since it was tested'))
+            continue
+
+        plan = _build_test_plan(content, file)
+        content, updated = update_assertions(content, plan['assertions'], file_failures[file])
+        if not updated:
+            continue
+
+        try:
+            with open(file, 'w', encoding='utf-8', newline='') as f:
+                f.write(content)
+        except OSError:
+            skipped.append((file, 'not writable'))
+            continue
+
+        updated_files += 1
+        updated_assertions += updated
+
+    return (updated_files, updated_assertions, skipped)
+
+
+class _TestRunJob():
+
+    # Runs a test run, a generator that yields after each test, to the end.
+    # Async jobs run in time-boxed slices, and yield to other async work
+    # between slices. Jobs can be cancelled between tests.
+
+    def __init__(self, window_id: int):
+        self.window_id = window_id
+        self.cancelled = False
+        self.steps = None
+
+    def run(self, steps):
+        # Runs the job to the end without yielding, and returns its result.
+        while True:
+            try:
+                next(steps)
+            except StopIteration as e:
+                return e.value
+
+    def start(self, steps) -> None:
+        running = _jobs.get(self.window_id)
+        if running:
+            running.cancel()
+
+        _jobs[self.window_id] = self
+        self.steps = steps
+        set_timeout_async(self._resume, 100)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def _resume(self) -> None:
+        # A slice runs at least one test, however long it takes.
+        slice_end = timer() + _SLICE_TIME
+        try:
+            next(self.steps)
+            while timer() < slice_end:
+                next(self.steps)
+        except StopIteration:
+            self._done()
+            return
+        except Exception:
+            self._done()
+            raise
+
+        set_timeout_async(self._resume, 0)
+
+    def _done(self) -> None:
+        if _jobs.get(self.window_id) is self:
+            del _jobs[self.window_id]
+
 
 class ColorSchemeUnit():
 
@@ -289,12 +868,12 @@ class ColorSchemeUnit():
         if not self.view:
             raise ValueError('view not found')
 
-    def run_file(self):
+    def run_file(self, force=False, update=False):
         file = self.view.file_name()
         if file:
             file = os.path.realpath(file)
             if is_valid_color_scheme_test_file_name(file):
-                self.run(file=file)
+                self.run(file=file, force=force, update=update)
             else:
                 return status_message('ColorSchemeUnit: file name not a valid test file name')
         else:
@@ -303,29 +882,29 @@ class ColorSchemeUnit():
     def results(self):
         self.window.run_command('show_panel', {'panel': 'output.color_scheme_unit'})
 
-    def run(self, package=None, file=None, output=None, **kwargs):
-        is_async = kwargs.get('async', True)
-        if is_async:
-            set_timeout_async(lambda: self._run(package, file, output), 100)
-        else:
-            return self._run(package, file, output, is_async=is_async)
-
-    def _run(self, package=None, file=None, output=None, is_async=True):
-        if package and file:
-            raise TypeError('package or file, but not both')
-
-        unittesting = True if output else False
-
-        tests = []
-
-        resources = find_resources('color_scheme_test*')
+    def run(self, package=None, file=None, output=None, force=False, tests=None, update=False, **kwargs):
+        return self._run(
+            package, file, output, is_async=kwargs.get('async', True), force=force, tests=tests, update=update)
 
-        if file:
+    def cancel(self) -> None:
+        job = _jobs.get(self.window.id())
+        if job:
+            job.cancel()
+        else:
+            status_message('ColorSchemeUnit: no tests running')
+
+    def export_scopes(self, package=None):
+        set_timeout_async(lambda: self._export_scopes(package), 100)
+
+    def _find_tests(self, resources: ResourceIndex, package=None, file=None, tests=None):
+        # Returns the package and tests to run, or None if there are none.
+        if tests is not None:
+            wanted = set(tests)
+            tests = [t for t in resources.tests if t in wanted]
+            package = tests[0].split('/')[1] if tests else None
+        elif file:
             file = os.path.realpath(file)
-            ppr = os.path.dirname(packages_path())
-            for resource in resources:
-                if file == os.path.realpath(os.path.join(ppr, resource)):
-                    tests.append(resource)
+            tests = resources.tests_for_file(file)
         else:
             if not package:
                 package_file = self.view.file_name()
@@ -333,7 +912,7 @@ class ColorSchemeUnit():
                     return message('package file not found')
 
                 package_file = os.path.realpath(package_file)
-                for resource_package in set(t.split('/')[1] for t in resources):
+                for resource_package in set(t.split('/')[1] for t in resources.tests):
                     if package_file.startswith(os.path.realpath(os.path.join(packages_path(), resource_package))):
                         package = resource_package
                         break
@@ -341,11 +920,178 @@ class ColorSchemeUnit():
                 if not package:
                     return message('package not found')
 
-            tests = [t for t in resources if t.startswith('Packages/%s/' % package)]
+            tests = [t for t in resources.tests if t.startswith('Packages/%s/' % package)]
 
         if not len(tests):
             return message('ColorSchemeUnit: no tests found; be sure run tests from within the packages directory')
 
+        return (package, tests)
+
+    def _export_scopes(self, package=None):
+        resources = ResourceIndex()
+        found = self._find_tests(resources, package)
+        if not found:
+            return
+
+        package, tests = found
+
+        # Packages installed as .sublime-package files can't be written to, so
+        # their scopes are exported to the cache directory instead.
+        package_path = os.path.join(packages_path(), package)
+        if os.path.isdir(package_path):
+            scopes_path = package_path
+        else:
+            scopes_path = os.path.join(cache_path(), 'ColorSchemeUnit', 'scopes', package)
+            os.makedirs(scopes_path, exist_ok=True)
+
+        # Scopes of tests that no longer exist are dropped.
+        scopes_file = ScopesFile(os.path.join(scopes_path, 'color_scheme_scopes.json'))
+        scopes_file.tests.clear()
+        failed = 0
+        for test in tests:
+            test_view = TestView(self.window, test)
+            test_view.setUp()
+            try:
+                color_scheme_test = ColorSchemeTest(test, resources=resources)
+                if not color_scheme_test.params:
+                    raise RuntimeError('Invalid COLOR SCHEME TEST header')
+
+                if len(color_scheme_test.params['syntaxes']) != 1:
+                    raise RuntimeError('Syntax not found: {}'.format(color_scheme_test.params['syntax_name']))
+
+                color_scheme_test.init_view(test_view)
+                scopes_file.set(
+                    test,
+                    color_scheme_test.content,
+                    color_scheme_test.params['syntax'],
+                    view_tokens(test_view.view))
+            except Exception as e:
+                # One test that can't be exported doesn't stop the others.
+                failed += 1
+                print('ColorSchemeUnit: could not export scopes of {}: {}'.format(test, e))
+            finally:
+                test_view.tearDown()
+
+        scopes_file.save()
+        if failed:
+            message('exported scopes of {} of {} tests to {}; see the console for the {} that failed'.format(
+                len(tests) - failed, len(tests), scopes_file.file, failed))
+        else:
+            message('exported scopes of {} tests to {}'.format(len(tests), scopes_file.file))
+
+    def _run_tests(self, tests: list, result_printer: ResultPrinter, code_coverage: Coverage, plan_cache,
+                   result_cache, style_registry: StyleRegistry, resources: ResourceIndex, profiler=None,
+                   snapshots=None):
+        # Runs the tests, yielding their results in order.
+        view_pool = TestViewPool(self.window)
+
+        try:
+            for test in tests:
+                yield run_color_scheme_test(
+                    test, self.window, result_printer, code_coverage, plan_cache, result_cache, view_pool,
+                    style_registry, resources, profiler, snapshots)
+        finally:
+            view_pool.close()
+
+    def _run(self, package=None, file=None, output=None, is_async=True, force=False, tests=None, update=False):
+        if package and file:
+            raise TypeError('package or file, but not both')
+
+        job = _TestRunJob(self.window.id())
+        packages = sorted(set(test.split('/')[1] for test in tests)) if tests else []
+        if len(packages) > 1:
+            steps = self._run_packages(job, packages, tests, output, is_async, force, update)
+        else:
+            steps = self._run_steps(job, package, file, output, is_async, force, tests, update)
+
+        if is_async:
+            job.start(steps)
+        else:
+            return job.run(steps)
+
+    def _run_packages(self, job: _TestRunJob, packages: list, tests: list, output=None, is_async=True,
+                      force=False, update=False):
+        # Tests of several packages, for example the tests affected by a save
+        # in watch mode, are run a package at a time, so that the reports,
+        # history, and coverage of each package are its own.
+        unittesting = True if output else False
+        if not output:
+            output = TestOutputPanel(self.window)
+
+        passed = True
+        for i, package in enumerate(packages):
+            if i:
+                output.write("\n")
+
+            package_tests = [test for test in tests if test.split('/')[1] == package]
+            package_passed = yield from self._run_steps(
+                job, output=output, is_async=is_async, force=force, tests=package_tests, update=update,
+                unittesting=False)
+            # None if the package has no tests to run, which isn't a failure.
+            if package_passed is not None:
+                passed = passed and package_passed
+
+            if job.cancelled or (package_passed is False and self.view.settings().get('color_scheme_unit.fail_fast')):
+                break
+
+        if unittesting and is_async:
+            output.write("\n%s\n\nUnitTesting: Done.\n" % ("OK." if passed else "FAILED."))
+            output.close()
+        else:
+            output.flush()
+
+        return passed
+
+    def _run_steps(self, job: _TestRunJob, package=None, file=None, output=None, is_async=True, force=False,
+                   tests=None, update=False, unittesting=None):
+        # A test run, as a generator that yields after each test so that it
+        # can be run in slices. Returns True if all tests passed. If update is
+        # True, failing assertions are rewritten to assert the actual styles.
+        # Runs are UnitTesting runs, which close the output when done, if an
+        # output is given, unless unittesting is False.
+
+        if unittesting is None:
+            unittesting = True if output else False
+
+        profile = self.view.settings().get('color_scheme_unit.profile')
+        trace_file = self.view.settings().get('color_scheme_unit.trace_file')
+        profiler = Profiler(trace=bool(trace_file)) if profile or trace_file else None
+        discovery_start = timer()
+
+        resources = ResourceIndex()
+        found = self._find_tests(resources, package, file, tests)
+        if not found:
+            return
+
+        if profiler:
+            profiler.add_run_phase('discovery', timer() - discovery_start, discovery_start)
+
+        package, tests = found
+        if file:
+            file = os.path.realpath(file)
+
+        shard = self.view.settings().get('color_scheme_unit.shard')
+        if shard:
+            try:
+                shard = parse_shard(shard)
+            except ValueError as e:
+                return message(str(e))
+
+        history_file = self.view.settings().get('color_scheme_unit.history_file')
+        if history_file:
+            history_file = os.path.join(packages_path(), tests[0].split('/')[1], os.path.expanduser(history_file))
+        else:
+            history_file = os.path.join(cache_path(), 'ColorSchemeUnit', 'history.json')
+
+        history = RunHistory(history_file)
+
+        test_count = len(tests)
+        if shard:
+            tests = history.shard(tests, *shard)
+
+        if self.view.settings().get('color_scheme_unit.order') == 'history':
+            tests = history.order(tests)
+
         if not output:
             output = TestOutputPanel(self.window)
 
@@ -356,34 +1102,153 @@ class ColorSchemeUnit():
         if file:
             output.write("File:    %s\n" % file)
 
+        if shard:
+            output.write("Shard:   %d/%d (%d of %d tests)\n" % (shard[0], shard[1], len(tests), test_count))
+
         output.write("\n")
 
+        if not tests:
+            output.write("No tests in this shard.\n")
+            if unittesting and is_async:
+                output.write("\nOK.\n\nUnitTesting: Done.\n")
+                output.close()
+            else:
+                output.flush()
+
+            return True
+
         result_printer = ResultPrinter(output, debug=self.view.settings().get('color_scheme_unit.debug'))
-        code_coverage = Coverage(output, enabled=self.view.settings().get('color_scheme_unit.coverage'), is_single_file=bool(file))  # noqa: E501
+        style_registry = StyleRegistry(resources=resources)
+
+        package_path = os.path.join(packages_path(), tests[0].split('/')[1])
+
+        coverage_file = self.view.settings().get('color_scheme_unit.coverage_file')
+        if coverage_file:
+            coverage_file = os.path.join(package_path, os.path.expanduser(coverage_file))
+            os.makedirs(os.path.dirname(coverage_file), exist_ok=True)
+
+        code_coverage = Coverage(
+            output,
+            enabled=self.view.settings().get('color_scheme_unit.coverage'),
+            is_single_file=bool(file),
+            resources=resources,
+            style_registry=style_registry,
+            file=coverage_file)
+
+        plan_cache = None
+        if self.view.settings().get('color_scheme_unit.cache', True):
+            plan_cache = TestPlanCache(os.path.join(cache_path(), 'ColorSchemeUnit', 'plans'), __version__)
+
+        result_cache = None
+        if self.view.settings().get('color_scheme_unit.incremental'):
+            result_cache = TestResultCache(os.path.join(cache_path(), 'ColorSchemeUnit', 'results.json'), force=force)
+
+        snapshots = self.view.settings().get('color_scheme_unit.snapshots')
+        if snapshots:
+            snapshots = 'update' if update else 'check' if snapshots == 'check' else 'record'
+        else:
+            snapshots = None
 
         skipped = []  # type: list
         errors = []  # type: list
         failures = []  # type: list
         total_assertions = 0
+        written_snapshots = {'recorded': 0, 'updated': 0}
 
         result_printer.on_tests_start(tests)
 
-        for i, test in enumerate(tests):
-            test_result = run_color_scheme_test(test, self.window, result_printer, code_coverage)
-            if test_result['error']:
-                errors += [test_result['error']]
-            if test_result['skip']:
-                skipped += [test_result['skip']]
-            failures += test_result['failures']
-            total_assertions += test_result['assertions']
+        reporters = create_reporters(self.view.settings(), package_path)
+
+        fail_fast = self.view.settings().get('color_scheme_unit.fail_fast')
+        stopped = None
+
+        results = self._run_tests(
+            tests, result_printer, code_coverage, plan_cache, result_cache, style_registry, resources, profiler,
+            snapshots)
+
+        try:
+            test_start = timer()
+            for test, test_result in zip(tests, results):
+                if test_result['error']:
+                    errors += [test_result['error']]
+                if test_result['skip']:
+                    skipped += [test_result['skip']]
+                failures += test_result['failures']
+                total_assertions += test_result['assertions']
+                if test_result.get('snapshot'):
+                    written_snapshots[test_result['snapshot']] += 1
+                # Sharded runs don't record their results in the history
+                # they're split by, so that every shard of a run, whenever it
+                # runs, splits the tests the same way.
+                if not shard:
+                    history.record(test, test_result)
+
+                test_end = timer()
+                for reporter in reporters:
+                    reporter.on_test_end(test, test_result, test_end - test_start)
+
+                if fail_fast and (test_result['error'] or test_result['failures']):
+                    stopped = 'Stopped at the first error or failure'
+                    break
+
+                yield
+
+                if job.cancelled:
+                    stopped = 'Cancelled'
+                    break
+
+                test_start = timer()
+
+            for reporter in reporters:
+                reporter.on_tests_end()
+        finally:
+            # Tests that haven't run when a run stops are abandoned.
+            results.close()
+            for reporter in reporters:
+                reporter.close()
+
+        if plan_cache:
+            plan_cache.prune()
+
+        if result_cache:
+            result_cache.save()
+
+        if not shard:
+            history.save()
+
+        result_printer.on_tests_end(errors, skipped, failures, total_assertions, style_registry, stopped)
+
+        if update and failures:
+            updated_files, updated_assertions, skipped_files = _update_failing_assertions(failures)
+            output.write("\nUpdated %d assertion%s in %d file%s.\n" % (
+                updated_assertions,
+                '' if updated_assertions == 1 else 's',
+                updated_files,
+                '' if updated_files == 1 else 's'))
+            for file, reason in skipped_files:
+                output.write("Skipped %s: %s\n" % (file, reason))
+
+        for written, count in sorted(written_snapshots.items()):
+            if count:
+                output.write("\n%s %d snapshot%s.\n" % (written.capitalize(), count, '' if count == 1 else 's'))
+
+        if not errors and not failures and not stopped:
+            coverage_start = timer()
+            code_coverage.on_tests_end()
+            if profiler and code_coverage.enabled:
+                profiler.add_run_phase('coverage', timer() - coverage_start, coverage_start)
 
-        result_printer.on_tests_end(errors, skipped, failures, total_assertions)
+        if profile:
+            output.write('\n')
+            profiler.report(output)
 
-        if not errors and not failures:
-            code_coverage.on_tests_end()
+        if trace_file:
+            trace_file = os.path.join(package_path, os.path.expanduser(trace_file))
+            os.makedirs(os.path.dirname(trace_file), exist_ok=True)
+            profiler.write_trace(trace_file)
 
         if unittesting and is_async:
-            if errors or failures:
+            if errors or failures or stopped:
                 output.write('\n')
                 output.write("FAILED.\n")
             else:
@@ -393,5 +1258,7 @@ class ColorSchemeUnit():
             output.write('\n')
             output.write("UnitTesting: Done.\n")
             output.close()
+        else:
+            output.flush()
 
-        return not (errors or failures)
+        return not (errors or failures or stopped)
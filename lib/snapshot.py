@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+
+# Golden style snapshots: the style of every column of a test fixture, other
+# than its assertion lines, recorded to a sidecar file next to the test. For
+# example, the snapshot of color_scheme_test.php is
+# color_scheme_snapshot.php.json.
+#
+# Styles are (foreground, background, font style) tuples, stored once in a
+# table, and each line is run-length encoded as a flat list of [length, style
+# index] pairs, so a snapshot is about the size of the tokens of the fixture.
+# Snapshots are compared interval by interval rather than column by column.
+#
+# Lines are numbered without the assertion lines, so adding or changing
+# assertions doesn't invalidate a snapshot, but changing the fixture does:
+# a snapshot records a digest of the lines it was recorded from.
+
+# Bump when the format of snapshot files changes.
+FORMAT = 1
+
+
+def snapshot_file_name(test_file: str) -> str:
+    directory, name = os.path.split(test_file)
+
+    return os.path.join(directory, 'color_scheme_snapshot' + name[len('color_scheme_test'):] + '.json')
+
+
+def lines_digest(lines: list) -> str:
+    return hashlib.sha1('\n'.join(lines).encode('utf-8')).hexdigest()
+
+
+def encode_snapshot(lines: list, digest: str) -> dict:
+    # Encodes the (length, style) runs of each line. Adjacent runs with the
+    # same style are merged.
+    styles = []  # type: list
+    style_index = {}  # type: dict
+    encoded = []
+    for runs in lines:
+        line = []  # type: list
+        for length, style in runs:
+            if not length:
+                continue
+
+            index = style_index.get(style)
+            if index is None:
+                index = style_index[style] = len(styles)
+                styles.append(list(style))
+
+            if line and line[-1] == index:
+                line[-2] += length
+            else:
+                line += [length, index]
+
+        encoded.append(line)
+
+    return {'format': FORMAT, 'digest': digest, 'styles': styles, 'lines': encoded}
+
+
+def load_snapshot(file: str):
+    # Returns the content of the snapshot file, or None if there isn't one.
+    try:
+        with open(file, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def decode_snapshot(content: str):
+    # Returns the snapshot, or None if it's invalid or of another format.
+    try:
+        snapshot = json.loads(content)
+    except ValueError:
+        return None
+
+    if not isinstance(snapshot, dict) or snapshot.get('format') != FORMAT:
+        return None
+
+    return snapshot
+
+
+def save_snapshot(file: str, snapshot: dict) -> None:
+    # One line of the file per line of the fixture, so that changes to
+    # snapshots are easy to review.
+    content = '{\n"format": %d,\n"digest": %s,\n"styles": [\n%s\n],\n"lines": [\n%s\n]\n}\n' % (
+        snapshot['format'],
+        json.dumps(snapshot['digest']),
+        ',\n'.join(json.dumps(style) for style in snapshot['styles']),
+        ',\n'.join(json.dumps(line, separators=(',', ':')) for line in snapshot['lines']))
+
+    tmp_file = file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(content)
+    os.replace(tmp_file, file)
+
+
+def _intervals(snapshot: dict, line: int) -> list:
+    # The (begin, end, style) intervals of a line.
+    styles = snapshot['styles']
+    encoded = snapshot['lines'][line] if line < len(snapshot['lines']) else []
+    intervals = []
+    begin = 0
+    for i in range(0, len(encoded), 2):
+        end = begin + encoded[i]
+        intervals.append((begin, end, tuple(styles[encoded[i + 1]])))
+        begin = end
+
+    return intervals
+
+
+def diff_snapshots(expected: dict, actual: dict) -> list:
+    # Returns the (line, begin, end, expected style, actual style) intervals
+    # where the styles of two snapshots of the same lines differ. The
+    # intervals of each line are walked in step, so the cost is linear in the
+    # number of runs rather than columns.
+    diffs = []  # type: list
+    for line in range(max(len(expected['lines']), len(actual['lines']))):
+        a = _intervals(expected, line)
+        b = _intervals(actual, line)
+        i = j = 0
+        begin = 0
+        while i < len(a) and j < len(b):
+            end = min(a[i][1], b[j][1])
+            if a[i][2] != b[j][2]:
+                last = diffs[-1] if diffs else None
+                if last and last[0] == line and last[2] == begin and last[3:] == (a[i][2], b[j][2]):
+                    diffs[-1] = (line, last[1], end, a[i][2], b[j][2])
+                else:
+                    diffs.append((line, begin, end, a[i][2], b[j][2]))
+
+            begin = end
+            if a[i][1] == end:
+                i += 1
+            if b[j][1] == end:
+                j += 1
+
+    return diffs
@@ -1,28 +1,50 @@
+from collections import OrderedDict
 import os
+from timeit import default_timer as timer
 
+from sublime import load_settings
 from sublime import packages_path
 from sublime import Region
 from sublime import version
 
 
+def _create_test_panel(window, name: str):
+    if int(version()) > 3083:
+        return window.create_output_panel(name, unlisted=True)
+
+    return window.create_output_panel(name)
+
+
 class TestView():
 
-    def __init__(self, window, test):
+    def __init__(self, window, test, pool=None):
         self.window = window
         self.test = test
+        self.pool = pool
         self.name = 'color_scheme_unit_test_view'
+        self.view = None
 
     def setUp(self):
-        if int(version()) > 3083:
-            self.view = self.window.create_output_panel(self.name, unlisted=True)
+        # Pooled views are acquired by configure() once the syntax and color
+        # scheme of the test are known.
+        if not self.pool:
+            self.view = _create_test_panel(self.window, self.name)
+
+    def configure(self, syntax: str, color_scheme: str) -> None:
+        if self.pool:
+            self.view = self.pool.acquire(syntax, color_scheme)
         else:
-            self.view = self.window.create_output_panel(self.name)
+            self.view.assign_syntax(syntax)
+            self.view.settings().set('color_scheme', color_scheme)
 
     def settings(self):
+        if self.view is None:
+            return load_settings('Preferences.sublime-settings')
+
         return self.view.settings()
 
     def tearDown(self):
-        if self.view:
+        if self.view and not self.pool:
             self.view.close()
 
     def file_name(self):
@@ -31,12 +53,61 @@ class TestView():
     def set_content(self, content):
         self.view.run_command('color_scheme_unit_setup_test_fixture', {'content': content})
 
+        # Pooled views are reused by many tests, so the undo history of their
+        # fixtures would grow for as long as the pool is open.
+        if hasattr(self.view, 'clear_undo_stack'):
+            self.view.clear_undo_stack()
+
     def get_content(self):
         return self.view.substr(Region(0, self.view.size()))
 
 
+class TestViewPool():
+
+    def __init__(self, window, size: int = 4):
+        self.window = window
+        self.size = size
+        self._views = OrderedDict()  # type: OrderedDict
+        self._panels = 0
+
+    def acquire(self, syntax: str, color_scheme: str):
+        # Returns a view configured with the syntax and color scheme. Views are
+        # reused by tests with the same syntax and color scheme, and the least
+        # recently used view is reconfigured when the pool is full.
+        key = (syntax, color_scheme)
+        if key in self._views:
+            self._views.move_to_end(key)
+
+            return self._views[key]
+
+        if len(self._views) < self.size:
+            self._panels += 1
+            view = _create_test_panel(self.window, 'color_scheme_unit_test_view_%d' % self._panels)
+        else:
+            view = self._views.popitem(last=False)[1]
+
+        view.assign_syntax(syntax)
+        view.settings().set('color_scheme', color_scheme)
+        self._views[key] = view
+
+        return view
+
+    def close(self) -> None:
+        for view in self._views.values():
+            view.close()
+
+        self._views.clear()
+
+
 class TestOutputPanel():
 
+    # Writes are buffered: every append makes the view re-tokenize and redraw,
+    # so the buffer is only appended to the view when it grows larger than
+    # FLUSH_SIZE characters, when FLUSH_INTERVAL seconds have passed since it
+    # was last appended, or when flushed.
+    FLUSH_SIZE = 4096
+    FLUSH_INTERVAL = 0.2
+
     def __init__(self, window):
         self.name = 'color_scheme_output'
         self.window = window
@@ -72,18 +143,31 @@ class TestOutputPanel():
         self.show()
 
         self.closed = False
+        self._buffer = []  # type: list
+        self._buffer_size = 0
+        self._flushed_at = timer()
 
     def write(self, text):
-        self.view.run_command('append', {'characters': text, 'scroll_to_end': True})
+        self._buffer.append(text)
+        self._buffer_size += len(text)
+
+        if self._buffer_size >= self.FLUSH_SIZE or timer() - self._flushed_at >= self.FLUSH_INTERVAL:
+            self.flush()
 
     def writeln(self, s):
         self.write(s + "\n")
 
     def flush(self):
-        pass
+        if self._buffer:
+            self.view.run_command('append', {'characters': ''.join(self._buffer), 'scroll_to_end': True})
+            self._buffer = []
+            self._buffer_size = 0
+
+        self._flushed_at = timer()
 
     def show(self):
         self.window.run_command("show_panel", {"panel": "output." + self.name})
 
     def close(self):
+        self.flush()
         self.closed = True
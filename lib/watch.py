@@ -0,0 +1,162 @@
+import os
+
+from sublime import load_resource
+from sublime import packages_path
+from sublime import Region
+from sublime import set_timeout_async
+from sublime import status_message
+
+from ColorSchemeUnit.lib.resources import ResourceIndex
+from ColorSchemeUnit.lib.runner import ColorSchemeUnit
+from ColorSchemeUnit.lib.runner import get_color_scheme_test_params
+from ColorSchemeUnit.lib.runner import is_valid_color_scheme_test_file_name
+
+# Saves are collected for this many milliseconds before the tests they affect
+# are run, so that saving several files, or saving repeatedly, runs once.
+_DEBOUNCE_DELAY = 300
+
+_SYNTAX_EXTENSIONS = ('.sublime-syntax', '.tmLanguage', '.hidden-tmLanguage')
+
+# The ids of the windows in watch mode.
+_watching = set()  # type: set
+
+# Saved files' tests waiting to be run, and the number of saves so far, by
+# window id.
+_pending = {}  # type: dict
+_saves = {}  # type: dict
+
+_graph = None  # type: DependencyGraph
+
+
+class DependencyGraph():
+
+    # Maps color schemes and syntaxes to the tests that use them. Color schemes
+    # are keyed by file name, so that overrides in other packages, such as
+    # User, map to the same tests, and syntaxes by name, as in test headers.
+
+    def __init__(self):
+        self.tests = {}  # type: dict
+        self.color_schemes = {}  # type: dict
+        self.syntaxes = {}  # type: dict
+        self._realpaths = {}  # type: dict
+
+    def add(self, test: str, color_scheme: str, syntax_name: str) -> None:
+        self.remove(test)
+        color_scheme = color_scheme.rpartition('/')[2]
+        self.tests[test] = (color_scheme, syntax_name)
+        self._realpaths[self._realpath(test)] = test
+        self.color_schemes.setdefault(color_scheme, set()).add(test)
+        self.syntaxes.setdefault(syntax_name, set()).add(test)
+
+    def remove(self, test: str) -> None:
+        if test not in self.tests:
+            return
+
+        color_scheme, syntax_name = self.tests.pop(test)
+        self.color_schemes[color_scheme].discard(test)
+        self.syntaxes[syntax_name].discard(test)
+        realpath = self._realpath(test)
+        if self._realpaths.get(realpath) == test:
+            del self._realpaths[realpath]
+
+    def _realpath(self, test: str) -> str:
+        return os.path.realpath(os.path.join(os.path.dirname(packages_path()), test))
+
+    def add_test(self, test: str, content: str, resources=None) -> None:
+        params = get_color_scheme_test_params(content, test, resources)
+        if params:
+            self.add(test, params['color_scheme'], params['syntax_name'])
+        else:
+            self.remove(test)
+
+    def test_for_file(self, file_name: str):
+        test = self._realpaths.get(os.path.realpath(file_name))
+        if test:
+            return test
+
+        # A new test.
+        file_name = os.path.abspath(file_name)
+        if file_name.startswith(packages_path() + os.sep):
+            return 'Packages/' + os.path.relpath(file_name, packages_path()).replace(os.sep, '/')
+
+        return None
+
+    def affected(self, file_name: str) -> list:
+        # Returns the tests affected by a change to a file: the test itself,
+        # or the tests using a color scheme or syntax.
+        name = os.path.basename(file_name)
+        if name in self.color_schemes:
+            return sorted(self.color_schemes[name])
+
+        syntax_name, ext = os.path.splitext(name)
+        if ext in _SYNTAX_EXTENSIONS and syntax_name in self.syntaxes:
+            return sorted(self.syntaxes[syntax_name])
+
+        return []
+
+
+def _build_graph() -> DependencyGraph:
+    resources = ResourceIndex()
+    graph = DependencyGraph()
+    for test in resources.tests:
+        try:
+            graph.add_test(test, load_resource(test), resources)
+        except IOError:
+            pass
+
+    return graph
+
+
+def is_watching(window) -> bool:
+    return window.id() in _watching
+
+
+def toggle(window) -> None:
+    if window.id() in _watching:
+        _watching.discard(window.id())
+        status_message('ColorSchemeUnit: watch mode off')
+    else:
+        _watching.add(window.id())
+        status_message('ColorSchemeUnit: watch mode on')
+
+
+def on_post_save(view) -> None:
+    # Called on the async thread.
+    global _graph
+
+    window = view.window()
+    file_name = view.file_name()
+    if not window or not file_name or window.id() not in _watching:
+        return
+
+    if _graph is None:
+        _graph = _build_graph()
+
+    if is_valid_color_scheme_test_file_name(file_name):
+        test = _graph.test_for_file(file_name)
+        if not test:
+            return
+
+        # The graph is updated from the saved test, which may have changed its
+        # color scheme or syntax.
+        _graph.add_test(test, view.substr(Region(0, view.size())))
+        tests = [test]
+    else:
+        tests = _graph.affected(file_name)
+
+    if not tests:
+        return
+
+    _pending.setdefault(window.id(), set()).update(tests)
+    _saves[window.id()] = saves = _saves.get(window.id(), 0) + 1
+    set_timeout_async(lambda: _run_pending(window, saves), _DEBOUNCE_DELAY)
+
+
+def _run_pending(window, saves: int) -> None:
+    # Only the last of a series of saves runs the tests.
+    if _saves.get(window.id()) != saves or window.id() not in _watching:
+        return
+
+    tests = _pending.pop(window.id(), set())
+    if tests:
+        ColorSchemeUnit(window).run(tests=sorted(tests))
@@ -5,8 +5,10 @@ from sublime import set_clipboard
 from sublime import status_message
 import sublime_plugin
 
+from ColorSchemeUnit.lib import watch
 from ColorSchemeUnit.lib.color_scheme import ViewStyle
-from ColorSchemeUnit.lib.generator import generate_color_scheme_assertions
+from ColorSchemeUnit.lib.generator import generate_assertions
+from ColorSchemeUnit.lib.generator import insert_assertions
 from ColorSchemeUnit.lib.runner import ColorSchemeUnit
 from ColorSchemeUnit.lib.runner import get_color_scheme_test_params_from_view
 from ColorSchemeUnit.lib.runner import is_valid_color_scheme_test_file_name
@@ -14,11 +16,17 @@ from ColorSchemeUnit.lib.runner import is_valid_color_scheme_test_file_name
 
 class ColorSchemeUnitGenerateAssertions(sublime_plugin.TextCommand):
 
-    def run(self, edit):
-        point = self.view.sel()[0].begin()
-        line = self.view.line(point)
-        assertions = generate_color_scheme_assertions(self.view, point)
-        self.view.insert(edit, line.end(), '\n' + assertions)
+    def run(self, edit, file=False):
+        # Generates assertions for the lines of the selections, or of the
+        # whole file.
+        if file:
+            rows = set(range(self.view.rowcol(self.view.size())[0] + 1))
+        else:
+            rows = set()
+            for region in self.view.sel():
+                rows.update(range(self.view.rowcol(region.begin())[0], self.view.rowcol(region.end())[0] + 1))
+
+        insert_assertions(self.view, edit, generate_assertions(self.view, sorted(rows)))
 
 
 class ColorSchemeUnitEvents(sublime_plugin.EventListener):
@@ -30,6 +38,9 @@ class ColorSchemeUnitEvents(sublime_plugin.EventListener):
                 view.settings().set('color_scheme', params['color_scheme'])
                 view.assign_syntax(params['syntax'])
 
+    def on_post_save_async(self, view):
+        watch.on_post_save(view)
+
 
 class ColorSchemeUnitSetupTestFixtureCommand(sublime_plugin.TextCommand):
 
@@ -92,13 +103,34 @@ class ColorSchemeUnitShowStyles(sublime_plugin.WindowCommand):
             on_navigate=lambda x: copy(view, x))
 
 
-class ColorSchemeUnitTestSuite(sublime_plugin.WindowCommand):
+class ColorSchemeUnitCancel(sublime_plugin.WindowCommand):
+
+    def run(self):
+        ColorSchemeUnit(self.window).cancel()
+
+
+class ColorSchemeUnitExportScopes(sublime_plugin.WindowCommand):
 
     def run(self, package=None):
-        ColorSchemeUnit(self.window).run(package)
+        ColorSchemeUnit(self.window).export_scopes(package)
+
+
+class ColorSchemeUnitTestSuite(sublime_plugin.WindowCommand):
+
+    def run(self, package=None, force=False, update=False):
+        ColorSchemeUnit(self.window).run(package, force=force, update=update)
 
 
 class ColorSchemeUnitTestFile(sublime_plugin.WindowCommand):
 
+    def run(self, force=False, update=False):
+        ColorSchemeUnit(self.window).run_file(force=force, update=update)
+
+
+class ColorSchemeUnitToggleWatchMode(sublime_plugin.WindowCommand):
+
     def run(self):
-        ColorSchemeUnit(self.window).run_file()
+        watch.toggle(self.window)
+
+    def is_checked(self):
+        return watch.is_watching(self.window)
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from ColorSchemeUnit.lib.cache import TestPlanCache
+from ColorSchemeUnit.lib.cache import TestResultCache
+
+
+class TestTestPlanCache(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_get_set(self):
+        cache = TestPlanCache(self.path, '1.0.0')
+        key = cache.key('color_scheme_test.php', 'content')
+        self.assertIsNone(cache.get(key))
+
+        plan = {'header': {'color_scheme': 'x'}, 'assertions': [[2, 1, 4, 5, {'foreground': '#fff'}, None, 'x']]}
+        cache.set(key, plan)
+        self.assertEquals(plan, cache.get(key))
+
+    def test_key_depends_on_content_extension_and_version(self):
+        cache = TestPlanCache(self.path, '1.0.0')
+        key = cache.key('color_scheme_test.php', 'content')
+        self.assertEquals(key, cache.key('Packages/X/color_scheme_test.php', 'content'))
+        self.assertNotEqual(key, cache.key('color_scheme_test.php', 'content changed'))
+        self.assertNotEqual(key, cache.key('color_scheme_test.rb', 'content'))
+        self.assertNotEqual(key, TestPlanCache(self.path, '1.0.1').key('color_scheme_test.php', 'content'))
+
+    def test_version_change_invalidates(self):
+        TestPlanCache(self.path, '1.0.0').set('k', {'header': None, 'assertions': []})
+        self.assertIsNone(TestPlanCache(self.path, '1.0.1').get('k'))
+        self.assertEquals([], os.listdir(self.path))
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = TestPlanCache(self.path, '1.0.0')
+        with open(os.path.join(self.path, 'k.json'), 'w') as f:
+            f.write('{')
+        self.assertIsNone(cache.get('k'))
+
+    def test_prune_evicts_least_recently_used(self):
+        cache = TestPlanCache(self.path, '1.0.0', max_entries=2)
+        for i, key in enumerate(('a', 'b', 'c')):
+            cache.set(key, {'header': None, 'assertions': []})
+            os.utime(os.path.join(self.path, key + '.json'), (time.time() - 100 + i, time.time() - 100 + i))
+
+        cache.get('a')
+        cache.prune()
+
+        self.assertEquals(['a.json', 'c.json'], sorted(os.listdir(self.path)))
+
+
+class TestTestResultCache(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file = os.path.join(self.path, 'results.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_fingerprint(self):
+        self.assertEquals(TestResultCache.fingerprint(['a', 'b']), TestResultCache.fingerprint(['a', 'b']))
+        self.assertNotEqual(TestResultCache.fingerprint(['a', 'b']), TestResultCache.fingerprint(['ab']))
+
+    def test_passed_results_are_persisted(self):
+        cache = TestResultCache(self.file)
+        self.assertIsNone(cache.get_result('test', 'x'))
+        cache.set_passed('test', 'x', 42)
+        cache.save()
+
+        cache = TestResultCache(self.file)
+        self.assertEquals(42, cache.get_result('test', 'x')['assertions'])
+        self.assertIsNone(cache.get_result('test', 'y'))
+
+        cache.remove('test')
+        cache.save()
+        self.assertIsNone(TestResultCache(self.file).get_result('test', 'x'))
+
+    def test_force(self):
+        cache = TestResultCache(self.file)
+        cache.set_passed('test', 'x', 42)
+        cache.save()
+
+        self.assertIsNone(TestResultCache(self.file, force=True).get_result('test', 'x'))
+
+    def test_color_scheme_snapshots_are_persisted_while_referenced(self):
+        cache = TestResultCache(self.file)
+        cache.set_passed('test', 'x', 42, 'a', 'ff')
+        cache.set_color_scheme('a', {'other': 'o', 'rules': []})
+        cache.set_color_scheme('b', {'other': 'o', 'rules': []})
+        cache.save()
+
+        cache = TestResultCache(self.file)
+        self.assertEquals(
+            {'fingerprint': 'x', 'assertions': 42, 'color_scheme': 'a', 'scopes': 'ff'},
+            cache.get_result('test', 'x'))
+        self.assertEquals(['a'], list(cache.color_schemes))
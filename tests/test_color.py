@@ -0,0 +1,94 @@
+from unittest import TestCase
+
+from ColorSchemeUnit.lib.color import ColorError
+from ColorSchemeUnit.lib.color import ColorResolver
+
+
+class TestColorResolver(TestCase):
+
+    def test_hex(self):
+        resolver = ColorResolver()
+        self.assertEquals('#aabbcc', resolver.resolve('#ABC'))
+        self.assertEquals('#aabbccdd', resolver.resolve('#abcd'))
+        self.assertEquals('#112233', resolver.resolve(' #112233 '))
+        self.assertEquals('#112233', resolver.resolve('#112233ff'))
+        self.assertEquals('#11223380', resolver.resolve('#11223380'))
+
+    def test_functions_and_names(self):
+        resolver = ColorResolver()
+        self.assertEquals('#ff0000', resolver.resolve('red'))
+        self.assertEquals('#00000000', resolver.resolve('transparent'))
+        self.assertEquals('#0a141e', resolver.resolve('rgb(10, 20, 30)'))
+        self.assertEquals('#0a141e80', resolver.resolve('rgba(10, 20, 30, 0.5)'))
+        self.assertEquals('#008000', resolver.resolve('hsl(120, 100%, 25%)'))
+        self.assertEquals('#00800080', resolver.resolve('hsla(120, 100%, 25%, 50%)'))
+        self.assertEquals('#ff0080', resolver.resolve('rgb(100%, 0%, 50%)'))
+        self.assertEquals('#ff008080', resolver.resolve('rgba(100%, 0, 50%, 50%)'))
+
+    def test_color_adjusters(self):
+        resolver = ColorResolver()
+        self.assertEquals('#ff000080', resolver.resolve('color(#f00 alpha(0.5))'))
+        self.assertEquals('#ff000040', resolver.resolve('color(#ff000080 a(- 25%))'))
+        self.assertEquals('#ff8080', resolver.resolve('color(red blend(white 50%))'))
+        self.assertEquals('#ff000080', resolver.resolve('color(red blenda(#ff000000 50%))'))
+        self.assertEquals('#ff6666', resolver.resolve('color(red l(+ 20%))'))
+        self.assertEquals('#808080', resolver.resolve('color(red s(0%))'))
+        self.assertEquals('#0000ffbf', resolver.resolve('color(color(blue alpha(0.5)) alpha(+ 0.25))'))
+
+    def test_variables(self):
+        resolver = ColorResolver({
+            'red': '#f00',
+            'accent': 'var(red)',
+            'faded': 'color(var(accent) alpha(0.5))',
+            'mixed': 'color(var(red) blend(var(white) 50%))',
+            'white': 'white',
+        })
+        self.assertEquals('#ff0000', resolver.resolve('var(accent)'))
+        self.assertEquals('#ff000080', resolver.resolve('var(faded)'))
+        self.assertEquals('#ff8080', resolver.resolve('var( mixed )'))
+        self.assertEquals((255, 0, 0, 1.0), resolver.variable('accent'))
+
+    def test_custom_property_variables(self):
+        resolver = ColorResolver({'--red': '#f00', '--accent': 'color(var(--red) blend(var(--white) 50%))',
+                                  '--white': 'white'})
+        self.assertEquals('#ff0000', resolver.resolve('var(--red)'))
+        self.assertEquals('#ff000080', resolver.resolve('color(var(--red) alpha(0.5))'))
+        self.assertEquals('#ff8080', resolver.resolve('var(--accent)'))
+
+    def test_unresolvable_values_are_returned_as_is(self):
+        resolver = ColorResolver({'a': 'var(b)', 'b': 'var(a)', 'c': 'var(a)', 'font': 'bold', 'n': 1})
+        for value in ('var(a)', 'var(b)', 'var(c)', 'var(undefined)', 'var(font)', 'var(n)', 'bold', '#12345',
+                      'color(red unknown(1))', 'rgb(1, 2)', 'color(red', ''):
+            self.assertEquals(value, resolver.resolve(value))
+
+        self.assertEquals(None, resolver.resolve(None))
+        self.assertEquals(['#fff'], resolver.resolve(['#fff']))
+
+    def test_cycles_are_detected(self):
+        resolver = ColorResolver({'a': 'color(var(b) alpha(0.5))', 'b': 'var(c)', 'c': 'var(a)', 'd': 'var(c)'})
+        for name in ('a', 'b', 'c', 'd'):
+            with self.assertRaises(ColorError):
+                resolver.variable(name)
+
+    def test_long_chains_of_variables(self):
+        variables = {'v0': '#102030'}
+        for i in range(1, 3000):
+            variables['v%d' % i] = 'var(v%d)' % (i // 2) if i % 2 else 'color(var(v%d) alpha(0.5))' % (i - 1)
+
+        resolver = ColorResolver(variables)
+        self.assertEquals('#102030', resolver.resolve('var(v1)'))
+        self.assertEquals('#10203080', resolver.resolve('var(v2998)'))
+
+    def test_resolving_long_chains_does_not_depend_on_order(self):
+        variables = {'v0': '#102030'}
+        for i in range(1, 3000):
+            variables['v%d' % i] = 'var(v%d)' % (i - 1)
+
+        resolver = ColorResolver(variables)
+        self.assertEquals('#102030', resolver.resolve('var(v2999)'))
+        for i in range(3000):
+            self.assertEquals((16, 32, 48, 1.0), resolver.variable('v%d' % i))
+
+        resolver = ColorResolver(variables)
+        for i in range(3000):
+            self.assertEquals((16, 32, 48, 1.0), resolver.variable('v%d' % i))
@@ -1,4 +1,9 @@
+from unittest import TestCase
+
 from ColorSchemeUnit.lib.color_scheme import ColorSchemeResource
+from ColorSchemeUnit.lib.color_scheme import RowScopes
+from ColorSchemeUnit.lib.color_scheme import ScopeCache
+from ColorSchemeUnit.lib.color_scheme import StyleRegistry
 from ColorSchemeUnit.lib.color_scheme import ViewStyle
 from ColorSchemeUnit.lib.color_scheme import load_color_scheme_resource
 from ColorSchemeUnit.tests import unittest
@@ -71,6 +76,93 @@ class TestViewStyle(unittest.ViewTestCase):
             self.assertEquals('#dddddd', s['foreground'])
 
 
+class TestStyleRegistry(unittest.ViewTestCase):
+
+    def test_styles_are_shared_across_view_styles(self):
+        with self.loadColorScheme('ColorSchemeUnitTest.hidden-color-scheme'):
+            self.fixture('<?php\n// comment\n')
+            registry = StyleRegistry()
+
+            a = ViewStyle(self.view, registry)
+            a.at_point(8)
+            a.at_point(9)
+            self.assertEquals((1, 1), (a.hits, a.misses))
+
+            b = ViewStyle(self.view, registry)
+            self.assertEquals('#75715e', b.at_point(8)['foreground'])
+            self.assertEquals((1, 0), (b.hits, b.misses))
+            self.assertEquals((2, 1), (registry.hits, registry.misses))
+
+    def test_least_recently_used_color_scheme_is_dropped(self):
+        registry = StyleRegistry(size=1)
+        with self.loadColorScheme('ColorSchemeUnitTest.hidden-color-scheme'):
+            styles = registry.get(self.view)
+            self.assertIs(styles, registry.get(self.view))
+
+        with self.loadColorScheme('Packages/ColorSchemeUnit/tests/fixtures/ColorSchemeUnitLegacyTest.hidden-tmTheme'):
+            registry.get(self.view)
+
+        with self.loadColorScheme('ColorSchemeUnitTest.hidden-color-scheme'):
+            self.assertIsNot(styles, registry.get(self.view))
+
+    def test_least_recently_used_scope_is_dropped(self):
+        with self.loadColorScheme('ColorSchemeUnitTest.hidden-color-scheme'):
+            self.fixture('<?php\n// comment\n')
+            registry = StyleRegistry(cache_size=1)
+
+            style = ViewStyle(self.view, registry)
+            style.at_point(8)
+            style.at_point(0)
+            style.at_point(8)
+            self.assertEquals((0, 3), (style.hits, style.misses))
+            self.assertEquals(1, style.scope_style_cache.count())
+
+
+class TestScopeCache(TestCase):
+
+    def test_least_recently_used_scope_is_dropped(self):
+        cache = ScopeCache(size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEquals(1, cache.get('a'))
+
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEquals(1, cache.get('a'))
+        self.assertEquals(3, cache.get('c'))
+        self.assertEquals(2, cache.count())
+
+    def test_setting_a_cached_scope_keeps_one_entry(self):
+        cache = ScopeCache(size=2)
+        cache.set('a', 1)
+        cache.set('a', 2)
+
+        self.assertEquals(2, cache.get('a'))
+        self.assertEquals(1, cache.count())
+
+
+class TestRowScopes(unittest.ViewTestCase):
+
+    def test_runs_match_scope_name(self):
+        self.fixture('<?php\nif (CONSTANT === "string") {\n}\n')
+        runs = RowScopes(self.view).runs(1, 2, 32)
+
+        self.assertEquals(2, runs[0][0])
+        self.assertEquals(32, runs[-1][1])
+
+        col = 2
+        for begin, end, scope in runs:
+            self.assertEquals(col, begin)
+            for c in range(begin, end):
+                self.assertEquals(self.view.scope_name(self.view.text_point(1, c)), scope)
+            col = end
+
+    def test_runs_before_first_row(self):
+        self.fixture('<?php\n')
+        runs = RowScopes(self.view).runs(-1, 0, 2)
+        self.assertEquals([0, 1], [begin for begin, end, scope in runs])
+
+
 class TestColorSchemeResource(unittest.ViewTestCase):
 
     def test_resource_content_is_dict(self):
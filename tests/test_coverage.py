@@ -0,0 +1,125 @@
+from unittest import TestCase
+
+import json
+
+from ColorSchemeUnit.lib.coverage import Coverage
+from ColorSchemeUnit.lib.coverage import _count_rule_hits
+from ColorSchemeUnit.lib.coverage import render_html
+from ColorSchemeUnit.lib.coverage import render_json
+from ColorSchemeUnit.lib.coverage import render_text
+
+
+class _Output():
+
+    def __init__(self):
+        self.writes = []  # type: list
+
+    def write(self, text):
+        self.writes.append(text)
+
+
+class _Styles():
+
+    def __init__(self, content):
+        self.content = content
+
+
+class _StyleRegistry():
+
+    def __init__(self, styles):
+        self.styles = styles
+
+    def find(self, color_scheme):
+        return self.styles.get(color_scheme)
+
+
+def _coverage(output=None, **kwargs):
+    content = {
+        'globals': {'foreground': '#ffffff'},
+        'rules': [
+            {'scope': 'comment', 'foreground': '#75715e'},
+            {'name': 'Strings', 'scope': 'string', 'foreground': '#ffff00'},
+        ],
+    }
+    registry = _StyleRegistry({
+        'Packages/A/A.sublime-color-scheme': _Styles(content),
+        'Packages/B/B.sublime-color-scheme': _Styles(content),
+    })
+
+    coverage = Coverage(output, enabled=True, is_single_file=False, style_registry=registry, **kwargs)
+    coverage.add_test('a', 'Packages/A/A.sublime-color-scheme', 'Packages/PHP/PHP.sublime-syntax')
+    coverage.add_test('b', 'Packages/B/B.sublime-color-scheme', 'Packages/PHP/PHP.sublime-syntax')
+    coverage.add_test('c', 'Packages/B/B.sublime-color-scheme', 'Packages/CSS/CSS.sublime-syntax')
+    coverage.on_rule_hits('Packages/B/B.sublime-color-scheme', {0b10: 3})
+
+    return coverage
+
+
+class TestReport(TestCase):
+
+    def test_report(self):
+        report = _coverage().report()
+
+        self.assertEquals(
+            ['Packages/A/A.sublime-color-scheme', 'Packages/B/B.sublime-color-scheme'],
+            [info['color_scheme'] for info in report])
+        self.assertEquals(
+            ['Packages/CSS/CSS.sublime-syntax', 'Packages/PHP/PHP.sublime-syntax'],
+            report[1]['syntaxes'])
+        self.assertNotIn('Packages/CSS/CSS.sublime-syntax', report[1]['syntaxes_not_covered'])
+        self.assertEquals(['#75715e', '#ffff00', '#ffffff'], report[1]['colors'])
+        self.assertEquals(['comment', 'string'], report[1]['scopes'])
+        self.assertNotIn('comment', report[1]['scopes_not_covered'])
+        self.assertEquals([
+            {'rule': 1, 'scope': 'comment', 'name': None, 'hits': 0},
+            {'rule': 2, 'scope': 'string', 'name': 'Strings', 'hits': 3},
+        ], report[1]['rules'])
+
+    def test_report_is_written_once(self):
+        output = _Output()
+        _coverage(output).on_tests_end()
+
+        self.assertEquals(1, len(output.writes))
+        self.assertEquals(1, output.writes[0].count('Minimal syntaxes'))
+        self.assertIn('1) Packages/A/A.sublime-color-scheme', output.writes[0])
+        self.assertIn('2) Packages/B/B.sublime-color-scheme', output.writes[0])
+        self.assertIn('       3 | #2: string (Strings)', output.writes[0])
+
+    def test_render(self):
+        report = _coverage().report()
+
+        text = render_text(report, is_single_file=True)
+        self.assertEquals(1, text.count('Minimal syntaxes'))
+        self.assertNotIn('recommended minimal set of syntaxes', text)
+
+        data = json.loads(render_json(report, cached_tests=2))
+        self.assertEquals(report, data['color_schemes'])
+        self.assertEquals(2, data['cached_tests'])
+
+        html = render_html(report)
+        self.assertIn('<td>string (Strings)</td><td class="n">3</td>', html)
+
+
+class TestRuleHits(TestCase):
+
+    def test_count_rule_hits(self):
+        self.assertEquals([0, 0, 0], _count_rule_hits({}, 3))
+        self.assertEquals([5, 0, 7], _count_rule_hits({0b001: 3, 0b101: 2, 0b100: 5}, 3))
+
+    def test_count_rule_hits_of_large_color_schemes(self):
+        hits = _count_rule_hits({(1 << 1000) | 1: 2}, 1001)
+        self.assertEquals(2, hits[0])
+        self.assertEquals(2, hits[1000])
+        self.assertEquals(4, sum(hits))
+
+    def test_hits_are_added_up(self):
+        coverage = Coverage(None, enabled=True, is_single_file=False)
+        coverage.on_rule_hits('a', {0b01: 1, 0b10: 2})
+        coverage.on_rule_hits('a', {0b01: 3})
+        coverage.on_rule_hits('b', {0b01: 1})
+        self.assertEquals({'a': {0b01: 4, 0b10: 2}, 'b': {0b01: 1}}, coverage.rule_hits)
+
+    def test_hits_are_not_collected_when_disabled(self):
+        coverage = Coverage(None, enabled=False, is_single_file=False)
+        coverage.on_rule_hits('a', {0b01: 1})
+        self.assertEquals({}, coverage.rule_hits)
@@ -1,7 +1,60 @@
+import os
+import shutil
+import tempfile
 from textwrap import dedent
 from unittest import TestCase
 
 from ColorSchemeUnit.lib.generator import _build_assertions
+from ColorSchemeUnit.lib.generator import generate_assertions
+from ColorSchemeUnit.lib.generator import insert_assertions
+from ColorSchemeUnit.lib.generator import update_assertions
+from ColorSchemeUnit.lib.headless import api
+from ColorSchemeUnit.lib.runner import _build_test_plan
+from ColorSchemeUnit.lib.runner import _test_file_digest
+from ColorSchemeUnit.lib.runner import _update_failing_assertions
+
+
+class _Selection(list):
+
+    def add(self, region):
+        self.append(region)
+
+
+class _View(api.View):
+
+    # A headless view with the parts of the API the generator uses.
+
+    def __init__(self, window, content: str):
+        super().__init__(window)
+        self._selection = _Selection()
+        self.run_command('color_scheme_unit_setup_test_fixture', {'content': content})
+
+    def meta_info(self, key, pt):
+        return [{'name': 'TM_COMMENT_START', 'value': '//'}]
+
+    def sel(self):
+        return self._selection
+
+    def substr(self, x):
+        # The generator creates sublime.Region objects, not headless ones.
+        if hasattr(x, 'begin'):
+            return self._text[x.begin():x.end()]
+
+        return super().substr(x)
+
+    def replace(self, edit, region, text):
+        self._set_text(self._text[:region.begin()] + text + self._text[region.end():])
+
+
+class _Style():
+
+    def __init__(self):
+        self.scopes = []  # type: list
+
+    def at_scope(self, scope):
+        self.scopes.append(scope)
+
+        return {'foreground': '#fff' if 'keyword' in scope else '#000', 'fontStyle': 'bold' if 'x' in scope else ''}
 
 
 class TestGenerateAssertions(TestCase):
@@ -92,3 +145,160 @@ class TestGenerateAssertions(TestCase):
         self.assertEquals(dedent("""
         #^ a
         """).strip(), _build_assertions(['a', 'a', '', '', ''], '#', ''))
+
+
+class TestGenerateAssertionsForRows(TestCase):
+
+    content = 'if x\n// ^ fg=#fff\n  if'
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        api.configure([self.path], self.path, scope_provider=lambda content, syntax: [
+            (0, 2, 'source keyword '), (2, 3, 'source '), (3, 4, 'source x '), (4, 18, 'source comment '),
+            (18, 20, 'source '), (20, 22, 'source keyword ')])
+        self.view = _View(api.active_window(), self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_generate_assertions(self):
+        style = _Style()
+        # Columns under the comment start can't be asserted.
+        self.assertEquals({
+            0: '// ^ fg=#000 fs=bold',
+            2: '// ^ fg=#fff fs=',
+        }, generate_assertions(self.view, [0, 1, 2], style))
+
+        # Styles are resolved once per run of columns with the same scope.
+        self.assertEquals(['source keyword ', 'source ', 'source x ', 'source ', 'source keyword '], style.scopes)
+
+    def test_insert_assertions(self):
+        self.view.sel().add(api.Region(21))
+        insert_assertions(self.view, None, generate_assertions(self.view, [0, 2], _Style()))
+
+        self.assertEquals(dedent("""\
+            if x
+            // ^ fg=#000 fs=bold
+            // ^ fg=#fff
+              if
+            // ^ fg=#fff fs="""), self.view.substr(api.Region(0, self.view.size())))
+
+        # The cursor is still on the "f" of the last "if".
+        self.assertEquals([(3, 3)], [self.view.rowcol(region.begin()) for region in self.view.sel()])
+
+
+class TestUpdateAssertions(TestCase):
+
+    def _failure(self, assertion: str, row: int, col: int, actual: dict, expected: dict) -> dict:
+        return {'assertion': assertion, 'row': row, 'col': col, 'actual': actual, 'expected': expected}
+
+    def update(self, content: str, failures: list) -> tuple:
+        return update_assertions(content, _build_test_plan(content)['assertions'], failures)
+
+    def test_update_assertions(self):
+        content = dedent("""\
+            // COLOR SCHEME TEST "x.sublime-color-scheme" "PHP"
+            if (x)
+            // ^ fg=#000 fs=bold
+            //  ^^ fg=#111 fs=
+            """)
+
+        failures = [self._failure(
+            '//  ^^ fg=#111 fs=', 2, 6, {'foreground': '#222', 'fontStyle': ''},
+            {'foreground': '#111', 'fontStyle': ''})]
+
+        # Only the failing column of the assertion changes.
+        self.assertEquals((dedent("""\
+            // COLOR SCHEME TEST "x.sublime-color-scheme" "PHP"
+            if (x)
+            // ^ fg=#000 fs=bold
+            //  ^ fg=#111 fs=
+            //   ^ fg=#222 fs=
+            """), 1), self.update(content, failures))
+
+    def test_update_assertions_of_the_same_row(self):
+        content = dedent("""\
+            // COLOR SCHEME TEST "x.sublime-color-scheme" "PHP"
+            if (x)
+            // ^^ bg=#000 build>=3127
+            """)
+
+        failures = [
+            self._failure('// ^^ bg=#000 build>=3127', 2, col, {'background': '#fff'}, {'background': '#000'})
+            for col in (4, 5)
+        ]
+
+        self.assertEquals((dedent("""\
+            // COLOR SCHEME TEST "x.sublime-color-scheme" "PHP"
+            if (x)
+            // ^^ bg=#fff build>=3127
+            """), 1), self.update(content, failures))
+
+    def test_update_assertions_keeps_block_comments_and_line_endings(self):
+        content = '<!-- COLOR SCHEME TEST "x.sublime-color-scheme" "HTML" -->\r\n<a>\r\n<!-- ^ fg=#000 -->\r\n'
+        failures = [self._failure('<!-- ^ fg=#000', 2, 6, {'foreground': '#fff'}, {'foreground': '#000'})]
+
+        self.assertEquals((
+            '<!-- COLOR SCHEME TEST "x.sublime-color-scheme" "HTML" -->\r\n<a>\r\n<!-- ^ fg=#fff -->\r\n',
+            1), self.update(content, failures))
+
+    def test_update_assertions_ignores_stale_failures(self):
+        content = dedent("""\
+            // COLOR SCHEME TEST "x.sublime-color-scheme" "PHP"
+            if (x)
+            // ^ fg=#000
+            """)
+
+        failures = [self._failure('// ^ fg=#333', 2, 4, {'foreground': '#fff'}, {'foreground': '#333'})]
+
+        self.assertEquals((content, 0), self.update(content, failures))
+
+
+class TestUpdateFailingAssertions(TestCase):
+
+    content = dedent("""\
+        // COLOR SCHEME TEST "x.sublime-color-scheme" "PHP"
+        if (x)
+        // ^ fg=#000
+        """)
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.file = os.path.join(self.path, 'color_scheme_test.php')
+        with open(self.file, 'w', encoding='utf-8', newline='') as f:
+            f.write(self.content)
+
+    def failure(self, file=None) -> dict:
+        return {
+            'assertion': '// ^ fg=#000',
+            'file': file or self.file,
+            'row': 2,
+            'col': 4,
+            'actual': {'foreground': '#fff'},
+            'expected': {'foreground': '#000'},
+            'digest': _test_file_digest(self.content),
+        }
+
+    def read(self) -> str:
+        with open(self.file, 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+
+    def test_update_failing_assertions(self):
+        self.assertEquals((1, 1, []), _update_failing_assertions([self.failure()]))
+        self.assertEquals(self.content.replace('#000', '#fff'), self.read())
+
+    def test_files_changed_since_they_were_tested_are_skipped(self):
+        changed = '// COLOR SCHEME TEST "x.sublime-color-scheme" "PHP"\n// ^ fg=#000\n' + self.content[52:]
+        with open(self.file, 'w', encoding='utf-8', newline='') as f:
+            f.write(changed)
+
+        self.assertEquals(
+            (0, 0, [(self.file, 'changed since it was tested')]),
+            _update_failing_assertions([self.failure()]))
+        self.assertEquals(changed, self.read())
+
+    def test_files_that_cannot_be_read_are_skipped(self):
+        file = os.path.join(self.path, 'missing.php')
+
+        self.assertEquals((0, 0, [(file, 'not readable')]), _update_failing_assertions([self.failure(file)]))
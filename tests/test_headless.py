@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from sublime import score_selector as sublime_score_selector
+
+from ColorSchemeUnit.lib.headless import api
+from ColorSchemeUnit.lib.headless.scopes import ScopesFile
+from ColorSchemeUnit.lib.headless.scopes import ScopesFileProvider
+from ColorSchemeUnit.lib.headless.scopes import decode_tokens
+from ColorSchemeUnit.lib.headless.scopes import encode_tokens
+from ColorSchemeUnit.lib.headless.selector import score_selector
+
+
+class TestScoreSelector(TestCase):
+
+    scopes = [
+        'source.php',
+        'source.php string.quoted.double.php',
+        'source.php string.quoted.double.php punctuation.definition.string.begin.php',
+        'text.html.basic source.php.embedded.html meta.function.php storage.type.function.php',
+        'source.python comment.line.number-sign.python',
+    ]
+
+    selectors = [
+        'source',
+        'source.php',
+        'string',
+        'string.quoted',
+        'source string',
+        'source.php string.quoted punctuation',
+        'punctuation.definition.string',
+        'storage.type',
+        'meta.function storage',
+        'text.html storage.type.function',
+        'string - punctuation',
+        'string -punctuation',
+        'comment, string',
+        'comment | string',
+        'source & string',
+        '(comment, string) - punctuation',
+        'comment.line.number-sign',
+        'keyword',
+        'string.quoted.single',
+    ]
+
+    def test_matches_like_sublime(self):
+        for scope in self.scopes:
+            for selector in self.selectors:
+                self.assertEquals(
+                    bool(sublime_score_selector(scope, selector)),
+                    bool(score_selector(scope, selector)),
+                    '{!r} {!r}'.format(scope, selector))
+
+    def test_orders_like_sublime(self):
+        # The scores of conjunctions are implementation specific, so they're
+        # left out.
+        selectors = [s for s in self.selectors if '&' not in s]
+        for scope in self.scopes:
+            matching = [s for s in selectors if sublime_score_selector(scope, s)]
+            for a in matching:
+                for b in matching:
+                    if sublime_score_selector(scope, a) > sublime_score_selector(scope, b):
+                        self.assertGreater(
+                            score_selector(scope, a),
+                            score_selector(scope, b),
+                            '{!r} {!r} {!r}'.format(scope, a, b))
+
+    def test_deeper_and_more_specific_wins(self):
+        scope = 'source.php string.quoted.double.php'
+        self.assertGreater(score_selector(scope, 'string'), score_selector(scope, 'source.php'))
+        self.assertGreater(score_selector(scope, 'string.quoted'), score_selector(scope, 'string'))
+        self.assertGreater(score_selector(scope, 'source string'), score_selector(scope, 'string'))
+        self.assertEquals(0, score_selector(scope, 'string - source'))
+
+
+class TestScopes(TestCase):
+
+    tokens = [(0, 6, 'source.php '), (6, 14, 'source.php keyword '), (14, 20, 'source.php keyword '),
+              (20, 21, 'source.php ')]
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_encode_decode(self):
+        entry = encode_tokens(self.tokens)
+        self.assertEquals(['source.php ', 'source.php keyword '], entry['scopes'])
+        self.assertEquals([[6, 0], [20, 1], [21, 0]], entry['tokens'])
+        self.assertEquals([(0, 6, 'source.php '), (6, 20, 'source.php keyword '), (20, 21, 'source.php ')],
+                          decode_tokens(entry))
+
+    def test_scopes_file(self):
+        file = os.path.join(self.path, 'color_scheme_scopes.json')
+        scopes_file = ScopesFile(file)
+        scopes_file.set('Packages/X/color_scheme_test.php', 'content', 'Packages/PHP/PHP.sublime-syntax', self.tokens)
+        scopes_file.save()
+
+        provider = ScopesFileProvider([file])
+        self.assertEquals(decode_tokens(encode_tokens(self.tokens)),
+                          provider('content', 'Packages/PHP/PHP.sublime-syntax'))
+        self.assertIsNone(provider('changed', 'Packages/PHP/PHP.sublime-syntax'))
+        self.assertIsNone(provider('content', 'Packages/PHP/PHP (Laravel).sublime-syntax'))
+
+    def test_missing_or_invalid_scopes_file(self):
+        file = os.path.join(self.path, 'color_scheme_scopes.json')
+        self.assertEquals({}, ScopesFile(file).tests)
+
+        with open(file, 'w') as f:
+            f.write('{"format": 0, "tests": {}}')
+
+        self.assertEquals({}, ScopesFile(file).tests)
+
+
+class TestHeadlessView(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        api.configure([self.path], self.path, scope_provider=lambda content, syntax: [
+            (0, 3, 'source.x keyword '), (3, 4, 'source.x '), (4, 9, 'source.x string ')])
+        self.view = api.active_window().create_output_panel('test')
+        self.view.run_command('color_scheme_unit_setup_test_fixture', {'content': 'if\nx "y"'})
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_points(self):
+        self.assertEquals(0, self.view.text_point(0, 0))
+        self.assertEquals(3, self.view.text_point(1, 0))
+        self.assertEquals(5, self.view.text_point(1, 2))
+        self.assertEquals((1, 2), self.view.rowcol(5))
+        self.assertEquals(3, self.view.line(5).begin())
+        self.assertEquals(8, self.view.line(5).end())
+
+    def test_scopes(self):
+        self.assertEquals('source.x keyword ', self.view.scope_name(0))
+        self.assertEquals('source.x ', self.view.scope_name(3))
+        self.assertEquals('source.x string ', self.view.scope_name(8))
+        self.assertEquals(
+            [(3, 4, 'source.x '), (4, 8, 'source.x string ')],
+            [(r.begin(), r.end(), s) for r, s in self.view.extract_tokens_with_scopes(api.Region(3, 8))])
+
+    def test_missing_scopes(self):
+        api.set_scope_provider(lambda content, syntax: None)
+        with self.assertRaises(LookupError):
+            self.view.run_command('color_scheme_unit_setup_test_fixture', {'content': 'x'})
+
+        self.assertEquals(1, len(api.missing_scopes))
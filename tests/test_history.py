@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from ColorSchemeUnit.lib.history import parse_shard
+from ColorSchemeUnit.lib.history import RunHistory
+
+
+def _result(time, error=None, skip=None, failures=None, cached=False):
+    result = {'error': error or {}, 'skip': skip or {}, 'failures': failures or [], 'assertions': 0, 'time': time}
+    if cached:
+        result['cached'] = True
+
+    return result
+
+
+class TestParseShard(TestCase):
+
+    def test_parse_shard(self):
+        self.assertEquals((1, 4), parse_shard('1/4'))
+        self.assertEquals((4, 4), parse_shard('4/4'))
+
+    def test_invalid(self):
+        for shard in ('1', '0/4', '5/4', '1/0', 'a/b', ''):
+            with self.assertRaises(ValueError):
+                parse_shard(shard)
+
+
+class TestRunHistory(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file = os.path.join(self.path, 'history.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_history_is_persisted(self):
+        history = RunHistory(self.file)
+        history.record('a', _result(1.5))
+        history.record('b', _result(0.5, failures=[{}]))
+        history.save()
+
+        history = RunHistory(self.file)
+        self.assertEquals({'time': 1.5, 'outcome': 'passed'}, history.get('a'))
+        self.assertEquals({'time': 0.5, 'outcome': 'failed'}, history.get('b'))
+        self.assertIsNone(history.get('c'))
+
+    def test_cached_results_keep_the_time_of_the_last_run(self):
+        history = RunHistory(self.file)
+        history.record('a', _result(1.5, failures=[{}]))
+        history.record('a', _result(0.001, cached=True))
+        self.assertEquals({'time': 1.5, 'outcome': 'passed'}, history.get('a'))
+
+    def test_order_failed_first_then_slowest(self):
+        history = RunHistory(self.file)
+        history.record('a', _result(1.0))
+        history.record('b', _result(3.0))
+        history.record('c', _result(0.5, error={'message': 'x'}))
+        history.record('d', _result(2.0, failures=[{}]))
+        history.record('e', _result(5.0, skip={'message': 'x'}))
+
+        self.assertEquals(['d', 'c', 'e', 'b', 'a'], history.order(['a', 'b', 'c', 'd', 'e']))
+
+    def test_order_new_tests_are_assumed_to_fail(self):
+        history = RunHistory(self.file)
+        history.record('a', _result(1.0))
+        history.record('b', _result(3.0))
+
+        self.assertEquals(['new', 'b', 'a'], history.order(['a', 'b', 'new']))
+
+    def test_shards_are_balanced_by_time(self):
+        history = RunHistory(self.file)
+        for test, time in (('a', 5.0), ('b', 4.0), ('c', 3.0), ('d', 3.0), ('e', 2.0), ('f', 1.0)):
+            history.record(test, _result(time))
+
+        tests = ['a', 'b', 'c', 'd', 'e', 'f']
+        self.assertEquals(['a', 'd', 'f'], history.shard(tests, 1, 2))
+        self.assertEquals(['b', 'c', 'e'], history.shard(tests, 2, 2))
+
+    def test_shards_partition_the_tests(self):
+        history = RunHistory(self.file)
+        tests = ['test_%d' % i for i in range(20)]
+        for i, test in enumerate(tests[:15]):
+            history.record(test, _result(i % 7 + 0.5))
+
+        shards = [history.shard(tests, i, 3) for i in range(1, 4)]
+        self.assertEquals(sorted(tests), sorted(sum(shards, [])))
+        self.assertEquals(shards, [history.shard(tests, i, 3) for i in range(1, 4)])
+
+    def test_more_shards_than_tests(self):
+        history = RunHistory(self.file)
+        self.assertEquals(['a'], history.shard(['a'], 1, 2))
+        self.assertEquals([], history.shard(['a'], 2, 2))
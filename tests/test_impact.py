@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+from ColorSchemeUnit.lib.impact import changed_selectors
+from ColorSchemeUnit.lib.impact import color_scheme_snapshot
+from ColorSchemeUnit.lib.impact import is_affected
+from ColorSchemeUnit.lib.impact import ScopeFilter
+
+
+def _snapshot(rules, variables=None):
+    return color_scheme_snapshot([(
+        'Packages/X/X.sublime-color-scheme',
+        '{"variables": %s, "rules": [%s]}' % (
+            variables or '{}',
+            ','.join('{"scope": "%s", "foreground": "%s"}' % rule for rule in rules)))])
+
+
+class TestScopeFilter(TestCase):
+
+    def test_may_match(self):
+        scopes = ScopeFilter.from_scopes(['source.php string.quoted.double.php', 'source.php comment.line'])
+
+        self.assertTrue(scopes.may_match('string'))
+        self.assertTrue(scopes.may_match('string.quoted'))
+        self.assertTrue(scopes.may_match('source.php string'))
+        self.assertTrue(scopes.may_match('comment, keyword'))
+        self.assertTrue(scopes.may_match('string - comment'))
+        self.assertTrue(scopes.may_match('(keyword | string)'))
+        self.assertTrue(scopes.may_match(''))
+        self.assertFalse(scopes.may_match('keyword'))
+        self.assertFalse(scopes.may_match('string.unquoted'))
+        self.assertFalse(scopes.may_match('keyword, constant.numeric'))
+
+    def test_hex(self):
+        scopes = ScopeFilter.from_scopes(['source.php string.quoted'])
+        scopes = ScopeFilter.from_hex(scopes.to_hex())
+
+        self.assertTrue(scopes.may_match('string.quoted'))
+        self.assertFalse(scopes.may_match('keyword'))
+
+    def test_size_grows_with_atoms(self):
+        self.assertEquals(64, ScopeFilter.from_scopes([]).bits)
+        self.assertEquals(1024, ScopeFilter.from_scopes(['a%d' % i for i in range(100)]).bits)
+
+
+class TestChangedSelectors(TestCase):
+
+    def test_unchanged(self):
+        self.assertEquals([], changed_selectors(_snapshot([('string', '#fff')]), _snapshot([('string', '#fff')])))
+
+    def test_changed_added_and_removed_rules(self):
+        old = _snapshot([('string', '#fff'), ('comment', '#000'), ('keyword', '#111')])
+        new = _snapshot([('string', '#eee'), ('keyword', '#111'), ('constant', '#222')])
+
+        self.assertEquals(['comment', 'constant', 'string'], changed_selectors(old, new))
+
+    def test_moved_rules(self):
+        old = _snapshot([('string', '#fff'), ('comment', '#000')])
+        new = _snapshot([('comment', '#000'), ('string', '#fff')])
+
+        self.assertNotEqual([], changed_selectors(old, new))
+
+    def test_changed_variables_change_everything(self):
+        old = _snapshot([('string', '#fff')], '{"a": "#fff"}')
+        new = _snapshot([('string', '#fff')], '{"a": "#000"}')
+
+        self.assertIsNone(changed_selectors(old, new))
+
+    def test_legacy_color_scheme(self):
+        snapshot = color_scheme_snapshot([('Packages/X/X.tmTheme', (
+            '<?xml version="1.0" encoding="UTF-8"?><plist version="1.0"><dict><key>settings</key><array>'
+            '<dict><key>settings</key><dict><key>foreground</key><string>#fff</string></dict></dict>'
+            '<dict><key>scope</key><string>string</string>'
+            '<key>settings</key><dict><key>foreground</key><string>#fff</string></dict></dict>'
+            '</array></dict></plist>'))])
+
+        self.assertEquals(['string'], [rule[0] for rule in snapshot['rules']])
+
+
+class TestIsAffected(TestCase):
+
+    def test_is_affected(self):
+        scopes = ScopeFilter.from_scopes(['source.php string.quoted'])
+
+        self.assertTrue(is_affected(None, scopes))
+        self.assertTrue(is_affected(['keyword', 'string'], scopes))
+        self.assertFalse(is_affected(['keyword'], scopes))
+        self.assertFalse(is_affected([], scopes))
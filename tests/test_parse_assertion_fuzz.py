@@ -0,0 +1,60 @@
+import random
+from unittest import TestCase
+
+from ColorSchemeUnit.benchmarks.parse_assertion import regex_parse_assertion
+from ColorSchemeUnit.lib.runner import _parse_assertion
+
+_TOKENS = (
+    '//', '#', '/*', '*/', '<!--', '-->', '--', '-', '*', '/', '<', '!', '>', '=',
+    ' ', ' ', ' ', '  ', '\t', '\x0b', '　',
+    '^', '^', '^^^',
+    'fg=', 'bg=', 'fs=', 'build>=', 'fg', 'fs', 'build',
+    '#ffffff', '#F8F8F2', 'bold', 'italic', 'glow', 'underline', '_', 'none',
+    'x', 'Z', '0', '3127', 'İ', 'é',
+)
+
+
+def _random_line(rnd: random.Random) -> str:
+    if rnd.random() < 0.5:
+        tokens = [rnd.choice(('', ' ', '    ', '\t')), rnd.choice(('//', '#', '/*', '<!--', '--'))]
+        tokens += [rnd.choice(('', ' ', '  ')), '^' * rnd.randint(0, 3), rnd.choice(('', ' ', '  ', '\t'))]
+    else:
+        tokens = []
+
+    tokens += [rnd.choice(_TOKENS) for _ in range(rnd.randint(0, 12))]
+
+    return ''.join(tokens)
+
+
+class TestParseAssertionEquivalence(TestCase):
+
+    def assertEquivalent(self, line: str) -> None:
+        self.assertEquals(regex_parse_assertion(line), _parse_assertion(line), repr(line))
+
+    def test_examples(self):
+        for line in (
+            '// ^ fg=#ffffff',
+            '# ^^^ fg=#66d9ef bg=#272822 fs=italic bold build>=3127',
+            '<!-- ^ fg=#f92672 fs= -->',
+            '/* ^ fs=bold */',
+            '-- ^^ fs=bold italic#x',
+            '// ^ fs=a  b',
+            '// ^ fs=a b  c',
+            '// ^ fs= bold',
+            '// ^ bg=fg=#fff',
+            '// ^ build>= build>=42',
+            '// ^\t\t',
+            '// ^\t',
+            '// ^^x',
+            '//^^ x',
+            '',
+            'foo',
+            '// ',
+            '// foo',
+        ):
+            self.assertEquivalent(line)
+
+    def test_fuzz(self):
+        rnd = random.Random(20231207)
+        for _ in range(20000):
+            self.assertEquivalent(_random_line(rnd))
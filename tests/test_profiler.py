@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from ColorSchemeUnit.lib.profiler import Profiler
+
+
+class Output():
+
+    def __init__(self):
+        self.text = ''
+
+    def write(self, text):
+        self.text += text
+
+
+class TestProfiler(TestCase):
+
+    def test_phases(self):
+        profiler = Profiler()
+        profiler.start_test('Packages/X/color_scheme_test.php')
+        time.sleep(0.01)
+        profiler.mark('load')
+        profiler.add('styles', 0.005)
+        time.sleep(0.01)
+        profiler.mark('assertions')
+        profiler.count('assertions', 3)
+        profiler.count('assertions', 2)
+        profiler.end_test()
+
+        self.assertEquals(1, len(profiler.tests))
+        test = profiler.tests[0]
+        self.assertEquals('Packages/X/color_scheme_test.php', test['test'])
+        self.assertEquals(5, test['counts']['assertions'])
+        self.assertGreaterEqual(test['phases']['load'], 0.01)
+        self.assertEquals(0.005, test['phases']['styles'])
+
+        # Nested phases aren't attributed to the enclosing phase as well.
+        self.assertLess(test['phases']['assertions'], test['phases']['load'])
+
+    def test_report(self):
+        profiler = Profiler()
+        for test in ('a', 'b', 'c'):
+            profiler.start_test(test)
+            profiler.mark('load')
+            profiler.end_test()
+
+        profiler.tests[1]['time'] = 10
+        profiler.add_run_phase('discovery', 0.5)
+
+        output = Output()
+        profiler.report(output, slowest=2)
+
+        self.assertIn('Slowest 2 tests', output.text)
+        self.assertIn('1) 10.000 secs b', output.text)
+        self.assertIn('Load test', output.text)
+        self.assertIn('Discovery', output.text)
+        self.assertNotIn('Check assertions', output.text)
+
+    def test_report_without_tests(self):
+        output = Output()
+        Profiler().report(output)
+        self.assertEquals('', output.text)
+
+    def test_spans_are_only_recorded_when_tracing(self):
+        profiler = Profiler()
+        profiler.start_test('a')
+        profiler.mark('load')
+        profiler.end_test()
+        self.assertIsNone(profiler.spans)
+
+    def test_write_trace(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        file = os.path.join(path, 'trace.json')
+
+        profiler = Profiler(trace=True)
+        profiler.add_run_phase('discovery', 0.5, 10.0)
+        profiler.start_test('Packages/X/color_scheme_test.php')
+        profiler.add('scopes', 0.25, profiler.spans[0][2] + 0.5)
+        profiler.mark('load')
+        profiler.end_test()
+        profiler.write_trace(file)
+
+        with open(file) as f:
+            events = json.load(f)['traceEvents']
+
+        self.assertEquals('M', events[0]['ph'])
+        self.assertEquals(
+            ['Discovery', 'Tokenize', 'Load test', 'Packages/X/color_scheme_test.php'],
+            [event['name'] for event in events[1:]])
+        self.assertEquals(0, events[1]['ts'])
+        self.assertEquals(500000, events[1]['dur'])
+        self.assertEquals(500000, events[2]['ts'])
+        self.assertEquals(250000, events[2]['dur'])
+        self.assertEquals('test', events[4]['cat'])
@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from xml.dom import minidom
+
+from ColorSchemeUnit.lib.reporter import JUnitReporter
+from ColorSchemeUnit.lib.reporter import JsonLinesReporter
+from ColorSchemeUnit.lib.reporter import create_reporters
+
+
+def _result(failures=None, error=None, skip=None, assertions=2):
+    return {'skip': skip or {}, 'error': error or {}, 'failures': failures or [], 'assertions': assertions}
+
+
+_failure = {
+    'assertion': '// ^^ fg=#ffffff <&>',
+    'file': '/path/to/Packages/X/color_scheme_test.php',
+    'row': 3,
+    'col': 4,
+    'actual': {'foreground': '#000000'},
+    'expected': {'foreground': '#ffffff'},
+}
+
+_error = {'message': 'Invalid COLOR SCHEME TEST header', 'file': 'x', 'row': 0, 'col': 0}
+
+
+class TestReporters(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def run_reporter(self, reporter):
+        reporter.on_test_end('Packages/X/color_scheme_test_a.php', _result(), 0.5)
+        reporter.on_test_end('Packages/X/color_scheme_test_b.php', _result([_failure, _failure]), 0.25)
+        reporter.on_test_end('Packages/X/color_scheme_test_c.php', _result(error=_error, assertions=0), 0.0)
+        reporter.on_test_end('Packages/X/color_scheme_test_d.php', _result(skip=_error, assertions=0), 0.0)
+        reporter.on_tests_end()
+        reporter.close()
+
+    def test_json_lines(self):
+        file = os.path.join(self.path, 'results.jsonl')
+        self.run_reporter(JsonLinesReporter(file))
+
+        with open(file, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+
+        self.assertEquals(['test', 'test', 'failure', 'failure', 'test', 'test', 'summary'],
+                          [r['type'] for r in records])
+        self.assertEquals(['passed', 'failed', 'error', 'skipped'],
+                          [r['status'] for r in records if r['type'] == 'test'])
+        self.assertEquals(3, records[2]['row'])
+        self.assertEquals(4, records[2]['col'])
+        self.assertEquals({'foreground': '#ffffff'}, records[2]['expected'])
+        self.assertEquals(_error['message'], records[4]['message'])
+        self.assertEquals(4, records[-1]['tests'])
+        self.assertEquals(2, records[-1]['failures'])
+        self.assertEquals(1, records[-1]['errors'])
+        self.assertEquals(1, records[-1]['skipped'])
+        self.assertEquals(4, records[-1]['assertions'])
+
+    def test_junit(self):
+        file = os.path.join(self.path, 'results.xml')
+        self.run_reporter(JUnitReporter(file))
+
+        testsuite = minidom.parse(file).getElementsByTagName('testsuite')[0]
+        self.assertEquals('4', testsuite.getAttribute('tests'))
+        self.assertEquals('1', testsuite.getAttribute('failures'))
+        self.assertEquals('1', testsuite.getAttribute('errors'))
+        self.assertEquals('1', testsuite.getAttribute('skipped'))
+
+        testcases = testsuite.getElementsByTagName('testcase')
+        self.assertEquals(4, len(testcases))
+        self.assertEquals('color_scheme_test_a.php', testcases[0].getAttribute('name'))
+        self.assertEquals(2, len(testcases[1].getElementsByTagName('failure')))
+        self.assertIn('<&>', testcases[1].getElementsByTagName('failure')[0].firstChild.data)
+        self.assertIn(':3:4', testcases[1].getElementsByTagName('failure')[0].firstChild.data)
+        self.assertEquals(1, len(testcases[2].getElementsByTagName('error')))
+        self.assertEquals(1, len(testcases[3].getElementsByTagName('skipped')))
+
+    def test_junit_is_finished_when_closed_early(self):
+        file = os.path.join(self.path, 'results.xml')
+        reporter = JUnitReporter(file)
+        reporter.on_test_end('Packages/X/color_scheme_test_a.php', _result(), 0.5)
+        reporter.close()
+
+        testsuite = minidom.parse(file).getElementsByTagName('testsuite')[0]
+        self.assertEquals('1', testsuite.getAttribute('tests'))
+        self.assertEquals(1, len(testsuite.getElementsByTagName('testcase')))
+
+    def test_create_reporters(self):
+        self.assertEquals([], create_reporters({}, self.path))
+
+        reporters = create_reporters({'color_scheme_unit.junit_file': 'build/results.xml'}, self.path)
+        for reporter in reporters:
+            reporter.close()
+
+        self.assertEquals(1, len(reporters))
+        self.assertEquals(os.path.join(self.path, 'build', 'results.xml'), reporters[0].file)
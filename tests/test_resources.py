@@ -0,0 +1,41 @@
+import os
+from unittest import TestCase
+
+from sublime import find_resources
+from sublime import packages_path
+
+from ColorSchemeUnit.lib.resources import ResourceIndex
+
+
+class TestResourceIndex(TestCase):
+
+    def setUp(self):
+        self.resources = ResourceIndex()
+
+    def test_tests(self):
+        self.assertEquals(find_resources('color_scheme_test*'), self.resources.tests)
+
+    def test_find_is_equivalent_to_find_resources(self):
+        for name in self.resources.tests[:5] + find_resources('*.sublime-syntax')[:5]:
+            name = name.rpartition('/')[2]
+            self.assertEquals(find_resources(name), self.resources.find(name))
+
+    def test_find_missing(self):
+        self.assertEquals([], self.resources.find('ColorSchemeUnitMissing.sublime-color-scheme'))
+        self.assertEquals([], self.resources.find('ColorSchemeUnitMissing.tmLanguage'))
+
+    def test_find_falls_back_for_patterns(self):
+        for name in ('Packages/ColorSchemeUnit/*.sublime-syntax', 'ColorSchemeUnit*.sublime-syntax'):
+            self.assertEquals(find_resources(name), self.resources.find(name))
+
+    def test_find_path(self):
+        resource = self.resources.tests[0]
+        self.assertEquals([resource], self.resources.find(resource))
+        self.assertEquals([resource], self.resources.find(resource[len('Packages/'):]))
+        self.assertEquals([], self.resources.find('Packages/ColorSchemeUnitMissing/' + resource.rpartition('/')[2]))
+
+    def test_tests_for_file(self):
+        test = 'Packages/ColorSchemeUnit/tests/color_scheme_test_issue_13.html'
+        file = os.path.join(os.path.dirname(packages_path()), test)
+        self.assertEquals([test], self.resources.tests_for_file(file))
+        self.assertEquals([], self.resources.tests_for_file(file + '.missing'))
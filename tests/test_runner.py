@@ -1,4 +1,8 @@
 import os
+import shutil
+import tempfile
+from textwrap import dedent
+from unittest import TestCase
 
 import sublime
 
@@ -7,6 +11,10 @@ from ColorSchemeUnit.tests import unittest
 from ColorSchemeUnit.lib.coverage import Coverage
 from ColorSchemeUnit.lib.result import ResultPrinter
 from ColorSchemeUnit.lib.test import TestOutputPanel
+from ColorSchemeUnit.lib.runner import _test_file_digest
+from ColorSchemeUnit.lib.runner import _TestRunJob
+from ColorSchemeUnit.lib.runner import ColorSchemeUnit
+from ColorSchemeUnit.lib.runner import _build_test_plan
 from ColorSchemeUnit.lib.runner import run_color_scheme_test
 
 
@@ -16,6 +24,150 @@ class TestOutputMock(TestOutputPanel):
         pass
 
 
+class _Settings(dict):
+
+    def set(self, key, value):
+        self[key] = value
+
+
+class _View():
+
+    def __init__(self, settings: dict):
+        self._settings = _Settings(settings)
+
+    def settings(self):
+        return self._settings
+
+
+class _Window():
+
+    def __init__(self, settings: dict):
+        self.view = _View(settings)
+
+    def id(self):
+        return -1
+
+    def active_view(self):
+        return self.view
+
+
+class _Output():
+
+    def __init__(self):
+        self.text = ''
+
+    def write(self, text):
+        self.text += text
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _ShardedColorSchemeUnit(ColorSchemeUnit):
+
+    # Runs a suite of fake tests, each taking longer than the last, and
+    # records the tests that ran.
+
+    TESTS = ['Packages/X/color_scheme_test_%s.php' % name for name in 'abcdefghij']
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.ran = []  # type: list
+
+    def _find_tests(self, resources, package=None, file=None, tests=None):
+        return ('X', list(self.TESTS))
+
+    def _run_tests(self, tests, *args, **kwargs):
+        for test in tests:
+            self.ran.append(test)
+            yield {'skip': {}, 'error': {}, 'failures': [], 'assertions': 1, 'time': self.TESTS.index(test) + 1.0}
+
+
+class TestShardedRuns(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.settings = {
+            'color_scheme_unit.cache': False,
+            'color_scheme_unit.history_file': os.path.join(self.path, 'history.json'),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def run_tests(self, shard=None) -> list:
+        settings = dict(self.settings)
+        if shard:
+            settings['color_scheme_unit.shard'] = shard
+
+        runner = _ShardedColorSchemeUnit(_Window(settings))
+        runner._run(output=_Output(), is_async=False)
+
+        return runner.ran
+
+    def test_shards_run_one_after_another_cover_every_test_once(self):
+        # A full run records a history for the shards to be balanced by.
+        self.assertEquals(_ShardedColorSchemeUnit.TESTS, self.run_tests())
+
+        for count in (2, 3, 4):
+            ran = []
+            for index in range(1, count + 1):
+                ran += self.run_tests('%d/%d' % (index, count))
+
+            self.assertEquals(sorted(_ShardedColorSchemeUnit.TESTS), sorted(ran))
+
+    def test_shards_without_a_history_cover_every_test_once(self):
+        ran = []
+        for index in range(1, 4):
+            ran += self.run_tests('%d/3' % index)
+
+        self.assertEquals(sorted(_ShardedColorSchemeUnit.TESTS), sorted(ran))
+        self.assertFalse(os.path.exists(self.settings['color_scheme_unit.history_file']))
+
+
+class _PackagesColorSchemeUnit(ColorSchemeUnit):
+
+    # Runs passing fake tests, except that package A has none, and records
+    # the tests that ran.
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.ran = []  # type: list
+
+    def _find_tests(self, resources, package=None, file=None, tests=None):
+        tests = [test for test in tests if not test.startswith('Packages/A/')]
+        if not tests:
+            return None
+
+        return (tests[0].split('/')[1], tests)
+
+    def _run_tests(self, tests, *args, **kwargs):
+        for test in tests:
+            self.ran.append(test)
+            yield {'skip': {}, 'error': {}, 'failures': [], 'assertions': 1, 'time': 1.0}
+
+
+class TestPackageRuns(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def test_packages_without_tests_do_not_fail_the_run(self):
+        runner = _PackagesColorSchemeUnit(_Window({
+            'color_scheme_unit.cache': False,
+            'color_scheme_unit.fail_fast': True,
+            'color_scheme_unit.history_file': os.path.join(self.path, 'history.json'),
+        }))
+        tests = ['Packages/A/color_scheme_test.php', 'Packages/B/color_scheme_test.php']
+
+        self.assertTrue(runner._run(output=_Output(), is_async=False, tests=tests))
+        self.assertEquals(['Packages/B/color_scheme_test.php'], runner.ran)
+
+
 class TestRunner(unittest.ViewTestCase):
 
     def setUp(self):
@@ -46,6 +198,7 @@ class TestRunner(unittest.ViewTestCase):
         test = 'Packages/ColorSchemeUnit/tests/fixtures/test.php'
         result = self.runTest(test)
 
+        self.assertIsInstance(result.pop('time'), float)
         self.assertEquals({
             'skip': {},
             'error': {},
@@ -57,6 +210,7 @@ class TestRunner(unittest.ViewTestCase):
                     },
                     'assertion': '//  ^ fg=#66d9ef fs=',
                     'col': 5,
+                    'digest': _test_file_digest(sublime.load_resource(test)),
                     'expected': {
                         'fontStyle': '',
                         'foreground': '#66d9ef'
@@ -68,3 +222,58 @@ class TestRunner(unittest.ViewTestCase):
             'assertions': 1
         }, result)
         self.assertOutput('F')
+
+
+class TestBuildTestPlan(TestCase):
+
+    def test_build_test_plan(self):
+        plan = _build_test_plan(dedent("""\
+            // COLOR SCHEME TEST "Monokai.sublime-color-scheme" "PHP"
+            function x() {}
+            //  ^ fg=#66D9EF fs=
+            // ^^^ bg=#272822 build>=3127
+
+            x();
+            // <- not an assertion
+            //^ fs=bold italic
+        """), 'color_scheme_test.php')
+
+        self.assertEquals({
+            'syntax_name': 'PHP',
+            'syntax_package_name': None,
+            'skip_if_not_syntax': False,
+            'color_scheme': 'Monokai.sublime-color-scheme'
+        }, plan['header'])
+
+        self.assertEquals([
+            [2, 1, 4, 5, {'foreground': '#66d9ef', 'fontStyle': ''}, None, '//  ^ fg=#66d9ef fs='],
+            [3, 1, 3, 6, {'background': '#272822'}, 3127, '// ^^^ bg=#272822 build>=3127'],
+            [7, 6, 2, 3, {'fontStyle': 'bold italic'}, None, '//^ fs=bold italic'],
+        ], plan['assertions'])
+
+    def test_build_test_plan_without_header(self):
+        self.assertEquals({'header': None, 'assertions': []}, _build_test_plan('// ^ fg=#fff\n'))
+
+
+class TestTestRunJob(TestCase):
+
+    def steps(self, job, tests):
+        ran = []
+        for test in tests:
+            ran.append(test)
+            yield
+            if job.cancelled:
+                break
+
+        return ran
+
+    def test_run_returns_the_result(self):
+        job = _TestRunJob(0)
+        self.assertEquals(['a', 'b', 'c'], job.run(self.steps(job, ['a', 'b', 'c'])))
+
+    def test_cancel_stops_between_steps(self):
+        job = _TestRunJob(0)
+        steps = self.steps(job, ['a', 'b', 'c'])
+        next(steps)
+        job.cancel()
+        self.assertEquals(['a'], job.run(steps))
@@ -0,0 +1,99 @@
+from unittest import TestCase
+
+from ColorSchemeUnit.lib.color_scheme import SelectorIndex
+from ColorSchemeUnit.lib.color_scheme import _selector_keys
+from ColorSchemeUnit.lib.color_scheme import resolve_legacy_style
+from ColorSchemeUnit.lib.color_scheme import resolve_rule_mask
+
+
+class TestSelectorKeys(TestCase):
+
+    def test_keys(self):
+        self.assertEquals({'keyword'}, _selector_keys('keyword'))
+        self.assertEquals({'keyword'}, _selector_keys('keyword.control.php'))
+        self.assertEquals({'keyword', 'storage'}, _selector_keys('keyword, storage.type'))
+        self.assertEquals({'meta', 'source'}, _selector_keys('text.html meta.tag, source.js.embedded.html'))
+        self.assertEquals({'keyword'}, _selector_keys('source.php keyword'))
+        self.assertEquals({'string'}, _selector_keys('string - comment'))
+        self.assertEquals({'string'}, _selector_keys('string -comment'))
+
+    def test_unindexable(self):
+        self.assertIsNone(_selector_keys(''))
+        self.assertIsNone(_selector_keys('- comment'))
+        self.assertIsNone(_selector_keys('keyword, '))
+        self.assertIsNone(_selector_keys('(string | comment)'))
+        self.assertIsNone(_selector_keys('string & meta'))
+
+
+class TestSelectorIndex(TestCase):
+
+    rules = [
+        {'settings': {'foreground': '#ffffff', 'background': '#000000'}},
+        {'scope': 'keyword, storage', 'settings': {'foreground': '#ff334b', 'fontStyle': 'bold'}},
+        {'scope': 'source.js.embedded.html, source.js', 'settings': {'background': '#7a4a2299'}},
+        {'scope': 'text.html.basic source.js.embedded.html meta.block.js keyword.control.flow.js',
+         'settings': {'foreground': '#ff0000'}},
+        {'scope': 'keyword.control', 'settings': {'fontStyle': 'italic'}},
+        {'scope': '- comment', 'settings': {'background': '#111111'}},
+        {'scope': 'comment', 'settings': {'foreground': '#75715e'}},
+    ]
+
+    scopes = [
+        'text.html.basic',
+        'text.html.basic source.js.embedded.html meta.block.js keyword.control.flow.js',
+        'text.html.basic source.js.embedded.html comment.line.double-slash.js',
+        'source.php storage.type.function.php',
+        'source.php keyword.control.php',
+        'source.php keyword.operator.php',
+        'comment.block',
+    ]
+
+    def test_candidates_are_in_rule_order(self):
+        index = SelectorIndex(self.rules)
+        self.assertEquals([1, 2, 3, 4, 5], index.candidates('source.php keyword.control.php'))
+        self.assertEquals([2, 5, 6], index.candidates('source.php comment.block.php'))
+        self.assertEquals([5], index.candidates('text.plain'))
+        self.assertEquals([5], index.candidates('markup.heading'))
+
+    def test_same_styles_as_linear_scan(self):
+        index = SelectorIndex(self.rules)
+        default_styles = self.rules[0]['settings']
+        for scope in self.scopes:
+            self.assertEquals(
+                resolve_legacy_style(scope, default_styles, self.rules),
+                resolve_legacy_style(scope, default_styles, self.rules, index),
+                scope)
+
+
+class TestResolveRuleMask(TestCase):
+
+    rules = TestSelectorIndex.rules
+
+    def test_rules_styling_the_scope(self):
+        # keyword.control sets the font style over keyword, which still sets
+        # the foreground.
+        rules = [
+            {'settings': {'foreground': '#ffffff'}},
+            {'scope': 'keyword', 'settings': {'foreground': '#ff334b', 'fontStyle': 'bold'}},
+            {'scope': 'keyword.control', 'settings': {'fontStyle': 'italic'}},
+            {'scope': 'comment', 'settings': {'foreground': '#75715e'}},
+        ]
+        self.assertEquals((1 << 1) | (1 << 2), resolve_rule_mask('source.php keyword.control.php', rules, True))
+        self.assertEquals(1 << 1, resolve_rule_mask('source.php keyword.operator.php', rules, True))
+        self.assertEquals(1 << 3, resolve_rule_mask('comment.block', rules, True))
+        self.assertEquals(0, resolve_rule_mask('source.php', rules, True))
+
+    def test_last_of_equally_scoring_rules_wins(self):
+        rules = [
+            {'scope': 'string', 'foreground': '#fff'},
+            {'scope': 'string', 'foreground': '#000'},
+        ]
+        self.assertEquals(1 << 1, resolve_rule_mask('source.php string.quoted', rules, False))
+
+    def test_same_rules_as_linear_scan(self):
+        index = SelectorIndex(self.rules)
+        for scope in TestSelectorIndex.scopes:
+            self.assertEquals(
+                resolve_rule_mask(scope, self.rules, True),
+                resolve_rule_mask(scope, self.rules, True, index),
+                scope)
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from ColorSchemeUnit.lib.snapshot import decode_snapshot
+from ColorSchemeUnit.lib.snapshot import diff_snapshots
+from ColorSchemeUnit.lib.snapshot import encode_snapshot
+from ColorSchemeUnit.lib.snapshot import load_snapshot
+from ColorSchemeUnit.lib.snapshot import save_snapshot
+from ColorSchemeUnit.lib.snapshot import snapshot_file_name
+
+_PLAIN = ('#ffffff', '#000000', '')
+_KEYWORD = ('#f92672', '#000000', '')
+_ITALIC = ('#66d9ef', '#000000', 'italic')
+
+
+class TestSnapshotFileName(TestCase):
+
+    def test_snapshot_file_name(self):
+        self.assertEquals(
+            os.path.join('a', 'color_scheme_snapshot_x.php.json'),
+            snapshot_file_name(os.path.join('a', 'color_scheme_test_x.php')))
+
+
+class TestEncodeSnapshot(TestCase):
+
+    def test_encode_snapshot(self):
+        snapshot = encode_snapshot([
+            [(2, _KEYWORD), (1, _PLAIN), (2, _PLAIN), (0, _ITALIC)],
+            [],
+            [(8, _ITALIC)],
+        ], 'digest')
+
+        # Adjacent runs with the same style are merged, and empty runs dropped.
+        self.assertEquals({
+            'format': 1,
+            'digest': 'digest',
+            'styles': [list(_KEYWORD), list(_PLAIN), list(_ITALIC)],
+            'lines': [[2, 0, 3, 1], [], [8, 2]],
+        }, snapshot)
+
+    def test_save_and_load_snapshot(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file = os.path.join(directory, 'color_scheme_snapshot.php.json')
+
+        self.assertIsNone(load_snapshot(file))
+
+        snapshot = encode_snapshot([[(2, _KEYWORD), (3, _PLAIN)], [(8, _ITALIC)]], 'digest')
+        save_snapshot(file, snapshot)
+
+        self.assertEquals(snapshot, decode_snapshot(load_snapshot(file)))
+
+    def test_decode_invalid_snapshot(self):
+        self.assertIsNone(decode_snapshot('{'))
+        self.assertIsNone(decode_snapshot('[]'))
+        self.assertIsNone(decode_snapshot('{"format": 0}'))
+
+
+class TestDiffSnapshots(TestCase):
+
+    def test_same_snapshots(self):
+        snapshot = encode_snapshot([[(2, _KEYWORD), (3, _PLAIN)]], 'digest')
+
+        self.assertEquals([], diff_snapshots(snapshot, encode_snapshot([[(2, _KEYWORD), (3, _PLAIN)]], 'digest')))
+
+    def test_style_tables_may_differ(self):
+        expected = encode_snapshot([[(2, _KEYWORD), (3, _PLAIN)]], 'digest')
+        actual = encode_snapshot([[(1, _ITALIC)], [(2, _KEYWORD), (3, _PLAIN)]], 'digest')
+        actual['lines'].pop(0)
+
+        self.assertEquals([], diff_snapshots(expected, actual))
+
+    def test_diff_snapshots(self):
+        expected = encode_snapshot([
+            [(2, _KEYWORD), (3, _PLAIN), (4, _ITALIC)],
+            [(6, _PLAIN)],
+        ], 'digest')
+        actual = encode_snapshot([
+            [(4, _KEYWORD), (1, _PLAIN), (4, _ITALIC)],
+            [(1, _PLAIN), (2, _ITALIC), (3, _PLAIN)],
+        ], 'digest')
+
+        self.assertEquals([
+            (0, 2, 4, _PLAIN, _KEYWORD),
+            (1, 1, 3, _PLAIN, _ITALIC),
+        ], diff_snapshots(expected, actual))
+
+    def test_adjacent_differences_are_merged(self):
+        expected = encode_snapshot([[(2, _PLAIN), (2, _KEYWORD), (2, _PLAIN)]], 'digest')
+        actual = encode_snapshot([[(1, _PLAIN), (1, _ITALIC), (1, _ITALIC), (3, _ITALIC)]], 'digest')
+
+        self.assertEquals([
+            (0, 1, 2, _PLAIN, _ITALIC),
+            (0, 2, 4, _KEYWORD, _ITALIC),
+            (0, 4, 6, _PLAIN, _ITALIC),
+        ], diff_snapshots(expected, actual))
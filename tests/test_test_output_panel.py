@@ -0,0 +1,40 @@
+from sublime import Region
+
+from ColorSchemeUnit.lib.test import TestOutputPanel
+from ColorSchemeUnit.tests import unittest
+
+
+class TestTestOutputPanel(unittest.ViewTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.output = TestOutputPanel(self.view.window())
+        self.output.FLUSH_INTERVAL = 60
+
+    def tearDown(self):
+        self.output.view.window().destroy_output_panel(self.output.name)
+        super().tearDown()
+
+    def content(self):
+        return self.output.view.substr(Region(0, self.output.view.size()))
+
+    def test_writes_are_buffered_until_flushed(self):
+        self.output.write('a')
+        self.output.writeln('b')
+        self.assertEquals('', self.content())
+
+        self.output.flush()
+        self.assertEquals('ab\n', self.content())
+
+    def test_buffer_is_flushed_when_full(self):
+        self.output.write('a' * (self.output.FLUSH_SIZE - 1))
+        self.assertEquals('', self.content())
+
+        self.output.write('b')
+        self.assertEquals(self.output.FLUSH_SIZE, len(self.content()))
+
+    def test_close_flushes(self):
+        self.output.write('a')
+        self.output.close()
+        self.assertEquals('a', self.content())
+        self.assertTrue(self.output.closed)
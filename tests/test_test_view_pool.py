@@ -0,0 +1,56 @@
+import sublime
+
+from ColorSchemeUnit.lib.test import TestView
+from ColorSchemeUnit.lib.test import TestViewPool
+from ColorSchemeUnit.tests import unittest
+
+
+class TestTestViewPool(unittest.ViewTestCase):
+
+    color_scheme = 'Packages/ColorSchemeUnit/tests/fixtures/ColorSchemeUnitTest.hidden-color-scheme'
+    legacy_color_scheme = 'Packages/ColorSchemeUnit/tests/fixtures/ColorSchemeUnitLegacyTest.hidden-tmTheme'
+
+    def setUp(self):
+        syntaxes = sublime.find_resources('PHP.sublime-syntax')
+        if not syntaxes:
+            self.skipTest('PHP syntax not found')
+
+        self.php = syntaxes[0]
+
+        super().setUp()
+        self.pool = TestViewPool(self.view.window(), size=2)
+
+    def tearDown(self):
+        self.pool.close()
+        super().tearDown()
+
+    def test_acquire_configures_view(self):
+        view = self.pool.acquire(self.php, self.color_scheme)
+        self.assertEquals(self.php, view.settings().get('syntax'))
+        self.assertEquals(self.color_scheme, view.settings().get('color_scheme'))
+
+    def test_acquire_reuses_views(self):
+        view = self.pool.acquire(self.php, self.color_scheme)
+        self.assertEquals(view.id(), self.pool.acquire(self.php, self.color_scheme).id())
+        self.assertNotEqual(view.id(), self.pool.acquire(self.php, self.legacy_color_scheme).id())
+
+    def test_acquire_reconfigures_least_recently_used_view_when_full(self):
+        a = self.pool.acquire(self.php, self.color_scheme)
+        b = self.pool.acquire(self.php, self.legacy_color_scheme)
+        self.pool.acquire(self.php, self.color_scheme)
+
+        c = self.pool.acquire(self.php, 'Packages/Color Scheme - Default/Monokai.sublime-color-scheme')
+        self.assertEquals(b.id(), c.id())
+        self.assertEquals(a.id(), self.pool.acquire(self.php, self.color_scheme).id())
+
+    def test_set_content_clears_undo_history(self):
+        if not hasattr(self.view, 'clear_undo_stack'):
+            self.skipTest('clear_undo_stack() requires Sublime Text 4')
+
+        test_view = TestView(self.view.window(), 'Packages/ColorSchemeUnit/tests/fixtures/test.php', self.pool)
+        test_view.configure(self.php, self.color_scheme)
+        test_view.set_content('<?php\n')
+        test_view.set_content('<?php\n// comment\n')
+
+        self.assertEquals('<?php\n// comment\n', test_view.get_content())
+        self.assertEquals(('', None, 0), test_view.view.command_history(0, True))
@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from ColorSchemeUnit.lib.watch import DependencyGraph
+
+
+class TestDependencyGraph(TestCase):
+
+    def setUp(self):
+        self.graph = DependencyGraph()
+        self.graph.add('Packages/X/color_scheme_test_a.php', 'Packages/X/Monokai.sublime-color-scheme', 'PHP')
+        self.graph.add('Packages/X/color_scheme_test_b.php', 'Packages/X/Monokai.sublime-color-scheme', 'PHP')
+        self.graph.add('Packages/X/color_scheme_test_c.py', 'Packages/X/Mariana.sublime-color-scheme', 'Python')
+
+    def test_color_scheme_affects_the_tests_using_it(self):
+        self.assertEquals(
+            ['Packages/X/color_scheme_test_a.php', 'Packages/X/color_scheme_test_b.php'],
+            self.graph.affected('/path/to/Packages/X/Monokai.sublime-color-scheme'))
+
+    def test_color_scheme_overrides_affect_the_tests_using_the_color_scheme(self):
+        self.assertEquals(
+            ['Packages/X/color_scheme_test_c.py'],
+            self.graph.affected('/path/to/Packages/User/Mariana.sublime-color-scheme'))
+
+    def test_syntax_affects_the_tests_using_it(self):
+        self.assertEquals(['Packages/X/color_scheme_test_c.py'], self.graph.affected('/path/to/Python.sublime-syntax'))
+        self.assertEquals(['Packages/X/color_scheme_test_c.py'], self.graph.affected('/path/to/Python.tmLanguage'))
+
+    def test_other_files_affect_no_tests(self):
+        self.assertEquals([], self.graph.affected('/path/to/Python.sublime-settings'))
+        self.assertEquals([], self.graph.affected('/path/to/Other.sublime-color-scheme'))
+
+    def test_tests_are_updated_incrementally(self):
+        self.graph.add('Packages/X/color_scheme_test_b.php', 'Packages/X/Mariana.sublime-color-scheme', 'PHP')
+        self.assertEquals(
+            ['Packages/X/color_scheme_test_a.php'],
+            self.graph.affected('Monokai.sublime-color-scheme'))
+        self.assertEquals(
+            ['Packages/X/color_scheme_test_b.php', 'Packages/X/color_scheme_test_c.py'],
+            self.graph.affected('Mariana.sublime-color-scheme'))
+
+        self.graph.remove('Packages/X/color_scheme_test_a.php')
+        self.assertEquals([], self.graph.affected('Monokai.sublime-color-scheme'))
+
+    def test_removed_tests_are_forgotten(self):
+        self.graph.remove('Packages/X/color_scheme_test_a.php')
+        self.assertEquals(
+            ['Packages/X/color_scheme_test_b.php'],
+            self.graph.affected('Monokai.sublime-color-scheme'))
+        self.assertNotIn('Packages/X/color_scheme_test_a.php', self.graph._realpaths.values())